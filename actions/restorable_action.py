@@ -1,4 +1,10 @@
+import hashlib
+import json
+from typing import Any, ClassVar
 from metagpt.actions import Action
+from metagpt.logs import logger
+from snowdream_company.tool.model_tiers import FAST_TIER, STRONG_TIER, probe_question
+from snowdream_company.tool.partial import CONTINUE_PROMPT, PartialOutput, install_stream_hook
 
 
 class RestorableAction(Action):
@@ -6,10 +12,56 @@ class RestorableAction(Action):
   """之前动作是否已经完成"""
   need_restore: bool = False
   """是否需要恢复之前的行为"""
+  TIER: ClassVar[str] = STRONG_TIER
+  """行为默认使用的模型层级，可以通过角色的action_tiers覆盖"""
 
   def __init__(self, **kwargs):
     super().__init__(**kwargs)
 
   def to_restore(self, finished: bool = False):
     self.need_restore = True
-    self.finished = finished
\ No newline at end of file
+    self.finished = finished
+
+  async def aask_resumable(self, project_path: str, msg: list[dict[str, str]], system_msgs: list[str]) -> str:
+    """
+    可断点续写的LLM请求；流式输出的内容会记录到partial.json，
+    如果上次同样的请求在中途中断，则从最后一个完整的代码块开始让模型继续输出。
+    """
+    install_stream_hook()
+    key = hashlib.sha1(json.dumps([system_msgs, msg], ensure_ascii=False).encode("utf-8")).hexdigest()
+    partial = PartialOutput(project_path, self.name, key)
+    received = partial.load() if self.need_restore else ""
+
+    if received:
+      logger.info(f"{self.name}: 从断点继续生成（已完成{len(received)}个字符）")
+      msg = msg + [
+        {
+          "role": "assistant",
+          "content": received
+        },
+        {
+          "role": "user",
+          "content": CONTINUE_PROMPT
+        }
+      ]
+      partial.feed(received)
+
+    with partial:
+      answer: str = await self.llm.aask(msg=msg, system_msgs=system_msgs, stream=True)
+
+    if len(partial.content) == len(received) and answer:
+      # NOTICE: 模型（或其provider）没有流式返回时收不到任何中间内容，这次请求中断后只能从头重新生成
+      logger.warning(f"{self.name}: LLM没有流式输出，无法记录断点，中断后将重新生成")
+    partial.clear()
+
+    return received + answer if received else answer
+
+  async def aask_or_end(self, role: Any, msg: list[dict[str, str]], system_msgs: list[str]) -> str:
+    """
+    可以只回答end结束的提问类请求；行为开启了probe模式时，先用fast层级的模型预判是否还需要提问，不需要时直接返回end，省去一次strong层级的请求
+    """
+    if role.is_probe_action(self) and not await probe_question(role.get_tier_llm(FAST_TIER), msg, system_msgs):
+      logger.info(f"{self.name}: 预判没有需要询问的问题，直接结束")
+      return "end"
+
+    return await self.llm.aask(msg=msg, system_msgs=system_msgs)
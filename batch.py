@@ -0,0 +1,173 @@
+# 批量运行：将一个目录下的需求文档分发到进程池中并行运行，每个需求使用独立的项目目录，最后汇总结果
+# 用法（在snowdream_company的上级目录执行）：
+#   python -m snowdream_company.batch 需求目录 --output 输出目录 [--workers 4] [--llm-limit 4] [--browser-limit 2]
+# 需求目录中每个.md/.txt文件是一个需求；同名的`<需求>.answers.json`是预先写好的回答（可选），
+# 可以是按顺序回答的字符串数组，也可以是按问题标题（例如“需求沟通”、“UI审核意见”）分组的对象；回答用完后一律回答end。
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Optional
+
+REQUIREMENT_EXTENSIONS = [".md", ".txt"]
+
+
+class ScriptedAnswers:
+  """
+  按脚本回答问题的用户输入提供者
+  """
+  def __init__(self, answers: list[str] | dict[str, list[str]]):
+    self.answers = answers
+    self.count = 0
+
+  async def __call__(self, title: str, tip: str, detail: str) -> str:
+    self.count += 1
+    queue = self.answers.get(title, []) if isinstance(self.answers, dict) else self.answers
+    if len(queue) == 0:
+      return "end"
+    return queue.pop(0)
+
+
+def find_requirements(directory: str) -> list[str]:
+  return sorted([
+    os.path.join(directory, filename) for filename in os.listdir(directory)
+    if os.path.splitext(filename)[1] in REQUIREMENT_EXTENSIONS
+  ])
+
+def load_answers(requirement_path: str) -> list[str] | dict[str, list[str]]:
+  answers_path = f"{os.path.splitext(requirement_path)[0]}.answers.json"
+  if not os.path.exists(answers_path):
+    return []
+  with open(answers_path, "r", encoding="utf-8") as file:
+    return json.load(file)
+
+def init_worker(llm_semaphore: Optional[Any], browser_semaphore: Optional[Any]):
+  """
+  进程池的初始化函数：设置进程间共享的LLM和浏览器并发限制
+  """
+  from snowdream_company.tool.limits import set_limit
+
+  if llm_semaphore is not None:
+    set_limit("llm", llm_semaphore)
+  if browser_semaphore is not None:
+    set_limit("browser", browser_semaphore)
+
+async def run_requirement(project_path: str, idea: str, answers: ScriptedAnswers, n_round: int, compression: str, model_routing: Optional[dict[str, Any]] = None):
+  from snowdream_company.tool.limits import limit_llm
+  from snowdream_company.tool.team import create_team, run_team
+  from snowdream_company.tool.ui import set_input_provider
+
+  team = create_team(project_path, restore_policy="restore", compression=compression, **(model_routing or {})) # NOTICE: 重新运行批量任务时会恢复之前中断的项目
+  for role in team.env.roles.values():
+    for llm in role.get_llms():
+      limit_llm(llm)
+  set_input_provider(answers)
+  await run_team(team, idea, n_round)
+
+  return team
+
+def run_project(requirement_path: str, output_dir: str, n_round: int, timeout: float, compression: str, model_routing: Optional[dict[str, Any]] = None) -> dict[str, Any]:
+  """
+  在工作进程中运行一个需求，返回结果；异常不会抛出，而是记录在结果中
+  """
+  from snowdream_company.tool.prd import PRDStore
+
+  name = os.path.splitext(os.path.basename(requirement_path))[0]
+  project_path = os.path.abspath(os.path.join(output_dir, name))
+  result: dict[str, Any] = {
+    "name": name,
+    "requirement": requirement_path,
+    "project_path": project_path,
+    "pid": os.getpid(),
+    "status": "ok",
+    "error": "",
+  }
+  start = time.perf_counter()
+  answers = ScriptedAnswers(load_answers(requirement_path))
+  try:
+    with open(requirement_path, "r", encoding="utf-8") as file:
+      idea = file.read()
+    team = asyncio.run(asyncio.wait_for(run_requirement(project_path, idea, answers, n_round, compression, model_routing), timeout or None))
+    result["messages"] = { role.name: role.rc.memory.count() for role in team.env.roles.values() }
+    result["cost"] = team.cost_manager.total_cost
+  except asyncio.TimeoutError:
+    result["status"] = "timeout"
+    result["error"] = f"超过{timeout}秒没有完成"
+  except Exception:
+    result["status"] = "failed"
+    result["error"] = traceback.format_exc()
+  result["elapsed"] = time.perf_counter() - start
+  result["questions"] = answers.count
+  if os.path.exists(project_path):
+    result["prd_version"] = PRDStore(project_path).latest_version()
+    manifest_path = os.path.join(project_path, "ui", "1.0.0", "modules.json")
+    if os.path.exists(manifest_path):
+      with open(manifest_path, "r", encoding="utf-8") as file:
+        result["ui_modules"] = len(json.load(file))
+
+  return result
+
+def run_batch(requirements: list[str], output_dir: str, workers: int, llm_limit: int, browser_limit: int, n_round: int = 5, timeout: float = 0, compression: str = "none", model_routing: Optional[dict[str, Any]] = None) -> dict[str, Any]:
+  """
+  用进程池并行运行多个需求，返回汇总报告
+  """
+  os.makedirs(output_dir, exist_ok=True)
+  mp_context = multiprocessing.get_context("spawn") # NOTICE: 每个工作进程都从干净的状态启动，不继承父进程的类状态
+  llm_semaphore = mp_context.BoundedSemaphore(llm_limit) if llm_limit > 0 else None
+  browser_semaphore = mp_context.BoundedSemaphore(browser_limit) if browser_limit > 0 else None
+  start = time.perf_counter()
+  results: list[dict[str, Any]] = []
+  with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, initializer=init_worker, initargs=(llm_semaphore, browser_semaphore)) as executor:
+    futures = [executor.submit(run_project, path, output_dir, n_round, timeout, compression, model_routing) for path in requirements]
+    for future in as_completed(futures):
+      result = future.result()
+      results.append(result)
+      print(f"[{len(results)}/{len(futures)}] {result['name']}: {result['status']} ({result['elapsed']:.1f}s)")
+
+  results.sort(key=lambda item: item["name"])
+  elapsed = time.perf_counter() - start
+  summary = {
+    "total": len(results),
+    "succeeded": len([item for item in results if item["status"] == "ok"]),
+    "failed": len([item for item in results if item["status"] != "ok"]),
+    "elapsed": elapsed,
+    "serial_elapsed": sum([item["elapsed"] for item in results]),
+    "workers": workers,
+    "llm_limit": llm_limit,
+    "browser_limit": browser_limit,
+    "results": results,
+  }
+  with open(os.path.join(output_dir, "summary.json"), "w", encoding="utf-8") as file:
+    json.dump(summary, file, ensure_ascii=False, indent=2)
+
+  return summary
+
+def main():
+  from snowdream_company.tool.model_tiers import load_model_routing
+
+  parser = argparse.ArgumentParser(description="批量运行需求")
+  parser.add_argument("requirements", help="需求文档所在的目录")
+  parser.add_argument("--output", required=True, help="输出目录，每个需求在其中有单独的项目目录")
+  parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="工作进程数")
+  parser.add_argument("--llm-limit", type=int, default=4, help="所有进程同时进行的LLM请求数上限，为0时不限制")
+  parser.add_argument("--browser-limit", type=int, default=2, help="所有进程同时使用的浏览器页面数上限，为0时不限制")
+  parser.add_argument("--n-round", type=int, default=5, help="每个需求最多运行的轮数")
+  parser.add_argument("--timeout", type=float, default=0, help="每个需求的超时时间（秒），为0时不限制")
+  parser.add_argument("--compression", default="none", help="记忆等文件的压缩格式")
+  parser.add_argument("--model-routing", default="", help="模型路由的配置文件（JSON），为空时所有行为使用同一个模型")
+  args = parser.parse_args()
+
+  requirements = find_requirements(args.requirements)
+  summary = run_batch(requirements, args.output, args.workers, args.llm_limit, args.browser_limit, args.n_round, args.timeout, args.compression, load_model_routing(args.model_routing))
+  print(f"完成 {summary['succeeded']}/{summary['total']}，失败 {summary['failed']}，耗时 {summary['elapsed']:.1f}s（串行累计 {summary['serial_elapsed']:.1f}s）")
+  for item in summary["results"]:
+    if item["status"] != "ok":
+      print(f"  {item['name']}: {item['status']} {item['error'].strip().splitlines()[-1] if item['error'] else ''}")
+
+
+if __name__ == "__main__":
+  main()
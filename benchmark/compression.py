@@ -0,0 +1,88 @@
+# 压缩存储基准：对比各压缩格式下消息内容以及检查点（包含记忆和行为状态）的磁盘占用和恢复耗时
+# 用法（在snowdream_company的上级目录执行）：python -m snowdream_company.benchmark.compression [--messages 2000] [--drafts 20]
+import argparse
+import os
+import tempfile
+import time
+
+def get_size(path: str) -> int:
+  """
+  文件或目录的总字节数
+  """
+  if os.path.isfile(path):
+    return os.path.getsize(path)
+  size = 0
+  for root, _, files in os.walk(path):
+    size += sum([os.path.getsize(os.path.join(root, name)) for name in files])
+  return size
+
+def create_project(codec: str, messages: int, drafts: int) -> str:
+  """
+  按指定的压缩格式生成一个带有模拟记忆的项目：需求确认的问答、多个版本的需求文档以及UI设计稿
+  """
+  from metagpt.schema import Message
+  from snowdream_company.roles.demand_analyst import DemandAnalysis, DemandConfirmationAsk, DemandConfirmationAnswer, DemandChange
+  from snowdream_company.roles.ui_designer import UIDesigner
+
+  project_path = tempfile.mkdtemp(prefix=f"snowdream_compression_{codec}_")
+  for directory in ["memory", "prd", os.path.join("ui", "1.0.0")]:
+    os.makedirs(os.path.join(project_path, directory), exist_ok=True)
+  role = UIDesigner(project_path=project_path, restore_policy="restore", compression=codec, memory_limit=0)
+  doc = "\n".join([f'{{"id": "demand{idx}", "标题": "需求{idx}", "需求描述": "用户可以在页面中查看和编辑第{idx}项内容，并支持筛选、排序和分页。"}}' for idx in range(60)])
+  module = "<template>\n  <el-card class=\"module\">\n    <el-table :data=\"rows\" stripe border></el-table>\n  </el-card>\n</template>\n<style scoped>\n.module { margin: 16px; }\n</style>\n"
+  for idx in range(messages):
+    if idx % (messages // drafts) == 0:
+      draft = "\n".join([f"```vue\n<!-- 模块{module_idx}（第{idx}版） -->\n{module}```" for module_idx in range(12)])
+      role.rc.memory.add(Message(content=draft, role=role.profile, cause_by=f"{UIDesigner}_ui_draft"))
+      role.rc.memory.add(Message(content=f"{doc}\n第{idx}版", role="demand analyst", cause_by=DemandChange, send_to={role.name}))
+      continue
+    action = DemandConfirmationAsk if idx % 2 == 0 else DemandConfirmationAnswer
+    role.rc.memory.add(Message(content=f"关于第{idx}项需求：列表是否需要支持按照创建时间进行排序？", role="user", cause_by=action))
+  role.rc.memory.add(Message(content=doc, role="demand analyst", cause_by=DemandAnalysis))
+  role.update_memory()
+  role.update_state(role.actions[0])
+  role.save_checkpoint()
+
+  return project_path
+
+def measure_restore(project_path: str, codec: str) -> tuple[float, float]:
+  """
+  返回（读取记忆记录的耗时，读取全部消息内容的耗时）
+  """
+  from snowdream_company.roles.ui_designer import UIDesigner
+  from snowdream_company.tool.checkpoint import TeamCheckpoint
+  from snowdream_company.tool.message_store import MessageStore
+
+  # NOTICE: 清空进程内共享的存储和检查点，确保从磁盘读取
+  MessageStore._stores.clear()
+  TeamCheckpoint._checkpoints.clear()
+  role = UIDesigner(project_path=project_path, restore_policy="restore", compression=codec, memory_limit=0)
+  start = time.perf_counter()
+  role.ensure_memory()
+  restore_time = time.perf_counter() - start
+  start = time.perf_counter()
+  for memory in role.rc.memory.get():
+    memory.content
+  content_time = time.perf_counter() - start
+
+  return restore_time, content_time
+
+def main():
+  from snowdream_company.tool.compression import CODECS
+
+  parser = argparse.ArgumentParser(description="压缩存储基准")
+  parser.add_argument("--messages", type=int, default=2000, help="模拟项目中的记忆条数")
+  parser.add_argument("--drafts", type=int, default=20, help="模拟项目中UI设计稿和需求文档的版本数量")
+  args = parser.parse_args()
+
+  print(f"{'格式':<6} {'消息内容':>10} {'检查点':>10} {'恢复记忆':>10} {'读取内容':>10}")
+  for codec in CODECS:
+    project_path = create_project(codec, args.messages, args.drafts)
+    objects_size = get_size(os.path.join(project_path, "memory", "objects"))
+    checkpoint_size = get_size(os.path.join(project_path, "checkpoint.bin"))
+    restore_time, content_time = measure_restore(project_path, codec)
+    print(f"{codec:<6} {objects_size / 1024:>8.1f}KB {checkpoint_size / 1024:>8.1f}KB {restore_time * 1000:>8.1f}ms {content_time * 1000:>8.1f}ms")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,324 @@
+# 热点路径微基准：每次行动都会执行的记忆同步/恢复、markdown解析、需求文档渲染、行为类型判断以及各个行为的对话记录构建，
+# 在不同规模的模拟数据上计时，并和仓库中保存的基线（benchmark/baselines.json）对比，超过阈值时以非0状态退出；
+# 同样的用例也可以通过SNOWDREAM_BENCHMARK=1 pytest tests/test_hot_paths.py在pytest中运行（默认的pytest运行中跳过），退化时测试失败
+# 用法（在snowdream_company的上级目录执行）：python -m snowdream_company.benchmark.hot_paths [--quick] [--filter get_history] [--threshold 2.0] [--update]
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Callable
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+DEFAULT_THRESHOLD = 2.0
+"""当前耗时（按参考负载换算到基线所在的机器后）超过基线的倍数时视为退化"""
+MESSAGE_SCALES = [100, 10000, 100000]
+DEMAND_SCALES = [100, 1000, 5000]
+MODULE_SCALES = [5, 50]
+QUICK_MAX_MESSAGES = 10000
+"""--quick时跳过的消息规模上限"""
+ANALYST_NAME = "李莉"
+
+def measure(func: Callable[[], Any], rounds: int, min_time: float) -> dict[str, float]:
+  """
+  和pytest-benchmark类似：先估算每轮需要的调用次数（每轮至少min_time秒），再执行rounds轮，返回单次调用的最小值和中位数
+  """
+  func()
+  iterations = 1
+  while True:
+    start = time.perf_counter()
+    for _ in range(iterations):
+      func()
+    elapsed = time.perf_counter() - start
+    if elapsed >= min_time or iterations >= 1 << 20:
+      break
+    iterations *= 2 if elapsed == 0 else max(2, min(int(min_time / elapsed) + 1, 10))
+  times = [elapsed / iterations]
+  for _ in range(rounds - 1):
+    start = time.perf_counter()
+    for _ in range(iterations):
+      func()
+    times.append((time.perf_counter() - start) / iterations)
+  return { "min": min(times), "median": statistics.median(times), "iterations": iterations }
+
+def reference_workload():
+  """
+  参考负载：纯python的序列化、排序和字符串处理，用来换算不同机器之间的速度差异
+  """
+  rng = random.Random(0)
+  data = [{ "id": idx, "content": f"消息{rng.random()}" * 4, "send_to": ["<all>"] } for idx in range(2000)]
+  text = json.dumps(data, ensure_ascii=False)
+  loaded = json.loads(text)
+  loaded.sort(key=lambda item: item["content"])
+  return sum([len(item["content"].split("消息")) for item in loaded])
+
+TEMP_DIRS: list[tempfile.TemporaryDirectory] = []
+"""用例创建的临时项目目录，由cleanup统一删除"""
+
+def create_project() -> str:
+  from snowdream_company.tool.team import init_project
+
+  directory = tempfile.TemporaryDirectory(prefix="snowdream_hot_paths_")
+  TEMP_DIRS.append(directory)
+  init_project(directory.name)
+  return directory.name
+
+def cleanup():
+  """
+  删除用例创建的角色缓存和临时项目目录
+  """
+  from snowdream_company.tool.checkpoint import TeamCheckpoint
+  from snowdream_company.tool.message_store import MessageStore
+
+  ROLES.clear()
+  MessageStore._stores.clear()
+  TeamCheckpoint._checkpoints.clear()
+  while len(TEMP_DIRS) > 0:
+    TEMP_DIRS.pop().cleanup()
+
+def create_messages(count: int, designer: str) -> list[Any]:
+  """
+  模拟的对话记忆：用户需求、需求沟通、需求确认的问答、需求文档以及UI设计稿和用户的反馈交替出现；
+  消息内容按序号循环，共享存储中只有少量不同的内容
+  """
+  from metagpt.actions import UserRequirement
+  from metagpt.schema import Message
+  from snowdream_company.roles.demand_analyst import DemandAnalysis, DemandComuniacate, DemandConfirmationAnswer, DemandConfirmationAsk
+  from snowdream_company.roles.ui_designer import UIAnalysis
+
+  draft_type = UIAnalysis()._get_draft_type()
+  user_answer_type = UIAnalysis()._get_user_answer_type()
+  messages: list[Any] = []
+  for idx in range(count):
+    content = f"第{idx % 500}条消息，" * 10
+    kind = idx % 8
+    if kind == 0:
+      msg = Message(content=content, role="user", cause_by=UserRequirement)
+    elif kind == 1:
+      msg = Message(content=content, role="user", cause_by=DemandComuniacate, sent_from=ANALYST_NAME)
+    elif kind == 2:
+      msg = Message(content=content, role="Demand Analyst", cause_by=DemandComuniacate, sent_from=ANALYST_NAME)
+    elif kind in [3, 5]:
+      msg = Message(content=content, role="UI Designer", cause_by=DemandConfirmationAsk, sent_from=designer, send_to={ANALYST_NAME})
+    elif kind in [4, 6]:
+      msg = Message(content=content, role="Demand Analyst", cause_by=DemandConfirmationAnswer, sent_from=ANALYST_NAME, send_to={designer})
+    elif idx % 16 == 7:
+      msg = Message(content=content, role="UI Designer", cause_by=draft_type, sent_from=designer)
+    else:
+      msg = Message(content=content, role="user", cause_by=user_answer_type)
+    messages.append(msg)
+  messages[-1] = Message(content=json.dumps(create_demands(20), ensure_ascii=False), role="Demand Analyst", cause_by=DemandAnalysis, sent_from=ANALYST_NAME)
+  return messages
+
+def create_demands(count: int) -> list[dict[str, Any]]:
+  """
+  模拟的需求树：每4个需求中1个是一级需求，其余挂在最近的需求下面，层级最多4层
+  """
+  demands: list[dict[str, Any]] = []
+  parents: list[dict[str, Any]] = []
+  for idx in range(count):
+    demand = { "id": str(idx), "优先级": ["高", "中", "低"][idx % 3], "标题": f"功能{idx}", "需求描述": f"用户可以查看、筛选和编辑第{idx}项信息，编辑时需要校验必填项。" }
+    depth = 0 if idx % 4 == 0 else min(idx % 4, len(parents))
+    if depth == 0:
+      demands.append(demand)
+    else:
+      parents[depth - 1].setdefault("子需求", []).append(demand)
+    parents = parents[:depth] + [demand]
+  return demands
+
+def create_ui_answer(modules: int) -> str:
+  """
+  模拟的UI设计稿回复：每个模块一个vue代码块（带需求注释），以及依赖列表和图片生成的代码块
+  """
+  module = "<template>\n  <el-card class=\"module\">\n    <el-table :data=\"rows\" stripe border>\n      <el-table-column prop=\"name\" label=\"名称\"></el-table-column>\n    </el-table>\n  </el-card>\n</template>\n<script setup>\nimport { ref } from 'vue'\nconst rows = ref([])\n</script>\n<style scoped>\n.module { margin: 16px; }\n</style>"
+  blocks = [f"模块{idx}的设计说明。\n```vue\n<!-- demands: {idx}, {idx + 1} -->\n{module}\n```" for idx in range(modules)]
+  blocks.append("```json\n[\"element-plus\", \"vue\"]\n```")
+  blocks.append("```generate-image\n{\"path\": \"banner.png\", \"prompt\": \"banner\"}\n```")
+  return "\n\n".join(blocks)
+
+ROLES: dict[tuple[str, int], Any] = {}
+"""按（角色，消息规模）缓存的带记忆的角色，各个对话记录的用例共用"""
+
+def get_role(role_name: str, count: int) -> Any:
+  from snowdream_company.roles.demand_analyst import DemandAnalyst
+  from snowdream_company.roles.ui_designer import UIDesigner
+
+  key = (role_name, count)
+  if key not in ROLES:
+    role_class = DemandAnalyst if role_name == "analyst" else UIDesigner
+    role = role_class(project_path=create_project(), restore_policy="fresh")
+    role.rc.memory.add_batch(create_messages(count, role.name if role_name == "designer" else "斯蒂芬"))
+    ROLES[key] = role
+  return ROLES[key]
+
+def bench_update_memory(count: int) -> Callable[[], Any]:
+  """
+  同步记忆：第一次同步时超出上限的消息移入归档，之后每次行动只写入工作集
+  """
+  role = get_role("designer", count)
+  role.update_memory()
+  return role.update_memory
+
+def bench_restore_memory(count: int) -> Callable[[], Any]:
+  """
+  恢复记忆：构造角色并读取记忆文件（清空进程内的消息存储和检查点缓存，每次都从磁盘读取）
+  """
+  from snowdream_company.roles.ui_designer import UIDesigner
+  from snowdream_company.tool.checkpoint import TeamCheckpoint
+  from snowdream_company.tool.message_store import MessageStore
+
+  project_path = create_project()
+  role = UIDesigner(project_path=project_path, restore_policy="fresh", memory_limit=0)
+  role.rc.memory.add_batch(create_messages(count, role.name))
+  role.update_memory()
+
+  def run():
+    MessageStore._stores.clear()
+    TeamCheckpoint._checkpoints.clear()
+    restored = UIDesigner(project_path=project_path, restore_policy="restore", memory_limit=0)
+    restored.ensure_memory()
+  return run
+
+def bench_get_lang_content(modules: int) -> Callable[[], Any]:
+  from snowdream_company.tool.markdown import get_lang_content
+
+  answer = create_ui_answer(modules)
+  return lambda: (get_lang_content(answer, is_all=True, lang="vue"), get_lang_content(answer, lang="json"))
+
+def bench_get_html_comment(modules: int) -> Callable[[], Any]:
+  from snowdream_company.tool.markdown import get_html_comment, get_lang_content
+
+  ui_list: list[str] = get_lang_content(create_ui_answer(modules), is_all=True, lang="vue")
+  return lambda: [get_html_comment(ui) for ui in ui_list]
+
+def bench_demands_to_markdown(count: int) -> Callable[[], Any]:
+  from snowdream_company.tool.markdown import demands_to_markdown
+
+  demands = create_demands(count)
+  return lambda: demands_to_markdown(demands)
+
+def bench_is_same_action(count: int) -> Callable[[], Any]:
+  from snowdream_company.roles.demand_analyst import DemandConfirmationAnswer
+  from snowdream_company.tool.type import is_same_action
+
+  target = str(DemandConfirmationAnswer)
+  causes = [msg.cause_by for msg in get_role("designer", count).rc.memory.get()]
+  return lambda: [cause_by for cause_by in causes if is_same_action(cause_by, target)]
+
+def bench_history(role_name: str, action_name: str, build: Callable[[Any, Any], Any]) -> Callable[[int], Callable[[], Any]]:
+  """
+  对话记录构建：清空已注册的视图后重新构建，即角色恢复记忆后第一次行动时的耗时
+  """
+  def factory(count: int) -> Callable[[], Any]:
+    role = get_role(role_name, count)
+    action = [action for action in role.actions if type(action).__name__ == action_name][0]
+    if "role" in type(action).model_fields:
+      action.role = role # NOTICE: DemandComuniacate在run中记录所属的角色
+
+    def run():
+      role.rc.memory.views.clear()
+      return build(role, action)
+    return run
+  return factory
+
+CASES: list[tuple[str, list[int], Callable[[int], Callable[[], Any]]]] = [
+  ("update_memory", MESSAGE_SCALES, bench_update_memory),
+  ("restore_memory", MESSAGE_SCALES, bench_restore_memory),
+  ("get_lang_content", MODULE_SCALES, bench_get_lang_content),
+  ("get_html_comment", MODULE_SCALES, bench_get_html_comment),
+  ("demands_to_markdown", DEMAND_SCALES, bench_demands_to_markdown),
+  ("is_same_action", MESSAGE_SCALES, bench_is_same_action),
+  ("DemandAnalysis.get_history", MESSAGE_SCALES, bench_history("analyst", "DemandAnalysis", lambda role, action: action.get_history(role))),
+  ("DemandComuniacate.get_history", MESSAGE_SCALES, bench_history("analyst", "DemandComuniacate", lambda role, action: action.get_history())),
+  ("DemandConfirmationAnswer.get_history", MESSAGE_SCALES, bench_history("analyst", "DemandConfirmationAnswer", lambda role, action: action.get_history(role.rc.memory.get(), "斯蒂芬"))),
+  ("DemandConfirmationAnswer.get_history_messages", MESSAGE_SCALES, bench_history("analyst", "DemandConfirmationAnswer", lambda role, action: action.get_history_messages(role, "斯蒂芬"))),
+  ("DemandConfirmationAsk.get_history", MESSAGE_SCALES, bench_history("designer", "DemandConfirmationAsk", lambda role, action: action.get_history(role.rc.memory.get(), ANALYST_NAME))),
+  ("DemandConfirmationAsk.get_history_messages", MESSAGE_SCALES, bench_history("designer", "DemandConfirmationAsk", lambda role, action: action.get_history_messages(role, ANALYST_NAME))),
+  ("DemandChange.get_history_messages", MESSAGE_SCALES, bench_history("analyst", "DemandChange", lambda role, action: action.get_history_messages(role, "斯蒂芬"))),
+  ("UIAnalysis.get_demand_history", MESSAGE_SCALES, bench_history("designer", "UIAnalysis", lambda role, action: action.get_demand_history(role, ANALYST_NAME))),
+  ("UIAnalysis.get_comunication_history", MESSAGE_SCALES, bench_history("designer", "UIAnalysis", lambda role, action: action.get_comunication_history(role))),
+]
+"""（用例名称，数据规模，按规模生成被测函数）"""
+
+def load_baselines(path: str) -> dict[str, Any]:
+  if not os.path.exists(path):
+    return { "reference": 0.0, "cases": {} }
+  with open(path, "r", encoding="utf-8") as file:
+    return json.load(file)
+
+def get_speed(baselines: dict[str, Any], rounds: int, min_time: float) -> tuple[float, float]:
+  """
+  返回（参考负载的耗时，当前机器相对基线所在机器的耗时比例）
+  """
+  reference = measure(reference_workload, rounds, min_time)["min"]
+  return reference, reference / baselines["reference"] if baselines["reference"] > 0 else 1.0
+
+def get_scales(scales: list[int], quick: bool) -> list[int]:
+  return [scale for scale in scales if not quick or scales is not MESSAGE_SCALES or scale <= QUICK_MAX_MESSAGES]
+
+def compare(result: dict[str, float], baseline: float, speed: float) -> float:
+  """
+  当前耗时按参考负载换算到基线所在的机器后，相对基线的倍数
+  """
+  return result["min"] / (baseline * speed)
+
+def main():
+  parser = argparse.ArgumentParser(description="热点路径微基准")
+  parser.add_argument("--filter", default="", help="只运行名称中包含该字符串的用例")
+  parser.add_argument("--quick", action="store_true", help=f"跳过超过{QUICK_MAX_MESSAGES}条消息的规模")
+  parser.add_argument("--rounds", type=int, default=5, help="每个用例执行的轮数")
+  parser.add_argument("--min-time", type=float, default=0.05, help="每轮的最短耗时（秒）")
+  parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="判定为退化的耗时倍数")
+  parser.add_argument("--baseline", default=BASELINE_PATH, help="基线文件路径")
+  parser.add_argument("--update", action="store_true", help="用本次结果更新基线（只更新运行了的用例）")
+  args = parser.parse_args()
+
+  from metagpt.logs import logger
+  logger.remove() # NOTICE: 恢复记忆等路径会打印日志，避免干扰计时和输出
+
+  baselines = load_baselines(args.baseline)
+  reference, speed = get_speed(baselines, args.rounds, args.min_time)
+  print(f"参考负载：{reference * 1000:.3f}ms（基线机器的{speed:.2f}倍）")
+
+  results: dict[str, dict[str, float]] = {}
+  regressions: list[str] = []
+  try:
+    for name, scales, factory in CASES:
+      if args.filter not in name:
+        continue
+      for scale in get_scales(scales, args.quick):
+        case = f"{name}[{scale}]"
+        result = measure(factory(scale), args.rounds, args.min_time)
+        results[case] = result
+        baseline = baselines["cases"].get(case)
+        if baseline is None:
+          print(f"{case}：{result['min'] * 1000:.3f}ms（中位数{result['median'] * 1000:.3f}ms，无基线）")
+          continue
+        ratio = compare(result, baseline, speed)
+        status = "退化" if ratio > args.threshold else "正常"
+        print(f"{case}：{result['min'] * 1000:.3f}ms（中位数{result['median'] * 1000:.3f}ms，基线的{ratio:.2f}倍，{status}）")
+        if ratio > args.threshold:
+          regressions.append(case)
+  finally:
+    cleanup()
+
+  if args.update:
+    baselines["reference"] = reference if baselines["reference"] == 0 else baselines["reference"]
+    for case, result in results.items():
+      baselines["cases"][case] = result["min"] / speed # NOTICE: 按参考负载换算到基线所在的机器，部分更新时保持可比
+    with open(args.baseline, "w", encoding="utf-8") as file:
+      json.dump(baselines, file, ensure_ascii=False, indent=2, sort_keys=True)
+      file.write("\n")
+    print(f"基线已更新：{args.baseline}")
+    return
+
+  if len(regressions) > 0:
+    print(f"以下用例超过基线的{args.threshold}倍：{', '.join(regressions)}")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+  main()
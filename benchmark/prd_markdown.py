@@ -0,0 +1,91 @@
+# 需求文档渲染基准：对比递归拼接字符串和流式写入两种方式生成markdown的耗时，以及深度嵌套时的表现
+# 用法（在snowdream_company的上级目录执行）：python -m snowdream_company.benchmark.prd_markdown [--nodes 5000] [--depth 20000]
+import argparse
+import io
+import os
+import random
+import tempfile
+import time
+from typing import Any
+
+def recursive_markdown(demands: list[dict[str, Any]], parent_level: int = 0) -> str:
+  """
+  原来的递归实现，作为对照
+  """
+  cur_level = parent_level + 1
+  res: list[str] = []
+  for demand in demands:
+    content = f"{'#' * cur_level} {demand['标题']}（优先级：{demand['优先级']}）\n\n{demand['需求描述']}"
+    if "子需求" in demand:
+      content += "\n\n" + recursive_markdown(demand["子需求"], cur_level)
+    res.append(content)
+  return "\n\n".join(res)
+
+def create_tree(nodes: int) -> list[dict[str, Any]]:
+  """
+  生成大约nodes个节点、最多四层的需求树
+  """
+  rng = random.Random(0)
+  roots: list[dict[str, Any]] = []
+  parents: list[tuple[dict[str, Any], int]] = []
+  for idx in range(nodes):
+    demand = { "标题": f"需求{idx}", "优先级": rng.choice(["高", "中", "低"]), "需求描述": f"用户可以在页面中查看和编辑第{idx}项内容，并支持筛选、排序和分页。" * 3 }
+    candidates = [item for item in parents[-50:] if item[1] < 4]
+    if len(roots) < 20 or rng.random() < 0.1 or len(candidates) == 0:
+      roots.append(demand)
+      parents.append((demand, 1))
+      continue
+    parent, level = rng.choice(candidates)
+    parent.setdefault("子需求", []).append(demand)
+    parents.append((demand, level + 1))
+  return roots
+
+def create_chain(depth: int) -> list[dict[str, Any]]:
+  root: dict[str, Any] = { "标题": "需求0", "优先级": "高", "需求描述": "嵌套的需求" }
+  node = root
+  for idx in range(1, depth):
+    child = { "标题": f"需求{idx}", "优先级": "高", "需求描述": "嵌套的需求" }
+    node["子需求"] = [child]
+    node = child
+  return [root]
+
+def measure(func, repeat: int = 5) -> float:
+  start = time.perf_counter()
+  for _ in range(repeat):
+    func()
+  return (time.perf_counter() - start) / repeat
+
+def main():
+  from snowdream_company.tool.markdown import write_demands_markdown
+  from snowdream_company.tool.prd import PRDStore, canonicalize_demands
+
+  parser = argparse.ArgumentParser(description="需求文档渲染基准")
+  parser.add_argument("--nodes", type=int, default=5000, help="需求树的节点数")
+  parser.add_argument("--depth", type=int, default=20000, help="深度嵌套测试中的嵌套层数")
+  args = parser.parse_args()
+
+  tree = canonicalize_demands(create_tree(args.nodes))
+  recursive_time = measure(lambda: recursive_markdown(tree))
+  streaming_time = measure(lambda: write_demands_markdown(tree, io.StringIO()))
+  print(f"{args.nodes}个节点：递归拼接 {recursive_time * 1000:.1f}ms，流式写入 {streaming_time * 1000:.1f}ms")
+
+  project_path = tempfile.mkdtemp(prefix="snowdream_prd_")
+  store = PRDStore(project_path)
+  demands = create_tree(args.nodes)
+  commit_time = measure(lambda: store.commit(demands), repeat=1)
+  size = os.path.getsize(os.path.join(project_path, "prd", f"{store.latest_version()}.md"))
+  print(f"PRDStore.commit（规范化、对比、写入JSON和markdown）：{commit_time * 1000:.1f}ms，markdown {size / 1024:.0f}KB")
+
+  chain = create_chain(args.depth)
+  try:
+    recursive_markdown(chain)
+    recursive_result = "成功"
+  except RecursionError:
+    recursive_result = "RecursionError"
+  start = time.perf_counter()
+  write_demands_markdown(chain, io.StringIO())
+  print(f"{args.depth}层嵌套：递归拼接 {recursive_result}，流式写入 {(time.perf_counter() - start) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,117 @@
+# 提示词前缀缓存基准：用本地替身模型驱动多轮需求确认问答（UI设计师提问、需求分析师回答），
+# 统计按稳定程度组织的提示词和原来的组织方式（角色描述、按问题检索的需求文档和指令拼成一条system消息）在模拟的前缀缓存上的命中率
+# 用法（在snowdream_company的上级目录执行）：python -m snowdream_company.benchmark.prompt_cache [--turns 10] [--demands 40]
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+from typing import Any
+
+LEGACY_ANSWER_TEMPLATE = """{system}
+  这里有一份你总结的需求列表（三个反引号之间，可能只包含和当前问题相关的需求详情以及完整的需求大纲）：```{doc}```。
+
+  用户对其中的某些需求有疑问，根据你们的对话记录，你需要针对用户的询问进行回答。
+
+  请注意，你的任务是写进行回答，而不是模仿聊天记录！不用说出你的名字。
+  """
+LEGACY_ASK_TEMPLATE = """{system}
+  这里有一份需求列表（三个反引号之间，可能只包含和当前问题相关的需求详情以及完整的需求大纲）：```{doc}```。
+
+  你需要从你负责的工作职能出发，主要关注{focus}方面即可！根据以上提供的需求列表以及你和用户的对话记录，找到这些需求在{focus}方面存在的疑问和细节问题，对用户进行提问，请写出你的提问内容。
+
+  请注意，不用说出你的名字。如果没有疑问或者想结束询问，直接回答end（即只有end这一个词）即可！
+  """
+"""原来的提示词模板，作为对照"""
+
+def create_demands(count: int) -> list[dict[str, Any]]:
+  rng = random.Random(0)
+  demands: list[dict[str, Any]] = []
+  for idx in range(count):
+    subject = SUBJECTS[idx % len(SUBJECTS)]
+    demand = { "优先级": rng.choice(["高", "中", "低"]), "标题": f"{subject}功能{idx}", "需求描述": f"用户可以在{subject}页面中查看、筛选和编辑第{idx}项{subject}信息，列表支持分页和排序，编辑时需要校验必填项并给出明确的错误提示。" * 2 }
+    if idx % 4 == 0 or len(demands) == 0:
+      demands.append(demand)
+    else:
+      demands[-1].setdefault("子需求", []).append(demand)
+  return demands
+
+SUBJECTS = ["登录", "注册", "订单", "购物车", "商品", "评价", "优惠券", "消息", "地址", "支付", "退款", "搜索"]
+
+def respond(messages: list[str]) -> str:
+  """
+  替身模型的回复：每一轮问答涉及不同的功能（和真实的需求确认一样逐个确认各个功能的细节），长度接近真实的问答
+  """
+  subject = SUBJECTS[(len(messages) // 2) % len(SUBJECTS)]
+  if "对用户进行提问" in messages[0]: # NOTICE: 第一条system消息是提问或者回答的指令
+    return f"关于{subject}相关的页面，{subject}列表为空时需要展示什么样的空状态？{subject}信息编辑失败时，错误提示放在表单顶部还是字段旁边？{subject}的操作按钮在移动端是否需要固定在底部？"
+  return f"{subject}列表为空时展示插画和引导创建的按钮；编辑失败时错误提示显示在对应字段的下方，同时在表单顶部汇总显示错误数量；移动端的{subject}操作按钮固定在页面底部，桌面端跟随表单内容。"
+
+async def run_turns(turns: int, demands: list[dict[str, Any]]):
+  from metagpt.schema import Message
+  from snowdream_company.roles.demand_analyst import DemandAnalysis, DemandAnalyst, DemandConfirmationAnswer, DemandConfirmationAsk, get_qa_turns
+  from snowdream_company.roles.ui_designer import UIDesigner
+  from snowdream_company.tool.prd import PRDStore
+  from snowdream_company.tool.prefix_cache import PrefixCache, StandInLLM, serialize_request
+  from snowdream_company.tool.retrieval import get_demand_segments
+  from snowdream_company.tool.team import init_project
+  from snowdream_company.tool.type import is_same_action
+
+  project_path = tempfile.mkdtemp(prefix="snowdream_prompt_")
+  init_project(project_path)
+  PRDStore(project_path).commit(demands)
+  analyst = DemandAnalyst(project_path=project_path, restore_policy="fresh")
+  designer = UIDesigner(project_path=project_path, restore_policy="fresh")
+  cache = PrefixCache()
+  legacy_cache = PrefixCache()
+  llm = StandInLLM(respond, cache)
+  ask: DemandConfirmationAsk = designer.get_action(DemandConfirmationAsk)
+  answer: DemandConfirmationAnswer = analyst.get_action(DemandConfirmationAnswer)
+  for action in [ask, answer]:
+    action.set_llm(llm, override=True)
+
+  doc = Message(content=json.dumps(demands, ensure_ascii=False), role=analyst.profile, cause_by=DemandAnalysis)
+  analyst.add_memory(doc)
+  designer.rc.memory.add(doc)
+  def get_legacy_context(query: str, k: int, turns: list[tuple[str, str]]):
+    """
+    旧版本的需求文档上下文：相关需求详情在前，需求大纲在后，整体放在system消息中
+    """
+    outline, details = get_demand_segments(project_path, query, k, doc.content, turns)
+    return f"{details}\n\n{outline}" if details else outline
+
+  for _ in range(turns):
+    last_msg = designer.rc.memory.get(k=1)[0]
+    query = designer.focus + (f"\n{last_msg.content}" if is_same_action(last_msg.cause_by, str(DemandConfirmationAnswer)) else "")
+    legacy_doc = get_legacy_context(query, designer.context_top_k, get_qa_turns(designer))
+    legacy_system = LEGACY_ASK_TEMPLATE.format(system=designer.get_system_msg(), doc=legacy_doc, focus=designer.focus)
+    legacy_cache.lookup(serialize_request(ask.get_history_messages(designer, last_msg.sent_from), [legacy_system]))
+    question = Message(content=await ask.run(designer), role=designer.profile, cause_by=DemandConfirmationAsk, send_to={analyst.name})
+    designer.add_memory(question)
+    analyst.rc.memory.add(question)
+
+    legacy_doc = get_legacy_context(question.content, analyst.context_top_k, get_qa_turns(analyst))
+    legacy_system = LEGACY_ANSWER_TEMPLATE.format(system=analyst.get_system_msg(), doc=legacy_doc)
+    legacy_cache.lookup(serialize_request(answer.get_history_messages(analyst, designer.name), [legacy_system]))
+    reply = Message(content=await answer.run(analyst), role=analyst.profile, cause_by=DemandConfirmationAnswer, send_to={designer.name})
+    analyst.add_memory(reply)
+    designer.rc.memory.add(reply)
+
+  return legacy_cache, cache
+
+def print_stats(name: str, stats: dict[str, Any]):
+  print(f"{name}：{stats['requests']}次请求，命中{stats['hit_requests']}次，提示词共{stats['chars']}字符，命中缓存{stats['cached']}字符（{stats['hit_rate'] * 100:.1f}%，占最后一条消息之前部分的{stats['prefix_hit_rate'] * 100:.1f}%）")
+
+def main():
+  parser = argparse.ArgumentParser(description="提示词前缀缓存基准")
+  parser.add_argument("--turns", type=int, default=10, help="需求确认问答的轮数")
+  parser.add_argument("--demands", type=int, default=40, help="需求的数量（超过context_top_k时按问题检索需求详情）")
+  args = parser.parse_args()
+
+  legacy_cache, cache = asyncio.run(run_turns(args.turns, create_demands(args.demands)))
+  print_stats("原来的组织方式", legacy_cache.stats())
+  print_stats("按稳定程度组织", cache.stats())
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,91 @@
+# 启动耗时基准：统计各模块的导入耗时以及各角色恢复记忆的耗时
+# 用法（在snowdream_company的上级目录执行）：python -m snowdream_company.benchmark.startup [--project 项目路径] [--messages 10000]
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+MODULES = [
+  "metagpt.roles",
+  "snowdream_company.roles.restorable_role",
+  "snowdream_company.roles.demand_analyst",
+  "snowdream_company.roles.ui_designer",
+  "snowdream_company.tool.browser",
+  "snowdream_company.tool.ui",
+]
+
+def measure_import(module: str) -> float:
+  """
+  在新的进程中导入模块，返回导入耗时（秒）
+  """
+  code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+  output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+  return float(output.stdout.strip().splitlines()[-1])
+
+def create_project(messages: int) -> str:
+  """
+  生成一个带有模拟记忆的临时项目
+  """
+  from metagpt.schema import Message
+  from snowdream_company.roles.demand_analyst import DemandConfirmationAsk, DemandConfirmationAnswer
+  from snowdream_company.tool.message_store import MessageStore
+
+  project_path = tempfile.mkdtemp(prefix="snowdream_startup_")
+  for directory in ["memory", "prd", os.path.join("ui", "1.0.0")]:
+    os.makedirs(os.path.join(project_path, directory), exist_ok=True)
+  store = MessageStore(project_path)
+  records = []
+  for idx in range(messages):
+    action = DemandConfirmationAsk if idx % 2 == 0 else DemandConfirmationAnswer
+    msg = Message(content=f"第{idx}条需求确认消息，" * 10, role="user", cause_by=action, sent_from="斯蒂芬")
+    records.append(store.to_record(msg))
+  for name in ["李莉_demand analyst", "斯蒂芬_ui designer"]:
+    with open(os.path.join(project_path, "memory", f"{name}.json"), "w", encoding="utf-8") as file:
+      json.dump(records, file)
+
+  return project_path
+
+def measure_restore(project_path: str) -> dict[str, dict[str, float]]:
+  """
+  分别统计各角色的构造耗时以及首次使用记忆时的恢复耗时
+  """
+  from snowdream_company.roles.demand_analyst import DemandAnalyst
+  from snowdream_company.roles.ui_designer import UIDesigner
+
+  res: dict[str, dict[str, float]] = {}
+  for role_class in [DemandAnalyst, UIDesigner]:
+    start = time.perf_counter()
+    role = role_class(project_path=project_path, restore_policy="restore")
+    init_time = time.perf_counter() - start
+    start = time.perf_counter()
+    role.ensure_memory()
+    restore_time = time.perf_counter() - start
+    res[f"{role.name}({role.profile})"] = {
+      "init": init_time,
+      "restore": restore_time,
+      "messages": role.rc.memory.count(),
+    }
+
+  return res
+
+def main():
+  parser = argparse.ArgumentParser(description="启动耗时基准")
+  parser.add_argument("--project", default="", help="已有的项目路径，不传则生成模拟项目")
+  parser.add_argument("--messages", type=int, default=10000, help="模拟项目中每个角色的记忆条数")
+  args = parser.parse_args()
+
+  print("模块导入耗时：")
+  for module in MODULES:
+    print(f"  {module:<45} {measure_import(module) * 1000:>8.1f} ms")
+
+  project_path = args.project or create_project(args.messages)
+  print(f"角色恢复耗时（{project_path}）：")
+  for name, item in measure_restore(project_path).items():
+    print(f"  {name:<30} 构造 {item['init'] * 1000:>8.1f} ms  恢复 {item['restore'] * 1000:>8.1f} ms  记忆 {item['messages']} 条")
+
+
+if __name__ == "__main__":
+  main()
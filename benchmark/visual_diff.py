@@ -0,0 +1,53 @@
+# 截图对比基准：模拟一批整页截图的新旧两版，分别统计解码和对比的耗时
+# 用法（在snowdream_company的上级目录执行）：python -m snowdream_company.benchmark.visual_diff [--modules 36] [--height 3000]
+import argparse
+import io
+import time
+
+def create_screenshots(modules: int, width: int, height: int) -> list[tuple[bytes, bytes]]:
+  """
+  生成每个模块新旧两版的png截图：三分之一的模块有局部变化，其余完全相同
+  """
+  import numpy as np
+  from PIL import Image
+
+  rng = np.random.default_rng(0)
+  pairs: list[tuple[bytes, bytes]] = []
+  for idx in range(modules):
+    old = np.full((height, width, 3), 245, dtype=np.uint8)
+    for top in range(0, height, 120):
+      old[top + 20:top + 100, 40:width - 40] = rng.integers(0, 256, 3, dtype=np.uint8) # NOTICE: 模拟卡片、表格等色块
+    new = old.copy()
+    if idx % 3 == 0:
+      new[200:260, 100:500] = 0
+    encoded: list[bytes] = []
+    for image in [old, new]:
+      buffer = io.BytesIO()
+      Image.fromarray(image).save(buffer, format="PNG")
+      encoded.append(buffer.getvalue())
+    pairs.append((encoded[0], encoded[1]))
+  return pairs
+
+def main():
+  from snowdream_company.tool.visual_diff import DIFF_THRESHOLD, decode_image, diff_images
+
+  parser = argparse.ArgumentParser(description="截图对比基准")
+  parser.add_argument("--modules", type=int, default=36, help="模块数量")
+  parser.add_argument("--width", type=int, default=1280, help="截图宽度")
+  parser.add_argument("--height", type=int, default=3000, help="截图高度")
+  args = parser.parse_args()
+
+  pairs = create_screenshots(args.modules, args.width, args.height)
+  start = time.perf_counter()
+  images = [(decode_image(old), decode_image(new)) for old, new in pairs]
+  decode_time = time.perf_counter() - start
+  start = time.perf_counter()
+  ratios = [diff_images(old, new)[0] for old, new in images]
+  diff_time = time.perf_counter() - start
+  changed = len([ratio for ratio in ratios if ratio >= DIFF_THRESHOLD])
+  print(f"{args.modules}个模块（{args.width}x{args.height}），有变化{changed}个")
+  print(f"解码 {decode_time * 1000:.1f}ms，对比 {diff_time * 1000:.1f}ms（平均每个模块 {diff_time * 1000 / args.modules:.2f}ms）")
+
+
+if __name__ == "__main__":
+  main()
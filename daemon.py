@@ -0,0 +1,216 @@
+# 守护进程：常驻内存的团队服务，保持角色实例（及其恢复好的记忆）、LLM客户端和浏览器池，避免每个需求都重新启动进程
+# 用法（在snowdream_company的上级目录执行）：
+#   python -m snowdream_company.daemon --socket /tmp/snowdream.sock   # Unix socket
+#   python -m snowdream_company.daemon --port 8765                     # 本机TCP端口
+# 协议：每行一个JSON请求，服务端以每行一个JSON事件的形式推送进度
+#   {"type": "requirement", "project": "项目路径", "content": "用户需求", "n_round": 5}  发布需求，并订阅该项目的事件
+#   {"type": "answer", "project": "项目路径", "content": "回答"}                         回答当前等待中的问题
+#   {"type": "subscribe", "project": "项目路径"}                                         订阅项目的事件
+#   {"type": "status"}                                                                   查看所有项目的状态
+# 事件：started、message（团队内发布的消息）、question（需要用户回答）、done、error、accepted、status
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Any, Optional
+from metagpt.llm import LLM
+from metagpt.logs import logger
+from metagpt.schema import Message
+import snowdream_company.roles.demand_analyst # NOTICE: 启动时就导入角色模块，第一个需求不再承担导入的耗时
+import snowdream_company.roles.ui_designer
+from snowdream_company.tool.browser import browser_pool
+from snowdream_company.tool.model_tiers import load_model_routing
+from snowdream_company.tool.team import create_team, run_team
+from snowdream_company.tool.ui import set_input_provider
+
+Event = dict[str, Any]
+
+
+class ProjectSession:
+  """
+  一个项目的常驻会话：团队只创建一次，之后的需求和回答都复用同一批角色实例
+  """
+  def __init__(self, project_path: str, role_kwargs: dict[str, Any]):
+    self.project_path = project_path
+    self.team = create_team(project_path, **role_kwargs)
+    self.team.env.listeners.append(self.on_message)
+    self.subscribers: set[asyncio.Queue] = set()
+    self.answers: asyncio.Queue[str] = asyncio.Queue()
+    self.question: Optional[Event] = None
+    """当前等待用户回答的问题"""
+    self.task: Optional[asyncio.Task] = None
+    self.started_at = 0.0
+
+  @property
+  def running(self):
+    return self.task is not None and not self.task.done()
+
+  def emit(self, event: Event):
+    event = { "project": self.project_path, "time": time.time(), **event }
+    for queue in self.subscribers:
+      queue.put_nowait(event)
+
+  def on_message(self, message: Message):
+    self.emit({
+      "event": "message",
+      "role": message.role,
+      "sent_from": message.sent_from,
+      "cause_by": message.cause_by,
+      "content": message.content,
+    })
+
+  async def ask(self, title: str, tip: str, detail: str) -> str:
+    """
+    用户输入的提供者：推送问题事件，等待客户端回答
+    """
+    self.question = {
+      "event": "question",
+      "title": title,
+      "tip": tip,
+      "detail": detail,
+      "elapsed": time.time() - self.started_at,
+    }
+    self.emit(self.question)
+    answer = await self.answers.get()
+    self.question = None
+    return answer
+
+  def answer(self, content: str):
+    """
+    回答当前等待中的问题；没有问题或者问题已经被回答时报错，避免回答被之后的提问取走
+    """
+    if self.question is None or not self.answers.empty():
+      raise RuntimeError("当前没有等待回答的问题")
+    self.answers.put_nowait(content)
+
+  def submit(self, idea: str, n_round: int):
+    if self.running:
+      raise RuntimeError("项目正在运行中，请等待完成后再提交新的需求")
+    self.task = asyncio.create_task(self.run(idea, n_round))
+
+  async def run(self, idea: str, n_round: int):
+    set_input_provider(self.ask) # NOTICE: 只影响当前任务以及团队运行时创建的子任务
+    self.started_at = time.time()
+    self.emit({ "event": "started", "content": idea })
+    try:
+      await run_team(self.team, idea, n_round)
+      self.emit({ "event": "done", "elapsed": time.time() - self.started_at })
+    except Exception as error:
+      logger.exception(error)
+      self.emit({ "event": "error", "error": repr(error) })
+
+  def get_status(self) -> Event:
+    return {
+      "project": self.project_path,
+      "running": self.running,
+      "question": self.question,
+      "roles": { role.name: role.rc.memory.count() for role in self.team.env.roles.values() },
+    }
+
+
+class Daemon:
+  def __init__(self, role_kwargs: dict[str, Any], n_round: int = 5):
+    self.role_kwargs = role_kwargs
+    self.n_round = n_round
+    self.sessions: dict[str, ProjectSession] = {}
+    self.llm = LLM()
+    """常驻的LLM客户端，各个项目的角色共用其连接池"""
+
+  def get_session(self, project_path: str) -> ProjectSession:
+    key = os.path.abspath(project_path)
+    if key not in self.sessions:
+      start = time.perf_counter()
+      self.sessions[key] = ProjectSession(key, { **self.role_kwargs, "llm": self.llm })
+      logger.info(f"创建项目会话 {key}，耗时 {(time.perf_counter() - start) * 1000:.1f} ms")
+    return self.sessions[key]
+
+  def handle_request(self, request: dict[str, Any], outbox: asyncio.Queue, subscriptions: set[ProjectSession]):
+    request_type = request.get("type")
+    if request_type == "status":
+      outbox.put_nowait({ "event": "status", "sessions": [session.get_status() for session in self.sessions.values()] })
+      return
+
+    session = self.get_session(request["project"])
+    if request_type in ["requirement", "subscribe"]:
+      session.subscribers.add(outbox)
+      subscriptions.add(session)
+      if session.question is not None:
+        outbox.put_nowait(session.question) # NOTICE: 重新订阅时补发还没有回答的问题
+    if request_type == "requirement":
+      session.submit(request["content"], request.get("n_round", self.n_round))
+    elif request_type == "answer":
+      session.answer(request["content"])
+    elif request_type != "subscribe":
+      raise ValueError(f"未知的请求类型：{request_type}")
+    outbox.put_nowait({ "event": "accepted", "project": session.project_path, "type": request_type })
+
+  async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    outbox: asyncio.Queue[Event] = asyncio.Queue()
+    subscriptions: set[ProjectSession] = set()
+
+    async def send_events():
+      while True:
+        event = await outbox.get()
+        writer.write(json.dumps(event, ensure_ascii=False).encode("utf-8") + b"\n")
+        await writer.drain()
+
+    sender = asyncio.create_task(send_events())
+    try:
+      while True:
+        line = await reader.readline()
+        if not line:
+          break
+        if line.strip() == b"":
+          continue
+        try:
+          self.handle_request(json.loads(line), outbox, subscriptions)
+        except Exception as error:
+          outbox.put_nowait({ "event": "error", "error": repr(error) })
+    finally:
+      for session in subscriptions:
+        session.subscribers.discard(outbox)
+      # NOTICE: 尽量把已经产生的事件发送完
+      while not outbox.empty() and not sender.done():
+        await asyncio.sleep(0.01)
+      sender.cancel()
+      writer.close()
+
+  async def serve(self, socket_path: str = "", host: str = "127.0.0.1", port: int = 0):
+    if socket_path:
+      if os.path.exists(socket_path):
+        os.remove(socket_path)
+      server = await asyncio.start_unix_server(self.handle_connection, path=socket_path)
+    else:
+      server = await asyncio.start_server(self.handle_connection, host=host, port=port)
+    logger.info(f"守护进程已启动：{socket_path or f'{host}:{port}'}")
+    async with server:
+      await server.serve_forever()
+
+
+async def main():
+  parser = argparse.ArgumentParser(description="团队守护进程")
+  parser.add_argument("--socket", default="", help="Unix socket路径")
+  parser.add_argument("--host", default="127.0.0.1", help="不使用Unix socket时监听的地址")
+  parser.add_argument("--port", type=int, default=8765, help="不使用Unix socket时监听的端口")
+  parser.add_argument("--browsers", type=int, default=1, help="浏览器池的大小，为0时每次截图临时启动浏览器")
+  parser.add_argument("--n-round", type=int, default=5, help="每个需求最多运行的轮数")
+  parser.add_argument("--compression", default="none", help="记忆等文件的压缩格式")
+  parser.add_argument("--model-routing", default="", help="模型路由的配置文件（JSON），为空时所有行为使用同一个模型")
+  args = parser.parse_args()
+
+  if args.browsers > 0:
+    browser_pool.size = args.browsers
+    try:
+      await browser_pool.start()
+    except Exception as error:
+      logger.warning(f"浏览器池启动失败，截图时将临时启动浏览器：{error}")
+  daemon = Daemon({ "restore_policy": "restore", "compression": args.compression, **load_model_routing(args.model_routing) }, args.n_round)
+  try:
+    await daemon.serve(args.socket, args.host, args.port)
+  finally:
+    await browser_pool.close()
+
+
+if __name__ == "__main__":
+  asyncio.run(main())
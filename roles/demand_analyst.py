@@ -1,9 +1,10 @@
 # 需求分析师
 
+import asyncio
 from datetime import datetime
 import json
 import os
-from typing import Any, Optional
+from typing import Any, ClassVar, Optional
 from metagpt.actions import Action
 from metagpt.roles import Role
 from metagpt.schema import Message
@@ -11,10 +12,15 @@ from metagpt.logs import logger
 from metagpt.roles.role import RoleContext
 from snowdream_company.roles.restorable_role import RestorableRole
 from snowdream_company.actions.restorable_action import RestorableAction
-from snowdream_company.tool.markdown import demands_to_markdown, get_lang_content
+from snowdream_company.tool.markdown import get_lang_content
+from snowdream_company.tool.model_tiers import FAST_TIER
+from snowdream_company.tool.prd import PRDStore
+from snowdream_company.tool.prompt_layout import DOC_SEGMENT, STATIC_SEGMENT, PromptLayout
+from snowdream_company.tool.retrieval import get_demand_segments
 from metagpt.actions.add_requirement import UserRequirement
 from snowdream_company.tool.type import is_same_action
-from snowdream_company.tool.ui import get_user_input
+from snowdream_company.tool.state_machine import Transition
+from snowdream_company.tool.ui import ask_user_input
 
 class DemandAnalysis(RestorableAction):
   """
@@ -44,13 +50,14 @@ class DemandAnalysis(RestorableAction):
     if self.need_restore and self.finished:
       return last_msg.content
 
-    history = self.get_history(role.rc.memory.get())
+    history = self.get_history(role)
     prompt = {
       "role": "user",
       "content": self.PROMPT_TEMPLATE
     }
 
-    answer = await self.llm.aask(
+    answer = await self.aask_resumable(
+      role.get_project_path(),
       msg=history + [prompt],
       system_msgs=[role.get_system_msg()]
     )
@@ -60,37 +67,32 @@ class DemandAnalysis(RestorableAction):
 
     return res
 
-  def get_history(self, memories: list[Message]):
-    records: list[dict[str, str]] = []
-    
-    for memory in memories:
+  def get_history(self, role: RestorableRole) -> list[dict[str, str]]:
+    def mapper(memory: Message):
       if is_same_action(memory.cause_by, str(DemandComuniacate)):
         # 需要对end的消息进行处理
         if memory.role == "user" and memory.content == "end":
-          continue
-        role = "user" if memory.role == "user" else "assistant"
-        records.append({
-          "role": role,
+          return None
+        return {
+          "role": "user" if memory.role == "user" else "assistant",
           "content": memory.content
-        })
+        }
       if is_same_action(memory.cause_by, str(UserRequirement)):
-        records.append({
+        return {
           "role": "user",
           "content": memory.content
-        })
+        }
+      return None
 
-    return records
+    return role.get_view((self.name, "history"), mapper, include_archive=True) # NOTICE: 总结需求时沟通已经结束，可能已经归档
 
   def save_doc(self, project_path: str, answer: str):
     demand_json = get_lang_content(answer)
     flow_chat = get_lang_content(answer, lang="mermaid")
     demands: list[dict[str, Any]] = json.loads(demand_json)
-    demand_content = demands_to_markdown(demands)
-    doc_path = os.path.join(project_path, "prd", "1.0.0.md")
-    doc = f"# 业务流程图\n\n```mermaid\n{flow_chat}\n```\n\n{demand_content}"
+    header = f"# 业务流程图\n\n```mermaid\n{flow_chat}\n```\n\n"
 
-    with open(doc_path, "w", encoding="utf-8") as f:
-      f.write(doc)
+    return PRDStore(project_path).commit(demands, header)
 
 
 class DemandComuniacate(RestorableAction):
@@ -99,6 +101,7 @@ class DemandComuniacate(RestorableAction):
   """
   name: str = "DemandComuniacate"
   role: Optional[RestorableRole] = None
+  TIER: ClassVar[str] = FAST_TIER
   SYSTEM_PROMPT: str = """{system}
 
   你需要根据你和用户的对话记录，针对有疑惑的地方，询问用户具体的需求细节，如果你觉得目前的需求已经很明确了，直接回答end（即只有end这一个词）。
@@ -127,10 +130,7 @@ class DemandComuniacate(RestorableAction):
     system_msg = self.SYSTEM_PROMPT.format(system=self.role.get_system_msg())
 
     logger.info("询问中……")
-    question = await self.llm.aask(
-      system_msgs=[system_msg],
-      msg=history
-    )
+    question = await self.aask_or_end(self.role, msg=history, system_msgs=[system_msg])
 
     # 记录交流的内容
     communication_msg = Message(content=question, role=self.role.profile, cause_by=type(self))
@@ -147,7 +147,8 @@ class DemandComuniacate(RestorableAction):
     """
     获取用户的回答
     """
-    user_content = get_user_input("需求沟通", "你的回答（end代表没有问题了）：")
+    question = self.role.rc.memory.get(k=1)[0].content
+    user_content = await ask_user_input("需求沟通", "你的回答（end代表没有问题了）：", question)
     logger.info(user_content)
     use_msg = Message(content=user_content, role="user", cause_by=type(self))
     self.role.add_memory(use_msg)
@@ -163,9 +164,7 @@ class DemandComuniacate(RestorableAction):
     """
     恢复之前的沟通
     """
-    memories = self.role.rc.memory.get()
-    related_memories = [memory for memory in memories if memory.cause_by == self.name]
-    last_memory = related_memories[-1]
+    last_memory = self.role.rc.memory.get_by_action(type(self))[-1] # NOTICE: 索引的键是完整的“模块.类名”，不能用行为的短名称
 
     if last_memory.role == "user":
       res = await self.get_communication()
@@ -182,109 +181,173 @@ class DemandComuniacate(RestorableAction):
     """
     获取角色和用户之间的沟通记录
     """
-    records: list[dict[str, str]] = []
-    memories = self.role.rc.memory.get()
-
-    for memory in memories:
+    def mapper(memory: Message):
       if is_same_action(memory.cause_by, str(DemandComuniacate)):
-        role = "user" if memory.role == "user" else "assistant"
-        records.append({
-          "role": role,
+        return {
+          "role": "user" if memory.role == "user" else "assistant",
           "content": memory.content
-        })
+        }
       if is_same_action(memory.cause_by, str(UserRequirement)):
-        records.append({
+        return {
           "role": "user",
           "content": memory.content
-        })
+        }
+      return None
+
+    return self.role.get_view((self.name, "history"), mapper)
+
+def get_qa_turns(role: RestorableRole) -> list[tuple[str, str]]:
+  """
+  需求确认相关的历史问答，用于需求上下文的检索
+  """
+  def mapper(memory: Message):
+    if memory.content == "end":
+      return None
+    if is_same_action(memory.cause_by, str(DemandConfirmationAsk)) or is_same_action(memory.cause_by, str(DemandConfirmationAnswer)):
+      return (memory.id, memory.content)
+    return None
+
+  return role.get_view(("qa_turns",), mapper)
+
+def get_analysis_doc(role: RestorableRole) -> str:
+  """
+  需求分析得到的需求列表（直接通过memory的cause_by索引查找）
+  """
+  return role.rc.memory.get_by_action(DemandAnalysis)[-1].content
 
-    return records
+def get_confirmation_layout(role: RestorableRole, system_prompt: str, doc_template: str, query: str, fallback: str, history: Optional[list[dict[str, str]]] = None, turn: str = "") -> PromptLayout:
+  """
+  需求确认类请求的提示词：静态指令、按版本的需求文档（或需求大纲）、对话记录依次排列，
+  本轮的内容以及和query相关的需求详情放在最后，多轮问答之间可以复用同一个前缀
+  """
+  history = history or []
+  doc, details = get_demand_segments(role.get_project_path(), query, role.context_top_k, fallback, get_qa_turns(role))
+  layout = PromptLayout().add_segment(STATIC_SEGMENT, system_prompt).add_segment(DOC_SEGMENT, doc_template.format(doc=doc)).add_history(history)
+  return layout.add_turn(turn).add_turn(f"（和上述内容相关的{details}）" if details else "")
 
 class DemandConfirmationAnswer(RestorableAction):
   name: str = "DemandConfirmationAnswer"
-  PROMPT_TEMPLATE: str = """{system}
-  这里有一份你总结的需求列表（三个反引号之间）：```{doc}```。
-
-  用户对其中的某些需求有疑问，根据你们的对话记录，你需要针对用户的询问进行回答。
+  SYSTEM_PROMPT: str = """{system}
+  用户会对你总结的需求列表中的某些需求有疑问，根据你们的对话记录，你需要针对用户的询问进行回答。
 
   请注意，你的任务是写进行回答，而不是模仿聊天记录！不用说出你的名字。
   """
+  BATCH_PROMPT: str = """{system}
+  有多位同事同时对你总结的需求列表中的某些需求有疑问，之后会按同事的名字分别列出你们之间的对话记录（other代表同事，you代表你）以及同事的最新提问，你需要针对每位同事的最新提问分别进行回答。
+
+  请用一个JSON对象返回所有的回答，对象的键为同事的名字，值为对该同事的回答内容，并用json代码块进行包裹。请注意，你的任务是写进行回答，而不是模仿聊天记录！不用说出你的名字。
+  """
+  DOC_TEMPLATE: str = """这里有一份你总结的需求列表（三个反引号之间，可能只包含完整的需求大纲，和提问相关的需求详情会附在最新的提问后面）：```{doc}```。"""
 
   async def run(self, role: RestorableRole):
     last_msg = role.rc.memory.get(k=1)[0]
     if self.need_restore and self.finished:
       return last_msg.content
-    memories = role.rc.memory.get()
     # history = self.get_history(memories, last_msg.sent_from)
-    doc = self.get_doc(memories)
-    system_msg = self.PROMPT_TEMPLATE.format(system=role.get_system_msg(), doc=doc)
+    system_prompt = self.SYSTEM_PROMPT.format(system=role.get_system_msg())
+    history = self.get_history_messages(role, last_msg.sent_from)
+    layout = get_confirmation_layout(role, system_prompt, self.DOC_TEMPLATE, last_msg.content, self.get_doc(role), history)
 
     res = await self.llm.aask(
-      msg=self.get_history_messages(memories, last_msg.sent_from),
-      system_msgs=[system_msg]
+      msg=layout.msg,
+      system_msgs=layout.system_msgs
     )
 
     return res
 
+  async def run_batch(self, role: RestorableRole, pending: dict[str, list[Message]]) -> dict[str, str]:
+    """
+    在一次LLM请求中同时回答多位同事的提问，返回每位提问者对应的回答
+    """
+    memories = role.rc.memory.get()
+    query = "\n".join([ask.content for asks in pending.values() for ask in asks])
+    sections: list[str] = []
+    for name, asks in pending.items():
+      ask_ids = set([ask.id for ask in asks]) # NOTICE: 按id比较，避免pydantic模型逐字段比较
+      history = self.get_history([memory for memory in memories if memory.id not in ask_ids], name)
+      questions = "\n".join([ask.content for ask in asks])
+      sections.append(f"## {name}\n\n对话记录：\n{history or '无'}\n\n最新提问：\n{questions}")
+
+    layout = get_confirmation_layout(role, self.BATCH_PROMPT.format(system=role.get_system_msg()), self.DOC_TEMPLATE, query, self.get_doc(role), turn="\n\n".join(sections))
+    res = await self.llm.aask(
+      msg=layout.msg,
+      system_msgs=layout.system_msgs
+    )
+    answers: dict[str, str] = {}
+    try:
+      answers = json.loads(get_lang_content(res))
+    except (IndexError, ValueError):
+      logger.warning(f"{self.name}: 批量回答的格式不正确，改为逐个回答")
+
+    # NOTICE: 批量回答中缺失的提问者单独进行回答
+    for name, asks in pending.items():
+      if not isinstance(answers.get(name), str) or answers[name] == "":
+        query = "\n".join([ask.content for ask in asks])
+        history = self.get_history_messages(role, name)
+        layout = get_confirmation_layout(role, self.SYSTEM_PROMPT.format(system=role.get_system_msg()), self.DOC_TEMPLATE, query, self.get_doc(role), history)
+        answers[name] = await self.llm.aask(
+          msg=layout.msg,
+          system_msgs=layout.system_msgs
+        )
+
+    return {name: answers[name] for name in pending}
+
   def get_history(self, memories: list[Message], name: str):
     records: list[str] = []
     for memory in memories:
       if is_same_action(memory.cause_by, str(DemandConfirmationAsk)) and memory.sent_from == name:
         records.append(f"other: {memory.content}")
-      elif is_same_action(memory.cause_by, str(DemandConfirmationAnswer)):
+      elif is_same_action(memory.cause_by, str(DemandConfirmationAnswer)) and name in memory.send_to:
         records.append(f"you: {memory.content}")
       else:
         continue
 
     return "\n".join(records)
 
-  def get_history_messages(self, memories: list[Message], name: str):
-    messages: list[dict[str, str]] = []
-    for memory in memories:
+  def get_history_messages(self, role: RestorableRole, name: str) -> list[dict[str, str]]:
+    def mapper(memory: Message):
       if is_same_action(memory.cause_by, str(DemandConfirmationAsk)) and memory.sent_from == name:
-        messages.append({
+        return {
           "role": "user",
           "content": memory.content
-        })
-      elif is_same_action(memory.cause_by, str(DemandConfirmationAnswer)):
-        messages.append({
+        }
+      if is_same_action(memory.cause_by, str(DemandConfirmationAnswer)) and name in memory.send_to:
+        return {
           "role": "assistant",
           "content": memory.content
-        })
-      else:
-        continue
+        }
+      return None
 
-    return messages
+    return role.get_view((self.name, "history_messages", name), mapper)
 
-  def get_doc(self, memories: list[Message]):
-    docs = [memory for memory in memories if is_same_action(memory.cause_by, str(DemandAnalysis))]
-    return docs[-1].content
+  def get_doc(self, role: RestorableRole):
+    return get_analysis_doc(role)
 
 
 class DemandConfirmationAsk(RestorableAction):
   name: str = "DemandConfirmationAsk"
-  PROMPT_TEMPLATE: str = """{system}
-  这里有一份需求列表（三个反引号之间）：```{doc}```。
-
-  你需要从你负责的工作职能出发，主要关注{focus}方面即可！根据以上提供的需求列表以及你和用户的对话记录，找到这些需求在{focus}方面存在的疑问和细节问题，对用户进行提问，请写出你的提问内容。
+  TIER: ClassVar[str] = FAST_TIER
+  SYSTEM_PROMPT: str = """{system}
+  你需要从你负责的工作职能出发，主要关注{focus}方面即可！根据提供的需求列表以及你和用户的对话记录，找到这些需求在{focus}方面存在的疑问和细节问题，对用户进行提问，请写出你的提问内容。
 
   请注意，不用说出你的名字。如果没有疑问或者想结束询问，直接回答end（即只有end这一个词）即可！
   """
+  DOC_TEMPLATE: str = """这里有一份需求列表（三个反引号之间，可能只包含完整的需求大纲，和当前问题相关的需求详情会附在最新的消息后面）：```{doc}```。"""
 
   async def run(self, role: RestorableRole):
     last_msg = role.rc.memory.get(k=1)[0]
     if self.need_restore and self.finished:
       return last_msg.content
-    memories = role.rc.memory.get()
     # history = self.get_history(memories, last_msg.sent_from)
-    doc = self.get_doc(memories)
-    system_msg = self.PROMPT_TEMPLATE.format(system=role.get_system_msg(), doc=doc, focus=role.focus)
+    query = role.focus
+    if is_same_action(last_msg.cause_by, str(DemandConfirmationAnswer)):
+      query += f"\n{last_msg.content}"
+    system_prompt = self.SYSTEM_PROMPT.format(system=role.get_system_msg(), focus=role.focus)
+    history = self.get_history_messages(role, last_msg.sent_from)
+    layout = get_confirmation_layout(role, system_prompt, self.DOC_TEMPLATE, query, self.get_doc(role), history)
 
     # res = await self._aask(prompt, role.get_system_msg())
-    res = await self.llm.aask(
-      msg=self.get_history_messages(memories, last_msg.sent_from),
-      system_msgs=[system_msg]
-    )
+    res = await self.aask_or_end(role, msg=layout.msg, system_msgs=layout.system_msgs)
 
     return res
 
@@ -300,32 +363,29 @@ class DemandConfirmationAsk(RestorableAction):
 
     return "\n".join(records)
 
-  def get_history_messages(self, memories: list[Message], name: str):
-    messages: list[dict[str, str]] = [
-      {
-        "role": "user",
-        "content": "你对需求列表有什么疑问吗？"
-      }
-    ]
-    for memory in memories:
+  def get_history_messages(self, role: RestorableRole, name: str) -> list[dict[str, str]]:
+    def mapper(memory: Message):
       if is_same_action(memory.cause_by, str(DemandConfirmationAnswer)) and memory.sent_from == name:
-        messages.append({
+        return {
           "role": "user",
           "content": memory.content
-        })
-      elif is_same_action(memory.cause_by, str(DemandConfirmationAsk)):
-        messages.append({
+        }
+      if is_same_action(memory.cause_by, str(DemandConfirmationAsk)):
+        return {
           "role": "assistant",
           "content": memory.content
-        })
-      else:
-        continue
+        }
+      return None
 
-    return messages
+    return [
+      {
+        "role": "user",
+        "content": "你对需求列表有什么疑问吗？"
+      }
+    ] + role.get_view((self.name, "history_messages", name), mapper, include_archive=True) # NOTICE: 包括之前几轮已经结束的提问，避免重复提问
 
-  def get_doc(self, memories: list[Message]):
-    docs = [memory for memory in memories if is_same_action(memory.cause_by, str(DemandAnalysis))]
-    return docs[-1].content
+  def get_doc(self, role: RestorableRole):
+    return get_analysis_doc(role)
 
 
 class DemandChange(RestorableAction):
@@ -356,60 +416,57 @@ class DemandChange(RestorableAction):
     last_msg = role.rc.memory.get(k=1)[0]
     if self.need_restore and self.finished:
       return last_msg.content
-    memories = role.rc.memory.get()
-    doc = self.get_doc(memories)
+    doc = self.get_doc(role)
     system_msg = self.SYSTEM_TEMPLATE.format(system=role.get_system_msg(), doc=doc)
-    history = self.get_history_messages(memories, last_msg.sent_from)
+    history = self.get_history_messages(role, last_msg.sent_from)
 
-    answer = await self.llm.aask(
+    answer = await self.aask_resumable(
+      role.get_project_path(),
       msg=history,
       system_msgs=[system_msg]
     )
 
     res = self.save_doc(role.get_project_path(), answer)
 
-    return json.dumps(res)
+    return json.dumps(res, ensure_ascii=False)
 
-  def get_doc(self, memories: list[Message]):
-    docs = [memory for memory in memories if is_same_action(memory.cause_by, str(DemandAnalysis))]
-    return docs[-1].content
+  def get_doc(self, role: RestorableRole):
+    return get_analysis_doc(role)
 
-  def get_history_messages(self, memories: list[Message], name: str):
-    messages: list[dict[str, str]] = []
-    for memory in memories:
+  def get_history_messages(self, role: RestorableRole, name: str) -> list[dict[str, str]]:
+    def mapper(memory: Message):
       if is_same_action(memory.cause_by, str(DemandConfirmationAsk)) and memory.sent_from == name:
-        messages.append({
+        return {
           "role": "user",
           "content": memory.content if memory.content != "end" else self.PROMPT_TEMPLATE
-        })
-      elif is_same_action(memory.cause_by, str(DemandConfirmationAnswer)):
-        messages.append({
+        }
+      if is_same_action(memory.cause_by, str(DemandConfirmationAnswer)):
+        return {
           "role": "assistant",
           "content": memory.content
-        })
-      else:
-        continue
+        }
+      return None
 
-    return messages
+    return role.get_view((self.name, "history_messages", name), mapper, include_archive=True) # NOTICE: 需求变更时问答已经全部结束，可能已经归档
 
   def save_doc(self, project_path: str, answer: str):
     demand_json = get_lang_content(answer)
     demands: list[dict[str, Any]] = json.loads(demand_json)
     demand_change = get_lang_content(answer, lang="demand-change")
-    demand_content = demands_to_markdown(demands)
     now = datetime.now()
     formatted_time = now.strftime("%Y-%m-%d %H:%M:%S")
     flow_chat = get_lang_content(answer, lang="mermaid")
 
-    doc = f"# 需求变更记录\n\n## {formatted_time}\n\n{demand_change}\n\n# 业务流程图\n\n```mermaid\n{flow_chat}\n```\n\n{demand_content}"
-    doc_path = os.path.join(project_path, "prd", "1.0.0.md")
-    with open(doc_path, "w", encoding="utf-8") as f:
-      f.write(doc)
+    header = f"# 需求变更记录\n\n## {formatted_time}\n\n{demand_change}\n\n# 业务流程图\n\n```mermaid\n{flow_chat}\n```\n\n"
+    commit = PRDStore(project_path).commit(demands, header)
 
+    # NOTICE: 只下发版本号和结构化的差异，完整的需求树由下游按版本从PRDStore读取
     return {
-      "demands": demand_json,
+      "version": commit["version"],
+      "previous_version": commit["previous_version"],
+      "diff": commit["diff"],
       "demand_change": {
-        "version": "1.0.0",
+        "version": commit["version"],
         "content": demand_change,
         "time": formatted_time
       }
@@ -423,6 +480,17 @@ class DemandAnalyst(RestorableRole):
   name: str = "李莉"
   profile: str = "demand analyst"
   goal: str = "帮助用户分析需求及补充相关的需求"
+  answer_batch_window: float = 0
+  """批量回答需求询问时等待其他提问的时间窗口（秒），为0时逐个回答"""
+  TRANSITIONS: ClassVar[list[Transition]] = [
+    Transition(UserRequirement, DemandComuniacate),
+    Transition(DemandComuniacate, DemandAnalysis, when=lambda role, msg: msg.sent_from == role.name),
+    Transition(DemandAnalysis, None, when=lambda role, msg: msg.role == role.profile),
+    Transition(DemandConfirmationAsk, DemandConfirmationAnswer, when=lambda role, msg: msg.content != "end"), # 正常的回答需求询问
+    Transition(DemandConfirmationAsk, DemandChange, when=lambda role, msg: msg.content == "end"), # 需求询问结束
+  ]
+  PINNED_ACTIONS: ClassVar[list[Any]] = [UserRequirement, DemandAnalysis, DemandChange]
+  THREAD_ACTIONS: ClassVar[list[Any]] = [DemandComuniacate, DemandConfirmationAsk, DemandConfirmationAnswer]
 
   def __init__(self, **kwargs):
     super().__init__(**kwargs)
@@ -433,27 +501,49 @@ class DemandAnalyst(RestorableRole):
       watch_list.append(UserRequirement) # 如果没有之前执行的状态信息，说明刚开始，默认从用户需求进行触发
     self.set_watch(watch_list)
 
-  def state_machine(self):
-    msg = self.get_memories(k=1)[0]
-
-    if is_same_action(msg.cause_by, str(UserRequirement)):
-      return self.get_action(DemandComuniacate)
-
-    if msg.sent_from == self.name and is_same_action(msg.cause_by, str(DemandComuniacate)):
-      return self.get_action(DemandAnalysis)
+  async def collect_asks(self):
+    """
+    等待一个时间窗口，将这段时间内收到的需求询问收入记忆；其他消息放回消息队列，留给下一轮处理
+    """
+    await asyncio.sleep(self.answer_batch_window)
+    for news in self.rc.msg_buffer.pop_all():
+      if is_same_action(news.cause_by, str(DemandConfirmationAsk)) and news.content != "end":
+        self.rc.memory.add(news)
+      else:
+        self.put_message(news)
+    self.mark_memory_changed() # NOTICE: 行动结束时和回答一起写入检查点
 
-    if msg.role == self.profile and is_same_action(msg.cause_by, str(DemandAnalysis)):
-      return None
+  def get_pending_asks(self) -> dict[str, list[Message]]:
+    """
+    按提问者分组，获取还没有回答的需求询问
+    """
+    pending: dict[str, list[Message]] = {}
+    for memory in self.rc.memory.get():
+      if is_same_action(memory.cause_by, str(DemandConfirmationAsk)):
+        if memory.content == "end":
+          pending.pop(memory.sent_from, None)
+        else:
+          pending.setdefault(memory.sent_from, []).append(memory)
+      elif is_same_action(memory.cause_by, str(DemandConfirmationAnswer)):
+        for name in memory.send_to:
+          pending.pop(name, None)
 
-    # 正常的回答需求询问
-    if is_same_action(msg.cause_by, str(DemandConfirmationAsk)) and msg.content != "end":
-      return self.get_action(DemandConfirmationAnswer)
+    return pending
 
-    # 需求询问结束
-    if is_same_action(msg.cause_by, str(DemandConfirmationAsk)) and msg.content == "end":
-      return self.get_action(DemandChange)
+  async def answer_batch(self, todo: "DemandConfirmationAnswer", pending: dict[str, list[Message]]) -> tuple[str, str]:
+    """
+    批量回答需求询问；除了最后一位提问者，其他人的回答直接发送，返回最后一位提问者及其回答
+    """
+    answers = await todo.run_batch(self, pending)
+    last_name = list(pending.keys())[-1]
+    for name, answer in answers.items():
+      if name == last_name:
+        continue
+      record = Message(content=answer, role=self.profile, cause_by=type(todo), send_to={name})
+      self.publish_message(self.add_memory(record))
+    logger.info(f"{self.name}: 批量回答了{len(answers)}位同事的需求询问")
 
-    return None
+    return last_name, answers[last_name]
 
   async def _act(self) -> Message:
     logger.info(f"{self._setting}: to do {self.rc.todo}({self.rc.todo.name})")
@@ -468,9 +558,16 @@ class DemandAnalyst(RestorableRole):
     elif isinstance(todo, DemandAnalysis):
       answer = await todo.run(self)
     elif isinstance(todo, DemandConfirmationAnswer):
-      answer = await todo.run(self)
-      # TODO: 针对answer应该需要针对具体的人，不然多人同时进行ask的时候就会出现问题
-      send_to.append(msg.sent_from)
+      pending: dict[str, list[Message]] = {}
+      if self.answer_batch_window > 0 and not self.restoring_action:
+        await self.collect_asks()
+        pending = self.get_pending_asks()
+      if len(pending) > 1:
+        name, answer = await self.answer_batch(todo, pending)
+        send_to.append(name)
+      else:
+        answer = await todo.run(self)
+        send_to.append(msg.sent_from)
     elif isinstance(todo, DemandChange):
       answer = await todo.run(self)
       send_to.append(msg.sent_from)
@@ -492,8 +589,9 @@ class DemandAnalyst(RestorableRole):
     if isinstance(todo, RestorableAction):
       self.restoring_action = False
       self.need_restore_action = False
-      RestorableRole.restorable = False # 恢复完成
+      self.set_restorable(False) # 恢复完成
       todo.finished = False
       todo.need_restore = False
 
+    self.save_checkpoint()
     return record
@@ -3,11 +3,20 @@ from metagpt.roles import Role
 from metagpt.schema import Message
 from metagpt.logs import logger
 from metagpt.actions import Action
+from metagpt.const import MESSAGE_ROUTE_TO_ALL
+import asyncio
 import os
-import json
-from typing import Any
+from typing import Any, ClassVar, Optional
+from metagpt.provider.base_llm import BaseLLM
 from snowdream_company.actions.restorable_action import RestorableAction
-from abc import abstractmethod
+from snowdream_company.tool.message_store import MessageStore
+from snowdream_company.tool.message_record import MessageRecord
+from snowdream_company.tool.state_machine import StateMachine, Transition, action_id
+from snowdream_company.tool.conversation_view import ConversationMemory, Mapper
+from snowdream_company.tool.checkpoint import TeamCheckpoint
+from snowdream_company.tool.memory_archive import MemoryArchive
+from snowdream_company.tool.compression import check_codec, load_json
+from snowdream_company.tool.model_tiers import STRONG_TIER
 from metagpt.actions.add_requirement import UserRequirement
 
 class RestorableRole(Role):
@@ -16,20 +25,53 @@ class RestorableRole(Role):
   """
   __memory_path: str = ""
   __project_path: str = ""
-  __skip_ask = False
-
-  """是否跳过恢复记忆的询问"""
+  __message_store: Optional[MessageStore] = None
+  __checkpoint: Optional[TeamCheckpoint] = None
+  __restore_pending: bool = False
+  __working_set_size: int = 0
+  __memory_dirty: bool = False
+  __tier_llms: Optional[dict[str, BaseLLM]] = None
+
+  restore_policy: str = "ask"
+  """存在记忆时的恢复策略：ask询问用户，restore直接恢复，fresh不恢复；后两者不会有交互提示"""
   need_restore_action: bool = False
   """当前角色是否需要恢复行为"""
   restoring_action: bool = False
   """是否正在恢复行为"""
-  restorable: bool = False
-  """静态属性，用于标记当前有角色是否可恢复"""
+  restorable_projects: ClassVar[set[str]] = set()
+  """静态属性，记录当前有角色可恢复行为的项目；按项目区分，同一进程中的多个项目互不影响"""
   focus: str = ""
   """工作主要关注的方面"""
+  TRANSITIONS: ClassVar[list[Transition]] = []
+  """行为状态机的转移表，由各个角色声明"""
+  HOT_MESSAGES: ClassVar[int] = 32
+  """恢复记忆时直接还原成完整Message的最近消息数量，同时也是归档时至少保留的最近消息数量"""
+  PINNED_ACTIONS: ClassVar[list[Any]] = []
+  """工作集中始终保留最新一条的消息类型（例如最新的需求文档、最新的UI设计稿）"""
+  THREAD_ACTIONS: ClassVar[list[Any]] = []
+  """问答类的消息类型，还没有以end结束的问答会一直保留在工作集中"""
+  compression: str = "none"
+  """检查点、归档以及消息内容写入时使用的压缩格式（none、zlib、gzip、lzma），读取时自动识别"""
+  memory_limit: int = 256
+  """记忆中的消息数量超过这个上限时，将不在工作集中的消息移入归档；为0时不归档"""
+  context_top_k: int = 8
+  """提示词中保留的相关需求数量，其余需求只保留大纲；为0时使用完整的需求文档"""
+  llm_tiers: dict[str, dict[str, Any]] = {}
+  """模型层级（fast、strong）到LLM配置的映射，覆盖config2.yaml中llm的字段，例如{"fast": {"model": "gpt-4o-mini"}}；没有配置的层级使用角色默认的LLM"""
+  action_tiers: dict[str, str] = {}
+  """行为名称到模型层级的映射，覆盖行为声明的默认层级（TIER）"""
+  probe_actions: list[str] = []
+  """开启“先预判再升级”的行为名称：先用fast层级的模型判断是否还需要提问，需要时再用strong层级的模型生成提问"""
   def __init__(self, **kwargs):
     super().__init__(**kwargs)
     self.__project_path = kwargs["project_path"] or ""
+    self.rc.memory = ConversationMemory()
+    check_codec(self.compression)
+    self.__message_store = MessageStore.of(self.__project_path)
+    self.__checkpoint = TeamCheckpoint.of(self.__project_path)
+    if self.compression != "none":
+      self.__message_store.codec = self.compression
+      self.__checkpoint.codec = self.compression
     self.restore_memory()
 
   def restore_memory(self):
@@ -38,121 +80,320 @@ class RestorableRole(Role):
     """
     memory_path = os.path.join(self.__project_path, "memory", f"{self.name}_{self.profile}.json")
     self.__memory_path = memory_path
-    if not os.path.exists(memory_path):
-      logger.info(f"{memory_path} 文件不存在，无法恢复记忆")
-      self._init_memory()
+    archive = MemoryArchive(os.path.join(self.__project_path, "memory", f"{self.get_memory_key()}.archive.jsonl"), self.__message_store, fresh=True, codec=self.compression)
+    self.rc.memory.archive = archive
+    if not os.path.exists(self.__checkpoint.path) and not os.path.exists(memory_path):
+      logger.info(f"{self.name}({self.profile}): 没有检查点和记忆文件，无法恢复记忆")
       return
 
-    if not self.__skip_ask:
-      need_restore = input(f"{self.name}({self.profile})存在记忆，是否需要恢复记忆? (y/n): ")
-      if need_restore.lower() != "y":
-        # TODO: 应该要清空记忆？
-        return
+    need_restore = self.restore_policy == "restore"
+    if self.restore_policy == "ask":
+      need_restore = input(f"{self.name}({self.profile})存在记忆，是否需要恢复记忆? (y/n): ").lower() == "y"
+    if not need_restore:
+      # NOTICE: 不恢复记忆时，检查点中该角色的记录和归档会在第一次同步记忆时被覆盖
+      self.__checkpoint.discard(self.get_memory_key())
+      return
 
-    with open(memory_path, "r", encoding="utf-8") as file:
-      records: list[dict[str, Any]] = json.load(file)
-      for record in records:
-        msg = Message.model_validate(record)
-        self.rc.memory.add(msg)
-      logger.info(f"{self.name}({self.profile}): 恢复记忆 {len(records)} 条")
+    archive.fresh = False
 
+    # NOTICE: 这里只记录需要恢复记忆，真正读取记忆文件推迟到角色第一次观察/思考时，避免拖慢启动
+    self.__restore_pending = True
     self.check_need_restore_action() # NOTICE: 如果记忆都没有恢复就无需恢复动作了
 
+  def get_tier_llm(self, tier: str) -> BaseLLM:
+    """
+    获取模型层级对应的LLM实例，同一层级只创建一次；没有配置的层级使用角色默认的LLM
+    """
+    if tier not in self.llm_tiers:
+      return self.llm
+    if self.__tier_llms is None:
+      self.__tier_llms = {}
+    if tier not in self.__tier_llms:
+      config = self.config.llm.model_copy(update=self.llm_tiers[tier])
+      self.__tier_llms[tier] = self.context.llm_with_cost_manager_from_llm_config(config)
+    return self.__tier_llms[tier]
+
+  def get_llms(self) -> list[BaseLLM]:
+    """
+    角色用到的所有LLM实例（默认的以及配置了的各个层级的）
+    """
+    return [self.llm] + [self.get_tier_llm(tier) for tier in self.llm_tiers]
+
+  def is_probe_action(self, action: Action) -> bool:
+    return action.name in self.probe_actions
+
+  def get_action_tier(self, action: Action) -> str:
+    """
+    行为使用的模型层级：开启probe模式的行为使用strong层级（由fast层级预判），其次是action_tiers中的配置，最后是行为声明的默认层级
+    """
+    if self.is_probe_action(action):
+      return STRONG_TIER
+    return self.action_tiers.get(action.name, getattr(action, "TIER", STRONG_TIER))
+
+  def _init_action(self, action: Action):
+    super()._init_action(action)
+    if len(self.llm_tiers) > 0:
+      for llm in self.get_llms():
+        llm.cost_manager = self.context.cost_manager # NOTICE: 加入团队后context会变化，各个层级都使用当前的成本统计，投资额度对所有层级生效
+      action.set_llm(self.get_tier_llm(self.get_action_tier(action)), override=True)
+
+  def get_memory_key(self):
+    return f"{self.name}_{self.profile}"
+
+  def read_memory_records(self) -> list[dict[str, Any]]:
+    """
+    读取记忆记录，优先使用团队检查点中的记录；检查点不可用时回退到旧版本写入的记忆文件（只读）
+    """
+    records = self.__checkpoint.get_records(self.get_memory_key())
+    if records is not None:
+      return records
+    if not os.path.exists(self.__memory_path):
+      return []
+    return load_json(self.__memory_path)
+
+  def ensure_memory(self):
+    """
+    确保记忆已经恢复；第一次使用记忆前调用
+    """
+    if not self.__restore_pending:
+      return
+    self.__restore_pending = False
+    records = self.read_memory_records()
+    self.load_records(records)
+    logger.info(f"{self.name}({self.profile}): 恢复记忆 {len(records)} 条")
+
+  async def ensure_memory_async(self):
+    """
+    在线程中读取并解析记忆文件，多个角色第一次运行时可以并发恢复记忆
+    """
+    if not self.__restore_pending:
+      return
+    records = await asyncio.to_thread(self.read_memory_records)
+    if not self.__restore_pending:
+      return
+    self.__restore_pending = False
+    self.load_records(records)
+    logger.info(f"{self.name}({self.profile}): 恢复记忆 {len(records)} 条")
+
+  @staticmethod
+  async def restore_memories(roles: list["RestorableRole"]):
+    """
+    并发恢复多个角色的记忆
+    """
+    await asyncio.gather(*[role.ensure_memory_async() for role in roles])
+
+  def load_records(self, records: list[dict[str, Any]]):
+    """
+    将记忆记录批量放入memory：较早的消息以紧凑的MessageRecord保存，按需还原；
+    最近的HOT_MESSAGES条消息直接还原成完整的Message，供各个动作直接使用。
+    """
+    memory = self.rc.memory
+    store = self.__message_store
+    hot_start = max(len(records) - self.HOT_MESSAGES, 0)
+    for idx, record in enumerate(records):
+      msg = MessageRecord(record, store)
+      if idx >= hot_start:
+        msg = msg.hydrate()
+      memory.add(msg, record.get("seq")) # NOTICE: ConversationMemory按id去重，不会在整个storage中查重
+
   def get_action_from_state(self, state: dict[str, Any]) -> Action:
     """
     根据state.json记录的信息，从注册的action列表里获取到记录的action class
     """
     action = [action for action in self.actions if action.name == state["action_name"]][0]
-    return action.model_validate(state["action"])
+    restored = action.model_validate(state["action"])
+    self._init_action(restored) # NOTICE: 恢复出的行为实例同样使用角色（及其模型层级）的LLM
+    return restored
 
   def check_need_restore_action(self):
     """
     检查当前角色是否需要恢复行为
     """
-    state_path = os.path.join(self.__project_path, "state.json")
     if self.is_empty_state():
       return
-    with open(state_path, "r", encoding="utf-8") as file:
-      state: dict[str, Any] = json.load(file)
-      if state["role"] == self.profile and state["name"] == self.name:
-        self.need_restore_action = True
-        RestorableRole.restorable = True
+    state = self.read_state()
+    if state["role"] == self.profile and state["name"] == self.name:
+      self.need_restore_action = True
+      self.set_restorable(True)
+
+  def set_restorable(self, restorable: bool):
+    """
+    标记当前项目中是否有角色需要恢复行为
+    """
+    key = os.path.abspath(self.__project_path)
+    if restorable:
+      RestorableRole.restorable_projects.add(key)
+    else:
+      RestorableRole.restorable_projects.discard(key)
+
+  def is_restorable(self):
+    return os.path.abspath(self.__project_path) in RestorableRole.restorable_projects
 
   def get_restorable_action(self):
-    state_path = os.path.join(self.__project_path, "state.json")
-    with open(state_path, "r", encoding="utf-8") as file:
-      state: dict[str, Any] = json.load(file)
-      action = self.get_action_from_state(state)
-      if isinstance(action, RestorableAction):
-        action.to_restore(state["finished"])
-        logger.info(f"{action.name}: 开始恢复之前的行为")
-      else:
-        logger.info(f"{action.name}不是可恢复的")
+    state = self.read_state()
+    action = self.get_action_from_state(state)
+    if isinstance(action, RestorableAction):
+      action.to_restore(state["finished"])
+      logger.info(f"{action.name}: 开始恢复之前的行为")
+    else:
+      logger.info(f"{action.name}不是可恢复的")
 
-      return action
+    return action
 
   async def restore_action(self):
     """
     根据state.json记录的信息，恢复之前的Action
     """
-    state_path = os.path.join(self.__project_path, "state.json")
-    with open(state_path, "r", encoding="utf-8") as file:
-      state: dict[str, Any] = json.load(file)
-      # 不是记录的行为直接跳过
-      if self.todo.name != state["action_name"]:
-        return self.rc.memory.get(k=1)[0]
-      self.rc.memory.delete_newest()
-      action = self.get_action_from_state(state)
-      if isinstance(action, RestorableAction):
-        action.to_restore(state["finished"])
-        logger.info(f"{action.name}: 开始恢复之前的行为")
-      else:
-        logger.info(f"{action.name}不是可恢复的")
-      self.set_todo(action)
-      self.need_restore_action = False # 开始进行恢复
-      self.restoring_action = True
-      res = await self._act()
-      self.restoring_action = False
-      RestorableRole.restorable = False # 恢复完成
+    state = self.read_state()
+    # 不是记录的行为直接跳过
+    if self.todo.name != state["action_name"]:
+      return self.rc.memory.get(k=1)[0]
+    self.rc.memory.delete_newest()
+    action = self.get_action_from_state(state)
+    if isinstance(action, RestorableAction):
+      action.to_restore(state["finished"])
+      logger.info(f"{action.name}: 开始恢复之前的行为")
+    else:
+      logger.info(f"{action.name}不是可恢复的")
+    self.set_todo(action)
+    self.need_restore_action = False # 开始进行恢复
+    self.restoring_action = True
+    res = await self._act()
+    self.restoring_action = False
+    self.set_restorable(False) # 恢复完成
+
+    return res
 
-      return res
 
 
+  def get_view(self, key: Any, mapper: Mapper, include_archive: bool = False) -> list[Any]:
+    """
+    获取按记忆增量维护的对话记录，返回的列表不要直接修改；
+    默认只包含工作集中的消息（还没有结束的问答一定在工作集中），需要已经结束的历史对话时include_archive为True
+    """
+    self.ensure_memory()
+    return self.rc.memory.get_view(key, mapper, include_archive)
 
   def add_memory(self, msg: Message):
     """
-    添加一条记忆，并更新记忆文件
+    添加一条记忆；记忆在下一次保存检查点时（每次行动结束时）才写入
     """
+    self.ensure_memory()
     msg.sent_from = self.name
     self.rc.memory.add(msg)
-    self.update_memory()
+    self.mark_memory_changed()
 
     return msg
 
+  def mark_memory_changed(self):
+    """
+    记录记忆有了还没同步到检查点的修改
+    """
+    self.__memory_dirty = True
+
 
   def update_memory(self):
     """
-    将当前角色的memory同步到记忆文件中
+    将当前角色的memory同步到团队检查点中并立即保存检查点
     """
-    if not os.path.exists(self.__memory_path):
-      self._init_memory()
-    records: list[dict[str, Any]] = [memory.model_dump() for memory in self.rc.memory.get()]
-    with open(self.__memory_path, "w", encoding="utf-8") as file:
-      json.dump(records, file)
+    self.sync_memory()
+    self.save_checkpoint()
+
+  def sync_memory(self):
+    """
+    将当前角色的memory同步到团队检查点的记录中（检查点是唯一的写入目标），不写入文件
+    """
+    self.ensure_memory() # NOTICE: 记忆还没恢复时不能直接覆盖检查点中的记录
+    # NOTICE: 工作集本身超过上限时（例如未结束的问答很多），至少再积累HOT_MESSAGES条消息才重新归档
+    if self.memory_limit > 0 and self.rc.memory.count() > max(self.memory_limit, self.__working_set_size + self.HOT_MESSAGES):
+      self.archive_memory()
+    seqs = self.rc.memory.seqs
+    records: list[dict[str, Any]] = []
+    for memory in self.rc.memory.get():
+      record = self.to_record(memory)
+      record["seq"] = seqs[memory.id]
+      records.append(record)
+    self.__checkpoint.set_records(self.get_memory_key(), records)
+    self.__memory_dirty = False
+
+  def to_record(self, memory: Message) -> dict[str, Any]:
+    """
+    将消息转换成记忆文件中的记录
+    """
+    return memory.to_record() if isinstance(memory, MessageRecord) else self.__message_store.to_record(memory)
+
+  def get_participants(self, memory: Message) -> set[str]:
+    participants = set(memory.send_to)
+    participants.add(memory.sent_from)
+    participants.discard(MESSAGE_ROUTE_TO_ALL)
+    participants.discard("")
+    return participants
+
+  def get_working_set(self) -> set[str]:
+    """
+    当前工作集中的消息id：最近的HOT_MESSAGES条消息、PINNED_ACTIONS中每种类型最新的一条消息，以及还没有结束的问答
+    """
+    storage = self.rc.memory.get()
+    working_set = set([memory.id for memory in storage[-self.HOT_MESSAGES:]])
+    pinned = set([action_id(action) for action in self.PINNED_ACTIONS])
+    threads = set([action_id(action) for action in self.THREAD_ACTIONS])
+    closed: set[str] = set()
+    """问答已经结束的参与者"""
+    for memory in reversed(storage):
+      cause_id = action_id(memory.cause_by)
+      if cause_id in pinned:
+        working_set.add(memory.id)
+        pinned.discard(cause_id)
+      elif cause_id in threads:
+        participants = self.get_participants(memory)
+        if memory.content == "end":
+          closed |= participants # NOTICE: 从后往前遍历，end之前与这些参与者的问答都已经结束
+        elif len(participants & closed) == 0:
+          working_set.add(memory.id)
+
+    return working_set
+
+  def archive_memory(self):
+    """
+    将不在工作集中的消息移入归档
+    """
+    working_set = self.get_working_set()
+    messages = [memory for memory in self.rc.memory.get() if memory.id not in working_set]
+    self.rc.memory.archive_messages(messages, self.to_record)
+    self.__working_set_size = self.rc.memory.count()
+    logger.info(f"{self.name}({self.profile}): 归档记忆 {len(messages)} 条，工作集 {self.rc.memory.count()} 条")
 
   def update_state(self, action: Action, finished: bool = False):
     """
-    基于当前角色和当前进行的行为更新state.json
+    基于当前角色和当前进行的行为更新检查点中的行为状态
     """
-    state_path = os.path.join(self.__project_path, "state.json")
-    with open(state_path, "w", encoding="utf-8") as file:
-      json.dump({
-        "role": self.profile,
-        "name": self.name,
-        "action_name": action.name,
-        "action": action.model_dump(),
-        "finished": finished,
-      }, file)
+    state = {
+      "role": self.profile,
+      "name": self.name,
+      "action_name": action.name,
+      "action": action.model_dump(),
+      "finished": finished,
+    }
+    self.__checkpoint.set_state(state)
+    if not finished:
+      self.save_checkpoint() # NOTICE: 行为开始时也保存检查点，中途崩溃时可以恢复正在进行的行为
+
+  def read_state(self) -> dict[str, Any]:
+    """
+    读取当前的行为状态，优先使用团队检查点中的状态；检查点不可用时回退到旧版本写入的state.json（只读）
+    """
+    state = self.__checkpoint.get_state()
+    if state is not None:
+      return state
+    return load_json(os.path.join(self.__project_path, "state.json"))
+
+  def save_checkpoint(self):
+    """
+    将整个团队的记忆、状态和产物清单写入检查点；内容没有变化时不会重复写入
+    """
+    if self.__memory_dirty:
+      self.sync_memory()
+    self.__checkpoint.save()
 
   def get_action(self, action: Action):
     """
@@ -174,17 +415,34 @@ class RestorableRole(Role):
     logger.info(self.rc.watch)
 
 
-  @abstractmethod
+  @classmethod
+  def get_state_machine(cls) -> StateMachine:
+    """
+    根据角色声明的TRANSITIONS构建状态机，每个角色类只构建一次
+    """
+    if "_state_machine" not in cls.__dict__:
+      cls._state_machine = StateMachine(cls.TRANSITIONS)
+    return cls._state_machine
+
   def state_machine(self) -> Action | None:
     """
     行为状态机，根据记忆和接受的消息，返回下一个要做的行为
     """
-    pass
+    msg = self.get_memories(k=1)[0]
+    next_action = self.get_state_machine().dispatch(self, msg)
+    if next_action is None:
+      return None
+
+    return self.get_action(next_action)
+
+  async def _observe(self, ignore_memory=False) -> int:
+    await self.ensure_memory_async() # NOTICE: 先恢复之前的记忆，再放入新观察到的消息
+    return await super()._observe(ignore_memory)
 
   async def _think(self) -> bool:
+    self.ensure_memory()
     # think函数本质上就是给出todo的action，为none就是结束
-    # FIXME: RestorableRole的静态成员居然不存在？
-    if hasattr(RestorableRole, "restorable") and RestorableRole.restorable and not self.need_restore_action:
+    if self.is_restorable() and not self.need_restore_action:
       self.rc.memory.delete_newest() # 因为用户需求默认会发给所有人
       self.set_todo(None)
       self.update_memory()
@@ -207,37 +465,13 @@ class RestorableRole(Role):
   def get_system_msg(self):
     return f"你是一名{self.profile}， 名字叫{self.name}. 你的目标是{self.goal}。"
 
-  def _init_memory(self):
-    """
-    初始化记忆文件
-    """
-    with open(self.__memory_path, "w", encoding="utf-8") as file:
-      file.write("[]")
-
-  def _init_state(self):
-    """
-    初始化state.json
-    """
-    state_path = os.path.join(self.__project_path, "state.json")
-    init_state = {
-      "role": "",
-      "name": "",
-      "action_name": "",
-      "action": "",
-      "finished": False
-    }
-    with open(state_path, "w", encoding="utf-8") as file:
-      json.dump(init_state, file)
-
   def get_project_path(self):
     return self.__project_path
 
   def is_empty_state(self):
     state_path = os.path.join(self.__project_path, "state.json")
 
-    if not os.path.exists(state_path):
+    if not os.path.exists(state_path) and self.__checkpoint.get_state() is None:
       return True
 
-    with open(state_path, "r", encoding="utf-8") as file:
-      state: dict[str, Any] = json.load(file)
-      return state["action_name"] == ""
+    return self.read_state()["action_name"] == ""
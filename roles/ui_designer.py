@@ -1,17 +1,25 @@
 # UI设计师
 import json
 import os
-from typing import Any
+import time
+from typing import Any, ClassVar, Optional
+from pydantic import Field
 from metagpt.schema import Message
 from snowdream_company.roles.restorable_role import RestorableRole
 from snowdream_company.roles.demand_analyst import DemandAnalysis, DemandChange, DemandConfirmationAsk, DemandConfirmationAnswer
 from snowdream_company.actions.restorable_action import RestorableAction
+from snowdream_company.tool.assets import AssetPipeline
 from metagpt.logs import logger
-from snowdream_company.tool.browser import generate_vue_element_screenshots
-from snowdream_company.tool.markdown import get_html_comment, get_lang_content
+from snowdream_company.tool.browser import RenderOptions, generate_vue_element_screenshots, generate_vue_gallery_screenshots, summarize_render_report
+from snowdream_company.tool.markdown import get_lang_content, get_module_demands
+from snowdream_company.tool.prd import PRDStore
+from snowdream_company.tool.prompt_layout import DOC_SEGMENT, STATIC_SEGMENT, PromptLayout
+from snowdream_company.tool.retrieval import get_demand_segments
 from snowdream_company.tool.type import is_same_action
-from pathvalidate import sanitize_filename
-from snowdream_company.tool.ui import get_user_input
+from snowdream_company.tool.state_machine import Transition
+from snowdream_company.tool.ui import ask_user_input
+from snowdream_company.tool.vue_validator import apply_repair, get_module_name, validate_draft
+from snowdream_company.tool.visual_diff import DIFF_THRESHOLD, compare_image, format_diff_summary, get_diff_path
 
 ANALYSIS_FORMAT = """
 ```task
@@ -24,6 +32,7 @@ task2: 任务的详细描述
 
 ```vue
 <!-- 模块名称和描述 -->
+<!-- demands: 需求id1, 需求id2 -->
 <template>
   <div>该模块的布局结构</div>
 </template>
@@ -37,6 +46,7 @@ task2: 任务的详细描述
 
 ```vue
 <!-- 模块名称和描述 -->
+<!-- demands: 需求id1, 需求id2 -->
 <template>
   <div>该模块的布局结构</div>
 </template>
@@ -72,12 +82,10 @@ task2: 任务的详细描述
 
 class UIAnalysis(RestorableAction):
   name: str = "UIAnalysis"
-  SYSTEM_TEMPLATE: str = """{system}
-  这里有一份来自产品经理同事发布的需求文档（三个反引号之间）：```{doc}```。
-  """
+  DOC_TEMPLATE: str = """这里有一份来自产品经理同事发布的需求文档（三个反引号之间，可能只包含完整的需求大纲，和变更相关的需求详情会附在最新的消息后面）：```{doc}```。"""
   # TODO: 最好结合需求沟通记录？因为需求沟通的结果看起来细节蛮多的……
   PROMPT_TEMPLATE: str = """
-  我把调整好的需求文档发给你了，你需要从需求文档和我们的对话记录中提取出你自己的工作任务（即UI设计师需要做的事情），每个任务用单独的task代码块进行表示；根据你整理得到的任务，完成相应任务的UI设计稿，要确保给出的设计稿可以让web前端开发同事进行直接使用；请使用element-plus组件库和vue3 setup模式的语法进行设计，并不要求你实现最终的功能代码，你只需要用element-plus组件库进行样式的设计即可！可以根据需要拆分不同的模块进行设计，每个模块需要用一个单独的vue代码块来表示，模块对应的css样式需要写在该模块的style元素中，并在vue代码块第一行中用注释标注出该模块的作用和模块名称。
+  我把调整好的需求文档发给你了，你需要从需求文档和我们的对话记录中提取出你自己的工作任务（即UI设计师需要做的事情），每个任务用单独的task代码块进行表示；根据你整理得到的任务，完成相应任务的UI设计稿，要确保给出的设计稿可以让web前端开发同事进行直接使用；请使用element-plus组件库和vue3 setup模式的语法进行设计，并不要求你实现最终的功能代码，你只需要用element-plus组件库进行样式的设计即可！可以根据需要拆分不同的模块进行设计，每个模块需要用一个单独的vue代码块来表示，模块对应的css样式需要写在该模块的style元素中，并在vue代码块第一行中用注释标注出该模块的作用和模块名称，第二行用“<!-- demands: 需求id1, 需求id2 -->”格式的注释列出该模块实现了哪些需求（即需求文档中对应需求的id字段）。
 
   请注意不是简单的把需求文档加上样式！确保设计稿的内容是清晰且没有重复的！请务必确保所有的css样式（包括css动画）务必应用到具体的html元素上！
 
@@ -95,6 +103,7 @@ class UIAnalysis(RestorableAction):
 
   ```vue
   <!-- 模块名称和描述 -->
+  <!-- demands: 需求id1, 需求id2 -->
   <template>
     <div>该模块的布局结构</div>
   </template>
@@ -108,6 +117,7 @@ class UIAnalysis(RestorableAction):
 
   ```vue
   <!-- 模块名称和描述 -->
+  <!-- demands: 需求id1, 需求id2 -->
   <template>
     <div>该模块的布局结构</div>
   </template>
@@ -141,6 +151,29 @@ class UIAnalysis(RestorableAction):
   - [x]: taskN
   """
 
+  INCREMENTAL_TEMPLATE: str = """
+  需求文档有了新的变更，以下是新版本（{version}）和上一版本相比的结构化差异，其中added为新增的需求，removed为删除的需求，changed为有变更的需求：
+
+  ```json
+  {diff}
+  ```
+
+  以下是你之前的UI设计稿中受这些变更影响的模块：
+
+  {modules}
+
+  请只针对这些变更调整UI设计稿：给出上面每个受影响模块修改后的完整vue代码块（第一行的模块名称注释保持不变）；如果新增的需求没有被任何已有模块覆盖，请为其设计新的模块；没有受影响的模块不要输出！每个vue代码块的第二行同样需要用“<!-- demands: 需求id1, 需求id2 -->”格式的注释列出该模块实现了哪些需求。如果用到了新的图片资源，请用generate-image代码块进行描述；最后请将输出的vue代码块script部分中所有引用到的npm包用一个json数组列出来。
+  """
+  REPAIR_TEMPLATE: str = """
+  你给出的UI设计稿没有通过检查，问题如下：
+
+  {errors}
+
+  请只输出修正后的这些模块的完整vue代码块（第一行的模块名称注释和第二行的demands注释都要保留），没有问题的模块不要输出！如果script中引用了npm包，请用一个json数组列出这些npm包。
+  """
+  max_repairs: int = 2
+  """设计稿没有通过静态检查时，最多让模型修正的次数"""
+
   async def run(self, role: RestorableRole):
     last_msg = role.rc.memory.get(k=1)[0]
     if self.need_restore and self.finished:
@@ -151,20 +184,26 @@ class UIAnalysis(RestorableAction):
       return res
 
     info: dict[str, Any] = json.loads(last_msg.content)
-    demand_json = info["demands"]
-    system_prompt = self.SYSTEM_TEMPLATE.format(system=role.get_system_msg(), doc=demand_json)
-    history = self.get_demand_history(role.rc.memory.get(), last_msg.sent_from)
+    previous_draft = self.get_latest_draft(role)
+    manifest = self.load_manifest(role.get_project_path())
+    if previous_draft is not None and "diff" in info and self.is_traceable(manifest):
+      # NOTICE: 已有设计稿且每个模块都记录了对应的需求时，只重新生成受变更影响的模块
+      res: Message = await self.update_ui_draft(role, info, previous_draft, manifest)
+      return res
 
-    answer = await self.llm.aask(
-      system_msgs=[system_prompt],
-      msg=history
+    layout = self.get_layout(role, self.get_demand_doc(role, info), self.get_demand_history(role, last_msg.sent_from))
+
+    answer = await self.aask_resumable(
+      role.get_project_path(),
+      system_msgs=layout.system_msgs,
+      msg=layout.msg
     )
+    answer = await self.repair_draft(role, answer, layout)
 
-    await self.save_ui(role.get_project_path(), answer)
+    diff_msg = await self.save_ui(role, answer)
     # 这算是初稿
-    draft_msg = Message(content=answer, role=role.profile, cause_by=self._get_draft_type())
-    role.add_memory(draft_msg)
-    res = await self.get_user_answer(role)
+    draft_msg = self.add_draft(role, answer, diff_msg)
+    res = await self.get_user_answer(role, draft_msg)
 
     return res
 
@@ -172,16 +211,23 @@ class UIAnalysis(RestorableAction):
     last_msg = role.rc.memory.get(k=1)[0]
     logger.info(last_msg.content)
     if is_same_action(last_msg.cause_by, self._get_draft_type()):
-      await self.save_ui(role.get_project_path(), last_msg.content)
-      res = await self.get_user_answer(role)
+      await self.save_ui(role, last_msg.content) # NOTICE: 只是补齐缺失的截图，对比结果不作为记忆（否则它会排在设计稿的后面）
+      res = await self.get_user_answer(role, last_msg)
       return res
     res = await self.get_ui_draft(role)
     return res
 
-  async def get_user_answer(self, role: RestorableRole) -> Message:
-    user_answer = get_user_input("UI审核意见", "你的修改意见（end代表没有修改意见了）：")
+  async def get_user_answer(self, role: RestorableRole, draft_msg: Message) -> Message:
+    """
+    请用户审核设计稿draft_msg；没有修改意见时将其作为结果返回（审核的设计稿不一定是最新的一条记忆，比如需求变更没有影响任何模块时复用的上一版设计稿）
+    """
+    draft = draft_msg.content
+    previous = role.rc.memory.get(k=2)
+    if len(previous) == 2 and previous[1].id == draft_msg.id and is_same_action(previous[0].cause_by, self._get_diff_type()):
+      draft = f"{draft}\n\n{previous[0].content}" # NOTICE: 附上和上一版的截图对比，审核时只需要关注有变化的模块
+    user_answer = await ask_user_input("UI审核意见", "你的修改意见（end代表没有修改意见了）：", draft)
     if user_answer == "end":
-      return role.rc.memory.get(k=1)[0]
+      return draft_msg
 
     content = f"{user_answer}。请根据我的修改意见在之前你给UI设计的基础上重新设计UI，你可以参照这个格式给出修改后的完整UI设计稿（即要包含没有改动的部分！）：\n{ANALYSIS_FORMAT}"
     user_msg = Message(content=content, role="user", cause_by=self._get_user_answer_type())
@@ -191,66 +237,325 @@ class UIAnalysis(RestorableAction):
     return res
 
   async def get_ui_draft(self, role: RestorableRole):
-    histroy = self.get_comunication_history(role.rc.memory.get())
-    system_prompt = self.get_system_prompt(role)
+    layout = self.get_layout(role, self.get_latest_demand_doc(role), self.get_comunication_history(role))
 
-    answer = await self.llm.aask(
-      system_msgs=[system_prompt],
-      msg=histroy
+    answer = await self.aask_resumable(
+      role.get_project_path(),
+      system_msgs=layout.system_msgs,
+      msg=layout.msg
     )
+    answer = await self.repair_draft(role, answer, layout)
 
-    await self.save_ui(role.get_project_path(), answer)
-
-    draft_msg = Message(content=answer, role=role.profile, cause_by=self._get_draft_type())
-    role.add_memory(draft_msg)
+    diff_msg = await self.save_ui(role, answer)
+    draft_msg = self.add_draft(role, answer, diff_msg)
 
-    res = await self.get_user_answer(role)
+    res = await self.get_user_answer(role, draft_msg)
 
     return res
 
 
-  async def save_ui(self, project_path: str, answer: str):
-    self.clear_ui(project_path)
+  async def update_ui_draft(self, role: RestorableRole, info: dict[str, Any], previous_draft: Message, manifest: dict[str, Any]):
+    """
+    根据需求变更的差异增量更新设计稿，没有受影响的模块原样复用
+    """
+    diff: dict[str, list[dict[str, Any]]] = info["diff"]
+    modules = self.get_modules(previous_draft.content)
+    affected, uncovered = self.get_affected_modules(manifest, diff)
+    logger.info(f"{self.name}: 受需求变更影响的模块 {affected}，未覆盖的新增需求 {uncovered}")
+
+    if len(affected) == 0 and len(uncovered) == 0:
+      # NOTICE: 没有新的设计稿，审核的仍是上一版设计稿（而不是最新的需求变更消息）
+      await self.save_ui(role, previous_draft.content)
+      res = await self.get_user_answer(role, previous_draft)
+      return res
+
+    prompt = self.INCREMENTAL_TEMPLATE.format(
+      version=info["version"],
+      diff=json.dumps(diff, ensure_ascii=False),
+      modules="\n\n".join([f"```vue\n{modules[name]}\n```" for name in affected if name in modules]) or "无"
+    )
+    query = "\n".join([f"{node['标题']} {node['需求描述']}" for node in diff["added"] + diff["changed"] + diff["removed"]])
+    doc, details = get_demand_segments(role.get_project_path(), query, role.context_top_k, self.get_demand_doc(role, info))
+    layout = self.get_layout(role, doc, [], f"{prompt}\n\n（和这些变更相关的{details}）" if details else prompt)
+    answer = await self.aask_resumable(
+      role.get_project_path(),
+      system_msgs=layout.system_msgs,
+      msg=layout.msg
+    )
+    previous_imports: list[str] = json.loads(get_lang_content(previous_draft.content, lang="json"))
+    answer = await self.repair_draft(role, answer, layout, previous_imports)
+
+    removed = set([node["id"] for node in diff["removed"]])
+    updated = self.get_modules(answer)
+    merged: list[str] = []
+    for name, ui in modules.items():
+      if name in updated:
+        merged.append(updated.pop(name))
+      elif name in affected and set(manifest[name]["demands"]) <= removed:
+        continue # NOTICE: 模块对应的需求全部被删除了
+      else:
+        merged.append(ui)
+    merged += list(updated.values())
+
+    images = get_lang_content(previous_draft.content, is_all=True, lang="generate-image") + get_lang_content(answer, is_all=True, lang="generate-image")
+    images = list(dict.fromkeys(images))
+    imports = previous_imports
+    new_imports = get_lang_content(answer, is_all=True, lang="json")
+    if len(new_imports) > 0:
+      imports = list(dict.fromkeys(imports + json.loads(new_imports[0])))
+    draft = self.compose_draft(merged, images, imports)
+
+    diff_msg = await self.save_ui(role, draft)
+    draft_msg = self.add_draft(role, draft, diff_msg)
+    res = await self.get_user_answer(role, draft_msg)
+
+    return res
+
+  def add_draft(self, role: RestorableRole, draft: str, diff_msg: Optional[Message] = None) -> Message:
+    """
+    将新的设计稿加入记忆；有截图对比结果时紧挨着放在设计稿的前面，审核时一起展示
+    """
+    if diff_msg is not None:
+      role.add_memory(diff_msg)
+    draft_msg = Message(content=draft, role=role.profile, cause_by=self._get_draft_type())
+    role.add_memory(draft_msg)
+    return draft_msg
+
+  async def repair_draft(self, role: RestorableRole, answer: str, layout: PromptLayout, imports: Optional[list[str]] = None) -> str:
+    """
+    渲染前先静态检查设计稿，把有问题的模块及其错误信息发回给模型修正，避免白白浪费一次浏览器渲染
+    """
+    for _ in range(self.max_repairs):
+      validation = validate_draft(answer, imports)
+      if validation.is_valid:
+        break
+      errors = validation.format_errors()
+      logger.warning(f"{self.name}: 设计稿没有通过检查，让模型修正\n{errors}")
+      repair = await self.aask_resumable(
+        role.get_project_path(),
+        system_msgs=layout.system_msgs,
+        msg=layout.msg + [
+          {
+            "role": "assistant",
+            "content": answer
+          },
+          {
+            "role": "user",
+            "content": self.REPAIR_TEMPLATE.format(errors=errors)
+          }
+        ]
+      )
+      answer = apply_repair(answer, validation, repair)
+    return answer
+
+  def get_modules(self, answer: str) -> dict[str, str]:
+    """
+    设计稿中的vue模块，按模块名称索引
+    """
     ui_list: list[str] = get_lang_content(answer, is_all=True, lang="vue")
+    return {get_module_name(ui): ui for ui in ui_list if get_module_name(ui) is not None}
+
+  def get_affected_modules(self, manifest: dict[str, Any], diff: dict[str, list[dict[str, Any]]]):
+    """
+    根据模块和需求之间的依赖关系，找出受需求变更影响的模块以及没有被任何模块覆盖的新增需求
+    """
+    touched = set([node["id"] for node in diff["changed"] + diff["removed"]])
+    covered: dict[str, list[str]] = {}
+    for name, module in manifest.items():
+      for demand_id in module["demands"]:
+        covered.setdefault(demand_id, []).append(name)
+
+    uncovered: list[str] = []
+    for node in diff["added"]:
+      if node["parent"] in covered:
+        touched.add(node["parent"]) # NOTICE: 新增子需求交给实现父需求的模块处理
+      else:
+        uncovered.append(node["id"])
+
+    affected = [name for name, module in manifest.items() if not touched.isdisjoint(module["demands"])]
+
+    return affected, uncovered
+
+  def compose_draft(self, ui_list: list[str], images: list[str], imports: list[str]):
+    """
+    将模块、图片资源和npm包列表重新组合成完整的设计稿
+    """
+    blocks = [f"```vue\n{ui}\n```" for ui in ui_list]
+    blocks += [f"```generate-image\n{image}\n```" for image in images]
+    blocks.append(f"```json\n{json.dumps(imports, ensure_ascii=False)}\n```")
+    return "\n\n".join(blocks)
+
+  def get_latest_draft(self, role: RestorableRole) -> Message | None:
+    drafts = role.rc.memory.get_by_action(self._get_draft_type())
+    return drafts[-1] if len(drafts) > 0 else None
+
+  def get_manifest_path(self, project_path: str):
+    return os.path.join(project_path, "ui", "1.0.0", "modules.json")
+
+  def load_manifest(self, project_path: str) -> dict[str, Any]:
+    """
+    读取模块和需求之间的依赖关系
+    """
+    manifest_path = self.get_manifest_path(project_path)
+    if not os.path.exists(manifest_path):
+      return {}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+      return json.load(f)
+
+  def is_traceable(self, manifest: dict[str, Any]):
+    return len(manifest) > 0 and all([len(module["demands"]) > 0 for module in manifest.values()])
+
+  async def save_ui(self, role: "UIDesigner", answer: str) -> Optional[Message]:
+    """
+    写入设计稿的各个模块并为有变化的模块截图；返回和上一版截图的对比结果（没有对比时为None），由调用方决定是否加入记忆
+    """
+    from pathvalidate import sanitize_filename # NOTICE: 延迟导入，减少角色模块的导入耗时
+
+    project_path = role.get_project_path()
+    previous_manifest = self.load_manifest(project_path)
+    validation = validate_draft(answer)
+    if not validation.is_valid:
+      logger.warning(f"{self.name}: 以下问题的模块不会被渲染\n{validation.format_errors()}")
+    ui_list = validation.valid_modules
     vue_paths: list[str] = []
-    imports: list[str] = json.loads(get_lang_content(answer, lang="json"))
-    # TODO: 图片资源生成
+    render_paths: list[str] = []
+    manifest: dict[str, Any] = {}
+    imports = validation.imports
+    assets = AssetPipeline(project_path).start(get_lang_content(answer, is_all=True, lang="generate-image")) # NOTICE: 图片在后台并发生成，截图时按需等待
     for ui in ui_list:
-      name: str = sanitize_filename(get_html_comment(ui), replacement_text="_") # NOTICE: 确保文件名是合法的！
+      module_name: str = get_module_name(ui)
+      name: str = sanitize_filename(module_name, replacement_text="_") # NOTICE: 确保文件名是合法的！
       ui_path = os.path.join(project_path, "ui", "1.0.0", f"{name}.vue")
       vue_paths.append(ui_path)
+      manifest[module_name] = {
+        "file": f"{name}.vue",
+        "demands": get_module_demands(ui)
+      }
+      if self.is_rendered(ui_path, ui, role.render_options):
+        continue # NOTICE: 内容没变且已有截图的模块（比如中断前已经生成好的）直接复用
       with open(ui_path, "w", encoding="utf-8") as f:
         f.write(ui)
-    await generate_vue_element_screenshots(vue_paths, imports)
-
-  def clear_ui(self, project_path: str):
+      render_paths.append(ui_path)
+    self.clear_ui(project_path, keep=vue_paths, options=role.render_options)
+    with open(self.get_manifest_path(project_path), "w", encoding="utf-8") as f:
+      json.dump(manifest, f, ensure_ascii=False)
+    diff_msg: Optional[Message] = None
+    try:
+      if len(render_paths) > 0:
+        diff_msg = await self.render_ui(role, render_paths, imports, assets, previous_manifest, manifest)
+    finally:
+      asset_report = await assets.wait()
+      logger.info(f"{self.name}: 图片资源 {asset_report}")
+    return diff_msg
+
+  async def render_ui(self, role: "UIDesigner", render_paths: list[str], imports: list[str], assets: AssetPipeline, previous_manifest: dict[str, Any], manifest: dict[str, Any]) -> Optional[Message]:
+    """
+    为内容有变化的模块截图，并和上一版的截图进行对比
+    """
+    project_path = role.get_project_path()
+    previous_images = self.read_images(render_paths, role.render_options)
+    if role.render_mode == "gallery":
+      report = await generate_vue_gallery_screenshots(render_paths, imports, role.render_options, assets)
+    else:
+      report = await generate_vue_element_screenshots(render_paths, imports, role.render_options, assets)
+    logger.info(summarize_render_report(report))
+    with open(self.get_render_report_path(project_path), "w", encoding="utf-8") as f:
+      json.dump(report, f, ensure_ascii=False, indent=2)
+    if len(previous_manifest) == 0:
+      return None
+    return self.get_diff(role, previous_manifest, manifest, render_paths, previous_images)
+
+  def read_images(self, ui_paths: list[str], options: RenderOptions) -> dict[str, bytes]:
+    """
+    重新截图前读取模块上一版的截图（只读取第一个视口的），用于之后的对比
+    """
+    images: dict[str, bytes] = {}
+    for ui_path in ui_paths:
+      image_path = options.get_image_paths(ui_path)[options.viewports[0]]
+      if os.path.exists(image_path):
+        with open(image_path, "rb") as f:
+          images[ui_path] = f.read()
+    return images
+
+  def get_diff(self, role: "UIDesigner", previous_manifest: dict[str, Any], manifest: dict[str, Any], render_paths: list[str], previous_images: dict[str, bytes]) -> Optional[Message]:
+    """
+    对比新旧两版设计稿的截图，返回对比结果消息（对比失败时为None）；它会被保存在新设计稿消息的前面，审核时可以只关注有变化的模块
+    """
+    directory = os.path.join(role.get_project_path(), "ui", "1.0.0")
+    options = role.render_options
+    modules: dict[str, dict[str, Any]] = {}
+    start = time.perf_counter()
+    try:
+      for module_name, module in manifest.items():
+        ui_path = os.path.join(directory, module["file"])
+        if ui_path not in render_paths:
+          modules[module_name] = { "status": "unchanged", "ratio": 0.0 } # NOTICE: 源码没变，没有重新截图
+        elif ui_path in previous_images:
+          image_path = options.get_image_paths(ui_path)[options.viewports[0]]
+          modules[module_name] = compare_image(previous_images[ui_path], image_path, role.diff_threshold)
+        elif module_name in previous_manifest:
+          modules[module_name] = { "status": "changed", "ratio": 1.0 } # NOTICE: 上一版没有截图，无法对比
+        else:
+          modules[module_name] = { "status": "added", "ratio": 1.0 }
+    except Exception as error:
+      logger.warning(f"{self.name}: 截图对比失败 {error}")
+      return None
+    for module_name in previous_manifest:
+      if module_name not in manifest:
+        modules[module_name] = { "status": "removed", "ratio": 1.0 }
+    summary = { "threshold": role.diff_threshold, "elapsed": time.perf_counter() - start, "modules": modules }
+    logger.info(f"{self.name}: 截图对比耗时 {summary['elapsed'] * 1000:.1f}ms")
+    return Message(content=format_diff_summary(summary), role=role.profile, cause_by=self._get_diff_type())
+
+  def get_render_report_path(self, project_path: str):
+    return os.path.join(project_path, "ui", "1.0.0", "render.json")
+
+  def is_rendered(self, ui_path: str, ui: str, options: RenderOptions):
+    """
+    判断模块是否已经写入且按当前的截图参数生成过所有截图
+    """
+    if not os.path.exists(ui_path) or not all([os.path.exists(path) for path in options.get_image_paths(ui_path).values()]):
+      return False
+    with open(ui_path, "r", encoding="utf-8") as f:
+      return f.read() == ui
+
+  def clear_ui(self, project_path: str, keep: Optional[list[str]] = None, options: Optional[RenderOptions] = None):
+    """
+    清除设计稿目录下的文件，keep中的模块及其截图会被保留
+    """
     directory = os.path.join(project_path, "ui", "1.0.0")
     if not os.path.exists(directory):
       return
 
+    keep = keep or []
+    options = options or RenderOptions()
+    keep_paths = set(keep + [image for path in keep for image in options.get_image_paths(path).values()] + [get_diff_path(path) for path in keep])
+    keep_paths.add(self.get_render_report_path(project_path)) # NOTICE: 保留最近一次截图的报告
     for filename in os.listdir(directory):
       file_path = os.path.join(directory, filename)
-      if os.path.isfile(file_path):
+      if os.path.isfile(file_path) and file_path not in keep_paths:
         os.remove(file_path)
 
-  def get_demand_history(self, messages: list[Message], sent_from: str):
-    records: list[dict[str, str]] = [
-      {
-        "role": "user",
-        "content": "你对需求列表有什么疑问吗？"
-      }
-    ]
-    for message in messages:
+  def get_demand_history(self, role: RestorableRole, sent_from: str):
+    def mapper(message: Message):
       if is_same_action(message.cause_by, str(DemandConfirmationAsk)):
-        records.append({
+        return {
           "role": "assistant",
           "content": message.content
-        })
+        }
       if is_same_action(message.cause_by, str(DemandConfirmationAnswer)) and message.sent_from == sent_from:
-        records.append({
+        return {
           "role": "user",
           "content": message.content
-        })
+        }
+      return None
+
+    records: list[dict[str, str]] = [
+      {
+        "role": "user",
+        "content": "你对需求列表有什么疑问吗？"
+      }
+    ] + role.get_view((self.name, "demand_history", sent_from), mapper, include_archive=True) # NOTICE: 包括之前几轮已经结束的问答
 
     if records[-1]["content"] == "end":
       records = records[:-2]
@@ -262,20 +567,15 @@ class UIAnalysis(RestorableAction):
 
     return records
 
-  def get_comunication_history(self, messages: list[Message]):
+  def get_comunication_history(self, role: RestorableRole):
     records: list[dict[str, str]] = [
       {
         "role": "user",
         "content": self.PROMPT_TEMPLATE
       }
     ]
-    drafts: list[Message] = []
-    user_msgs: list[Message] = []
-    for message in messages:
-      if is_same_action(message.cause_by, self._get_draft_type()):
-        drafts.append(message)
-      if is_same_action(message.cause_by, self._get_user_answer_type()):
-        user_msgs.append(message)
+    drafts = role.rc.memory.get_by_action(self._get_draft_type())
+    user_msgs = role.rc.memory.get_by_action(self._get_user_answer_type())
 
     records.append({
       "role": "assistant",
@@ -289,21 +589,36 @@ class UIAnalysis(RestorableAction):
     return records
 
   def get_demand_change(self, role: RestorableRole):
-    messages = role.rc.memory.get()
-    related_msgs: list[Message] = []
-    for message in messages:
-      if is_same_action(message.cause_by, str(DemandChange)):
-        related_msgs.append(message)
-
-    return related_msgs[-1]
-
-  def get_system_prompt(self, role: RestorableRole):
-    demand_change_msg = self.get_demand_change(role)
-    info: dict[str, Any] = json.loads(demand_change_msg.content)
-    demand_json = info["demands"]
-    system_prompt = self.SYSTEM_TEMPLATE.format(system=role.get_system_msg(), doc=demand_json)
-
-    return system_prompt
+    return role.rc.memory.get_by_action(DemandChange)[-1]
+
+  def get_demand_doc(self, role: RestorableRole, info: dict[str, Any]) -> str:
+    """
+    根据需求变更消息获取对应版本的完整需求文档
+    """
+    if "demands" in info:
+      return info["demands"] # NOTICE: 兼容旧版本记忆中直接携带完整需求JSON的消息
+    return PRDStore(role.get_project_path()).dump(info["version"])
+
+  def get_demand_diff(self, role: RestorableRole) -> dict[str, Any]:
+    """
+    最新一次需求变更相对上一版本的结构化差异
+    """
+    info: dict[str, Any] = json.loads(self.get_demand_change(role).content)
+    return info.get("diff", { "added": [], "removed": [], "changed": [] })
+
+  def get_latest_demand_doc(self, role: RestorableRole) -> str:
+    """
+    最新一次需求变更对应版本的完整需求文档
+    """
+    info: dict[str, Any] = json.loads(self.get_demand_change(role).content)
+    return self.get_demand_doc(role, info)
+
+  def get_layout(self, role: RestorableRole, doc: str, history: list[dict[str, str]], turn: str = "") -> PromptLayout:
+    """
+    设计稿请求的提示词：角色描述、按版本的需求文档、对话记录依次排列，同一版本需求文档下的多次请求（设计、修正、审核后的修改）可以复用同一个前缀
+    """
+    layout = PromptLayout().add_segment(STATIC_SEGMENT, role.get_system_msg()).add_segment(DOC_SEGMENT, self.DOC_TEMPLATE.format(doc=doc))
+    return layout.add_history(history).add_turn(turn)
 
 
   def _get_draft_type(self):
@@ -312,11 +627,27 @@ class UIAnalysis(RestorableAction):
   def _get_user_answer_type(self):
     return f"{type(self)}_user_answer"
 
+  def _get_diff_type(self):
+    return f"{type(self)}_ui_diff"
+
 
 class UIDesigner(RestorableRole):
   name: str = "斯蒂芬"
   profile: str = "ui designer"
   goal: str = "基于同事提供的需求为其提供相应的且合理的UI设计"
+  TRANSITIONS: ClassVar[list[Transition]] = [
+    Transition(DemandAnalysis, DemandConfirmationAsk),
+    Transition(DemandConfirmationAnswer, DemandConfirmationAsk, when=lambda role, msg: role.name in msg.send_to),
+    Transition(DemandChange, UIAnalysis, when=lambda role, msg: role.name in msg.send_to),
+  ]
+  PINNED_ACTIONS: ClassVar[list[Any]] = [DemandAnalysis, DemandChange, f"{UIAnalysis}_ui_draft", f"{UIAnalysis}_user_answer", f"{UIAnalysis}_ui_diff"]
+  THREAD_ACTIONS: ClassVar[list[Any]] = [DemandConfirmationAsk, DemandConfirmationAnswer]
+  render_mode: str = "page"
+  """设计稿截图方式：page（默认）每个模块单独打开本地的预览页面；gallery从CDN加载运行时，在一个页面中一次性渲染所有模块（需要联网，失败时退回page）"""
+  render_options: RenderOptions = Field(default_factory=RenderOptions)
+  """截图的视口、裁剪、图片格式等参数"""
+  diff_threshold: float = DIFF_THRESHOLD
+  """和上一版截图对比时，变化像素占比低于这个值的模块视为没有变化"""
 
   def __init__(self, **kwargs):
     super().__init__(**kwargs)
@@ -325,20 +656,6 @@ class UIDesigner(RestorableRole):
     self._set_react_mode(react_mode="react", max_react_loop=999)
     self.set_watch([DemandAnalysis, DemandConfirmationAnswer, DemandChange])
 
-  def state_machine(self):
-    msg = self.get_memories(k=1)[0]
-
-    if is_same_action(msg.cause_by, str(DemandAnalysis)):
-      return self.get_action(DemandConfirmationAsk) # FIXME: 搞不懂这里之前没用实例为啥也可以？
-
-    if is_same_action(msg.cause_by, str(DemandConfirmationAnswer)) and self.name in msg.send_to:
-      return self.get_action(DemandConfirmationAsk)
-
-    if is_same_action(msg.cause_by, str(DemandChange)) and self.name in msg.send_to:
-      return self.get_action(UIAnalysis)
-
-    return None
-
   async def _act(self) -> Message:
     # TODO: 标准化act流程
     logger.info(f"{self._setting}: to do {self.rc.todo}({self.rc.todo.name})")
@@ -354,20 +671,22 @@ class UIDesigner(RestorableRole):
     else:
       answer = await todo.run(msg.content)
 
-    record = Message(content=answer, role=self.profile, cause_by=type(todo))
+    # NOTICE: 审核通过时UIAnalysis返回的是记忆中已有的设计稿消息，直接作为结果，不能再包装成新的消息
+    record = answer if isinstance(answer, Message) else Message(content=answer, role=self.profile, cause_by=type(todo))
 
     if self.restoring_action and todo.finished:
       record = msg # TODO: 事实上所有恢复的已结束动作直接返回消息即可，无需再执行动作？
     self.update_state(todo, True)
     # NOTICE: 仅正在恢复行为且之前行为已经结束的时候不需要保存记忆（因为之前记忆已经存在了）
-    if not self.restoring_action or not todo.finished:
+    if not self.restoring_action or (not todo.finished and not isinstance(answer, Message)):
       record = self.add_memory(record)
 
     if isinstance(todo, RestorableAction):
       self.restoring_action = False
       self.need_restore_action = False
-      RestorableRole.restorable = False # 恢复完成
+      self.set_restorable(False) # 恢复完成
       todo.finished = False
       todo.need_restore = False
 
+    self.save_checkpoint()
     return record
\ No newline at end of file
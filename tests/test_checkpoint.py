@@ -0,0 +1,84 @@
+import json
+import os
+from metagpt.schema import Message
+from snowdream_company.roles.demand_analyst import DemandConfirmationAsk
+from snowdream_company.roles.ui_designer import UIDesigner
+from snowdream_company.tool.checkpoint import TeamCheckpoint
+from snowdream_company.tool.message_store import MessageStore
+from snowdream_company.tool.team import init_project
+
+def reopen(project_path: str) -> UIDesigner:
+  """
+  模拟新的进程：清空进程内共享的检查点和消息存储后重新构造角色
+  """
+  MessageStore._stores.clear()
+  TeamCheckpoint._checkpoints.clear()
+  role = UIDesigner(project_path=project_path, restore_policy="restore")
+  role.ensure_memory()
+  return role
+
+def test_only_checkpoint_is_written(tmp_path):
+  project_path = str(tmp_path)
+  init_project(project_path)
+  role = UIDesigner(project_path=project_path, restore_policy="fresh")
+  role.add_memory(Message(content="列表是否需要分页？", role=role.profile, cause_by=DemandConfirmationAsk))
+  role.update_state(role.get_action(DemandConfirmationAsk))
+
+  assert os.path.exists(os.path.join(project_path, "checkpoint.bin"))
+  assert not os.path.exists(os.path.join(project_path, "state.json"))
+  assert not os.path.exists(os.path.join(project_path, "memory", f"{role.get_memory_key()}.json"))
+
+  restored = reopen(project_path)
+  assert [msg.content for msg in restored.rc.memory.get()] == ["列表是否需要分页？"]
+  assert restored.read_state()["action_name"] == "DemandConfirmationAsk"
+  assert restored.need_restore_action
+
+def test_save_skips_unchanged_checkpoint(tmp_path):
+  project_path = str(tmp_path)
+  init_project(project_path)
+  role = UIDesigner(project_path=project_path, restore_policy="fresh")
+  role.add_memory(Message(content="列表是否需要分页？", role=role.profile, cause_by=DemandConfirmationAsk))
+  role.save_checkpoint()
+  checkpoint_path = os.path.join(project_path, "checkpoint.bin")
+  os.utime(checkpoint_path, (0, 0))
+  role.save_checkpoint()
+
+  assert os.path.getmtime(checkpoint_path) == 0
+
+def test_add_memory_is_flushed_with_the_checkpoint(tmp_path):
+  project_path = str(tmp_path)
+  init_project(project_path)
+  role = UIDesigner(project_path=project_path, restore_policy="fresh")
+  checkpoint_path = os.path.join(project_path, "checkpoint.bin")
+  for idx in range(3):
+    role.add_memory(Message(content=f"第{idx}个问题", role=role.profile, cause_by=DemandConfirmationAsk))
+  assert not os.path.exists(checkpoint_path) # NOTICE: 添加记忆时不写入检查点
+
+  role.save_checkpoint()
+  restored = reopen(project_path)
+  assert [msg.content for msg in restored.rc.memory.get()] == [f"第{idx}个问题" for idx in range(3)]
+
+def test_read_legacy_memory_file(tmp_path):
+  project_path = str(tmp_path)
+  init_project(project_path)
+  key = UIDesigner(project_path=project_path, restore_policy="fresh").get_memory_key()
+  msg = Message(content="旧版本写入的记忆", role="ui designer", cause_by=DemandConfirmationAsk)
+  with open(os.path.join(project_path, "memory", f"{key}.json"), "w", encoding="utf-8") as file:
+    json.dump([MessageStore.of(project_path).to_record(msg)], file)
+
+  restored = reopen(project_path)
+  assert [memory.content for memory in restored.rc.memory.get()] == ["旧版本写入的记忆"]
+
+def test_discarded_role_ignores_legacy_memory_file(tmp_path):
+  project_path = str(tmp_path)
+  init_project(project_path)
+  key = UIDesigner(project_path=project_path, restore_policy="fresh").get_memory_key()
+  msg = Message(content="旧版本写入的记忆", role="ui designer", cause_by=DemandConfirmationAsk)
+  with open(os.path.join(project_path, "memory", f"{key}.json"), "w", encoding="utf-8") as file:
+    json.dump([MessageStore.of(project_path).to_record(msg)], file)
+
+  role = UIDesigner(project_path=project_path, restore_policy="fresh") # NOTICE: 选择不恢复记忆
+  role.save_checkpoint()
+
+  restored = reopen(project_path)
+  assert restored.rc.memory.get() == []
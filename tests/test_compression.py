@@ -0,0 +1,43 @@
+import json
+import pytest
+from snowdream_company.tool.compression import CODECS, compress_bytes, decompress_bytes, detect_file_codec, load_json, open_text, write_text
+
+DATA = { "content": "需求确认消息" * 100, "send_to": ["<all>"] }
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_json_round_trip(tmp_path, codec):
+  path = str(tmp_path / "data.json")
+  write_text(path, json.dumps(DATA, ensure_ascii=False), codec)
+
+  assert detect_file_codec(path) == codec
+  assert load_json(path) == DATA
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_text_round_trip(tmp_path, codec):
+  path = str(tmp_path / "data.txt")
+  write_text(path, "第一行\n第二行", codec)
+
+  with open_text(path) as file:
+    assert file.read() == "第一行\n第二行"
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_append_keeps_codec(tmp_path, codec):
+  path = str(tmp_path / "archive.jsonl")
+  with open_text(path, "a", codec) as file:
+    file.write("1\n")
+  for _ in range(2):
+    with open_text(path, "a", "none") as file: # NOTICE: 追加时沿用文件已有的压缩格式
+      file.write("2\n")
+
+  assert detect_file_codec(path) == codec
+  with open_text(path) as file:
+    assert file.read() == "1\n2\n2\n"
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_bytes_round_trip(codec):
+  data = "消息内容".encode("utf-8") * 50
+  assert decompress_bytes(compress_bytes(data, codec)) == data
+
+def test_unknown_codec(tmp_path):
+  with pytest.raises(ValueError):
+    write_text(str(tmp_path / "data.json"), json.dumps(DATA, ensure_ascii=False), "brotli")
@@ -0,0 +1,66 @@
+from metagpt.schema import Message
+from snowdream_company.tool.conversation_view import ConversationMemory
+from snowdream_company.tool.memory_archive import MemoryArchive
+from snowdream_company.tool.message_store import MessageStore
+
+def create_memory(tmp_path) -> ConversationMemory:
+  store = MessageStore(str(tmp_path))
+  memory = ConversationMemory()
+  memory.archive = MemoryArchive(str(tmp_path / "archive.jsonl"), store)
+  return memory
+
+def add_messages(memory: ConversationMemory, count: int) -> list[Message]:
+  messages = [Message(content=f"消息{idx}", role="user", cause_by="Ask" if idx % 2 == 0 else "Answer") for idx in range(count)]
+  memory.add_batch(messages)
+  return messages
+
+def content_mapper(message):
+  return message.content
+
+def test_views_share_one_archive_scan(tmp_path, monkeypatch):
+  memory = create_memory(tmp_path)
+  messages = add_messages(memory, 6)
+  memory.archive_messages(messages[:4], memory.archive.store.to_record)
+
+  # NOTICE: 模拟新进程：清空缓存，只保留磁盘上的归档
+  restored = create_memory(tmp_path)
+  restored.add_batch(messages[4:])
+  restored.seqs = { message.id: memory.seqs[message.id] for message in messages[4:] }
+  loads = []
+  load = restored.archive.load
+  monkeypatch.setattr(restored.archive, "load", lambda: loads.append(1) or load())
+
+  assert restored.get_view("all", content_mapper) == ["消息4", "消息5"]
+  assert len(loads) == 0 # NOTICE: 只用到工作集时不读取归档
+
+  assert restored.get_view("all", content_mapper, include_archive=True) == [f"消息{idx}" for idx in range(6)]
+  assert restored.get_view("asks", lambda message: message.content if message.cause_by == "Ask" else None, include_archive=True) == ["消息0", "消息2", "消息4"]
+  assert len(loads) == 1
+
+def test_archive_cache_follows_new_archives(tmp_path):
+  memory = create_memory(tmp_path)
+  messages = add_messages(memory, 6)
+  memory.archive_messages(messages[2:4], memory.archive.store.to_record)
+  assert memory.get_view("all", content_mapper, include_archive=True) == [f"消息{idx}" for idx in range(6)]
+
+  memory.archive_messages(messages[:2], memory.archive.store.to_record)
+  assert [seq for seq, _ in memory.archived] == [0, 1, 2, 3]
+  assert [message.content for message in memory.iter_history()] == [f"消息{idx}" for idx in range(6)]
+
+def test_get_by_action_with_archive(tmp_path):
+  memory = create_memory(tmp_path)
+  messages = add_messages(memory, 6)
+  memory.archive_messages(messages[:3], memory.archive.store.to_record)
+
+  assert [message.content for message in memory.get_by_action("Ask")] == ["消息4"]
+  assert [message.content for message in memory.get_by_action("Ask", include_archive=True)] == ["消息0", "消息2", "消息4"]
+
+def test_view_built_before_archiving_is_not_duplicated(tmp_path):
+  memory = create_memory(tmp_path)
+  messages = add_messages(memory, 4)
+  records = memory.get_view("all", content_mapper)
+  memory.archive_messages(messages[:2], memory.archive.store.to_record)
+  memory.add(Message(content="消息4", role="user", cause_by="Ask"))
+
+  assert memory.get_view("all", content_mapper, include_archive=True) is records
+  assert records == [f"消息{idx}" for idx in range(5)]
@@ -0,0 +1,32 @@
+import os
+import pytest
+from snowdream_company.benchmark import hot_paths
+
+ENABLED = os.environ.get("SNOWDREAM_BENCHMARK", "") == "1"
+"""计时结果受机器负载影响，默认的pytest运行中跳过，为1时才运行"""
+FULL = os.environ.get("SNOWDREAM_BENCHMARK_FULL", "") == "1"
+"""为1时也运行超过QUICK_MAX_MESSAGES条消息的规模"""
+ROUNDS = 3
+MIN_TIME = 0.02
+BASELINES = hot_paths.load_baselines(hot_paths.BASELINE_PATH)
+pytestmark = pytest.mark.skipif(not ENABLED, reason="基准测试默认不运行，设置SNOWDREAM_BENCHMARK=1后运行")
+PARAMS = [(name, scale, factory) for name, scales, factory in hot_paths.CASES for scale in hot_paths.get_scales(scales, not FULL)]
+
+@pytest.fixture(scope="module")
+def speed():
+  from metagpt.logs import logger
+
+  logger.disable("snowdream_company") # NOTICE: 恢复记忆等路径会打印日志，和基线一样不计入耗时
+  yield hot_paths.get_speed(BASELINES, ROUNDS, MIN_TIME)[1]
+  hot_paths.cleanup()
+  logger.enable("snowdream_company")
+
+@pytest.mark.parametrize("name,scale,factory", PARAMS, ids=[f"{name}[{scale}]" for name, scale, _ in PARAMS])
+def test_hot_path(speed, name, scale, factory):
+  baseline = BASELINES["cases"].get(f"{name}[{scale}]")
+  if baseline is None:
+    pytest.skip("没有基线，先运行python -m snowdream_company.benchmark.hot_paths --update")
+  result = hot_paths.measure(factory(scale), ROUNDS, MIN_TIME)
+
+  ratio = hot_paths.compare(result, baseline, speed)
+  assert ratio <= hot_paths.DEFAULT_THRESHOLD, f"耗时{result['min'] * 1000:.3f}ms，是基线的{ratio:.2f}倍"
@@ -0,0 +1,24 @@
+import asyncio
+import multiprocessing
+import pytest
+from snowdream_company.tool import limits
+
+def test_cancelled_wait_does_not_leak_permit(monkeypatch):
+  semaphore = multiprocessing.Semaphore(1)
+  monkeypatch.setitem(limits._limits, "test", semaphore)
+
+  async def hold(seconds: float):
+    async with limits.limit("test"):
+      await asyncio.sleep(seconds)
+
+  async def main():
+    holder = asyncio.create_task(hold(0.3))
+    await asyncio.sleep(0.05)
+    with pytest.raises(asyncio.TimeoutError):
+      await asyncio.wait_for(hold(0), 0.1)
+    await holder
+    await asyncio.sleep(limits.POLL_INTERVAL * 2) # NOTICE: 等待被取消的线程退出
+    await asyncio.wait_for(hold(0), 1) # NOTICE: 许可被泄漏时这里会超时
+
+  asyncio.run(main())
+  assert semaphore.acquire(False)
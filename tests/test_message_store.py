@@ -0,0 +1,21 @@
+from metagpt.schema import Message
+from snowdream_company.tool.message_store import MessageStore
+
+def test_round_trip_and_dedup(tmp_path):
+  store = MessageStore(str(tmp_path))
+  first = store.to_record(Message(content="广播的需求文档", role="user"))
+  second = store.to_record(Message(content="广播的需求文档", role="user"))
+
+  assert first["content_ref"] == second["content_ref"]
+  assert "content" not in first
+  assert store.from_record(first)["content"] == "广播的需求文档"
+  assert len(list((tmp_path / "memory" / "objects").rglob("*.json"))) == 1
+
+def test_body_cache_is_bounded(tmp_path):
+  store = MessageStore(str(tmp_path))
+  store.CACHE_SIZE = 4
+  refs = [store.to_record(Message(content=f"消息{idx}", role="user"))["content_ref"] for idx in range(10)]
+
+  assert len(store._bodies) == 0 # NOTICE: 写入时不缓存内容
+  assert [store.get(ref)["content"] for ref in refs] == [f"消息{idx}" for idx in range(10)]
+  assert list(store._bodies.keys()) == refs[-4:]
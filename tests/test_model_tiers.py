@@ -0,0 +1,24 @@
+import asyncio
+import pytest
+from snowdream_company.tool.model_tiers import probe_question
+
+class FakeLLM:
+  def __init__(self, answer: str):
+    self.answer = answer
+
+  async def aask(self, msg, system_msgs):
+    return self.answer
+
+@pytest.mark.parametrize("answer,need_question", [
+  ("no", False),
+  ("No.", False),
+  ("**NO**", False),
+  ("no, 没有问题了", False),
+  ("yes", True),
+  ("not sure", True),
+  ("None", True),
+  ("nothing to ask", True),
+  ("", True),
+])
+def test_probe_question(answer, need_question):
+  assert asyncio.run(probe_question(FakeLLM(answer), [], [])) == need_question
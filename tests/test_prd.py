@@ -0,0 +1,75 @@
+from snowdream_company.tool.prd import PRDStore, canonicalize_demands, diff_demands, is_empty_diff
+
+DEMANDS = [
+  { "标题": "登录", "优先级": "高", "需求描述": "账号密码登录", "子需求": [{ "标题": "验证码", "优先级": "中", "需求描述": "短信验证码" }] },
+  { "标题": "订单", "优先级": "高", "需求描述": "订单列表" },
+]
+
+def get_titles(nodes):
+  return [node["标题"] for node in nodes]
+
+def test_same_tree_has_empty_diff():
+  old = canonicalize_demands(DEMANDS)
+  assert is_empty_diff(diff_demands(old, canonicalize_demands(DEMANDS, old)))
+
+def test_diff_add_remove_change():
+  old = canonicalize_demands(DEMANDS)
+  new = canonicalize_demands([
+    { "标题": "登录", "优先级": "低", "需求描述": "账号密码登录", "子需求": [] },
+    { "标题": "支付", "优先级": "高", "需求描述": "微信支付" },
+  ], old)
+  diff = diff_demands(old, new)
+
+  assert get_titles(diff["added"]) == ["支付"]
+  assert sorted(get_titles(diff["removed"])) == ["订单", "验证码"]
+  assert get_titles(diff["changed"]) == ["登录"]
+  assert diff["changed"][0]["before"] == { "优先级": "高" }
+
+def test_added_child_records_parent():
+  old = canonicalize_demands(DEMANDS)
+  new = canonicalize_demands([DEMANDS[0] | { "子需求": DEMANDS[0]["子需求"] + [{ "标题": "找回密码", "优先级": "低", "需求描述": "邮箱找回" }] }, DEMANDS[1]], old)
+  diff = diff_demands(old, new)
+
+  assert get_titles(diff["added"]) == ["找回密码"]
+  assert diff["added"][0]["parent"] == old[0]["id"]
+
+def test_rename_keeps_id():
+  old = canonicalize_demands(DEMANDS)
+  new = canonicalize_demands([DEMANDS[0] | { "标题": "账号登录" }, DEMANDS[1]], old)
+  diff = diff_demands(old, new)
+
+  assert new[0]["id"] == old[0]["id"]
+  assert new[0]["子需求"][0]["id"] == old[0]["子需求"][0]["id"]
+  assert diff["added"] == [] and diff["removed"] == []
+  assert diff["changed"][0]["before"] == { "标题": "登录" }
+
+def test_rename_and_reuse_title():
+  old = canonicalize_demands(DEMANDS)
+  new = canonicalize_demands([DEMANDS[0] | { "标题": "账号登录" }, { "标题": "登录", "优先级": "低", "需求描述": "扫码登录" }, DEMANDS[1]], old)
+  diff = diff_demands(old, new)
+
+  assert new[0]["id"] == old[0]["id"]
+  assert get_titles(diff["added"]) == ["登录"]
+  assert len(set([node["id"] for node in new])) == 3
+
+def test_store_versions_and_dump(tmp_path):
+  store = PRDStore(str(tmp_path))
+  first = store.commit(DEMANDS)
+  assert first["version"] == "1.0.0" and first["previous_version"] is None
+  assert store.commit(DEMANDS)["version"] == "1.0.0" # NOTICE: 内容没有变化时不生成新版本
+
+  second = store.commit([DEMANDS[0] | { "标题": "账号登录" }, DEMANDS[1]])
+  assert second["version"] == "1.1.0" and second["previous_version"] == "1.0.0"
+  assert store.get_versions() == ["1.0.0", "1.1.0"]
+  assert "hash" not in store.dump() and "账号登录" in store.dump()
+  assert (tmp_path / "prd" / "1.1.0.md").exists()
+
+def test_unchanged_tree_updates_markdown(tmp_path):
+  store = PRDStore(str(tmp_path))
+  store.commit(DEMANDS, "# 需求变更记录\n\n第一版\n\n")
+  commit = store.commit(DEMANDS, "# 需求变更记录\n\n调整了流程图\n\n")
+
+  assert commit["version"] == "1.0.0" and is_empty_diff(commit["diff"])
+  assert store.get_versions() == ["1.0.0"]
+  markdown = (tmp_path / "prd" / "1.0.0.md").read_text(encoding="utf-8")
+  assert "调整了流程图" in markdown and "第一版" not in markdown and "账号密码登录" in markdown
@@ -0,0 +1,67 @@
+from collections import OrderedDict
+from snowdream_company.tool import retrieval
+from snowdream_company.tool.prd import PRDStore, canonicalize_demands
+from snowdream_company.tool.retrieval import BM25Index, DemandRetriever, get_demand_segments, tokenize
+
+def test_tokenize():
+  assert tokenize("Login 登录页") == ["login", "登录", "录页"]
+  assert tokenize("单") == ["单"]
+
+def test_bm25_ranking():
+  index = BM25Index()
+  index.add("login", "登录 用户通过账号密码登录系统")
+  index.add("order", "订单 用户可以查看订单列表")
+  index.add("cart", "购物车 用户可以把商品加入购物车，然后生成订单")
+
+  hits = index.search("订单列表", 3)
+  assert [doc_id for doc_id, _ in hits] == ["order", "cart"]
+  assert hits[0][1] > hits[1][1]
+  assert index.search("订单", 1)[0][0] == "order"
+  assert index.search("退款", 3) == []
+  assert index.search("订单", 0) == []
+
+def test_bm25_prefers_rare_terms():
+  index = BM25Index()
+  for idx in range(10):
+    index.add(f"common{idx}", "用户 页面")
+  index.add("rare", "用户 页面 退款")
+
+  assert index.search("用户 退款", 1)[0][0] == "rare"
+
+def test_select_details():
+  demands = canonicalize_demands([{ "标题": f"功能{idx}", "优先级": "高", "需求描述": description } for idx, description in enumerate(["账号密码登录", "订单列表分页", "购物车结算"])])
+  retriever = DemandRetriever(demands)
+
+  assert retriever.select_details("订单", 3) is None # NOTICE: 需求数量不超过k时无需裁剪
+  details = retriever.select_details("订单列表", 1)
+  assert "订单列表分页" in details and "账号密码登录" not in details
+  assert retriever.get_outline().count("- 功能") == 3
+  assert retriever.select_details("退款", 1) == "" # NOTICE: 没有命中时依然需要裁剪，只是没有详情
+
+def test_demand_segments_keep_outline_without_hits(tmp_path):
+  demands = [{ "标题": f"功能{idx}", "优先级": "高", "需求描述": description } for idx, description in enumerate(["账号密码登录", "订单列表分页", "购物车结算"])]
+  PRDStore(str(tmp_path)).commit(demands)
+
+  doc, details = get_demand_segments(str(tmp_path), "订单列表", 1, "完整文档")
+  assert doc.startswith("完整需求大纲") and "订单列表分页" in details
+  assert get_demand_segments(str(tmp_path), "退款", 1, "完整文档") == (doc, "")
+  assert get_demand_segments(str(tmp_path), "订单", 3, "完整文档") == ("完整文档", "")
+
+def test_retriever_cache_keeps_latest_version(tmp_path, monkeypatch):
+  monkeypatch.setattr(retrieval, "_retrievers", OrderedDict())
+  monkeypatch.setattr(retrieval, "RETRIEVER_CACHE_SIZE", 2)
+  project_path = str(tmp_path / "project")
+  store = PRDStore(project_path)
+  store.commit([{ "标题": "登录", "优先级": "高", "需求描述": "账号密码登录" }])
+  first = retrieval.get_retriever(project_path)
+  assert retrieval.get_retriever(project_path) is first
+
+  store.commit([{ "标题": "登录", "优先级": "高", "需求描述": "短信验证码登录" }])
+  second = retrieval.get_retriever(project_path)
+  assert second is not first and list(retrieval._retrievers) == [project_path] # NOTICE: 旧版本的索引被替换
+
+  for idx in range(2):
+    other = str(tmp_path / f"other{idx}")
+    PRDStore(other).commit([{ "标题": "订单", "优先级": "高", "需求描述": "订单列表" }])
+    retrieval.get_retriever(other)
+  assert project_path not in retrieval._retrievers
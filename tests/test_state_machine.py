@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+from snowdream_company.tool.state_machine import StateMachine, Transition, action_id
+
+class Ask:
+  pass
+
+class Answer:
+  pass
+
+class Draft:
+  pass
+
+def get_machine():
+  return StateMachine([
+    Transition(Ask, Answer, lambda role, msg: msg.sent_from != role.name),
+    Transition(Answer, Ask, lambda role, msg: msg.content != "end"),
+    Transition(Answer, Draft),
+    Transition(f"{Draft}_ui_draft", None),
+  ])
+
+def get_msg(cause_by, content = "", sent_from = "user"):
+  return SimpleNamespace(cause_by=cause_by, content=content, sent_from=sent_from)
+
+def test_action_id():
+  assert action_id(Ask) == f"{__name__}.Ask"
+  assert action_id(str(Ask)) == action_id(Ask)
+  assert action_id(f"{Draft}_ui_draft") == f"{__name__}.Draft_ui_draft"
+
+def test_dispatch_by_cause_and_condition():
+  machine = get_machine()
+  role = SimpleNamespace(name="斯蒂芬")
+
+  assert machine.dispatch(role, get_msg(str(Ask))) is Answer
+  assert machine.dispatch(role, get_msg(Ask, sent_from="斯蒂芬")) is None # NOTICE: 条件不满足且没有其他转移
+  assert machine.dispatch(role, get_msg(Answer, "还有问题")) is Ask
+  assert machine.dispatch(role, get_msg(Answer, "end")) is Draft # NOTICE: 按声明顺序检查，第一个条件不满足时落到下一个
+  assert machine.dispatch(role, get_msg(f"{Draft}_ui_draft")) is None
+  assert machine.dispatch(role, get_msg("unknown.Action")) is None
+
+def test_trace():
+  machine = get_machine()
+  role = SimpleNamespace(name="斯蒂芬")
+  machine.dispatch(role, get_msg(Answer, "end"))
+  machine.dispatch(role, get_msg("unknown.Action"))
+
+  assert [record["transition"] for record in machine.trace] == ["Answer -> Draft", None]
+  assert machine.trace[0]["cause_by"] == action_id(Answer)
@@ -0,0 +1,88 @@
+import asyncio
+import os
+from snowdream_company.roles import ui_designer
+from snowdream_company.roles.ui_designer import UIAnalysis, UIDesigner
+from snowdream_company.tool.team import init_project
+
+LIST_MODULE = "```vue\n<!-- 列表 -->\n<!-- demands: 1 -->\n<template>\n  <div>列表</div>\n</template>\n```"
+DETAIL_MODULE = "```vue\n<!-- 详情 -->\n<!-- demands: 2 -->\n<template>\n  <div>详情</div>\n</template>\n```"
+IMPORTS = "```json\n[]\n```"
+
+async def fake_screenshots(files, imports, options, assets):
+  report = []
+  for file in files:
+    for path in options.get_image_paths(file).values():
+      with open(path, "wb") as image:
+        image.write(b"fake")
+      report.append({ "file": file, "image": path, "elapsed": 0.0, "bytes": 4 })
+  return report
+
+def create_designer(tmp_path, monkeypatch, answers: list[str]):
+  """
+  创建UI设计师并替换截图和用户输入；answers记录每次审核时展示的内容
+  """
+  project_path = str(tmp_path)
+  init_project(project_path)
+  monkeypatch.setattr(ui_designer, "generate_vue_element_screenshots", fake_screenshots)
+
+  async def fake_input(title, tip, detail):
+    answers.append(detail)
+    return "end"
+
+  monkeypatch.setattr(ui_designer, "ask_user_input", fake_input)
+  role = UIDesigner(project_path=project_path, restore_policy="fresh")
+  action = next(action for action in role.actions if isinstance(action, UIAnalysis))
+  return role, action
+
+def test_new_draft_is_reviewed_with_diff(tmp_path, monkeypatch):
+  answers: list[str] = []
+  role, action = create_designer(tmp_path, monkeypatch, answers)
+  first = f"{LIST_MODULE}\n\n{IMPORTS}"
+  second = f"{LIST_MODULE}\n\n{DETAIL_MODULE}\n\n{IMPORTS}"
+
+  async def main():
+    assert await action.save_ui(role, first) is None # NOTICE: 没有上一版，不需要对比
+    diff_msg = await action.save_ui(role, second)
+    draft_msg = action.add_draft(role, second, diff_msg)
+    return diff_msg, draft_msg, await action.get_user_answer(role, draft_msg)
+
+  diff_msg, draft_msg, res = asyncio.run(main())
+  assert [msg.id for msg in role.rc.memory.get()] == [diff_msg.id, draft_msg.id]
+  assert res.id == draft_msg.id
+  assert answers == [f"{second}\n\n{diff_msg.content}"]
+
+def test_restore_does_not_put_diff_after_draft(tmp_path, monkeypatch):
+  answers: list[str] = []
+  role, action = create_designer(tmp_path, monkeypatch, answers)
+  draft = f"{LIST_MODULE}\n\n{IMPORTS}"
+
+  async def main():
+    draft_msg = action.add_draft(role, draft, await action.save_ui(role, draft))
+    # NOTICE: 模拟中断前截图没有完成，恢复时需要重新截图
+    image_path = role.render_options.get_image_paths(os.path.join(role.get_project_path(), "ui", "1.0.0", "列表.vue"))["desktop"]
+    os.remove(image_path)
+    return draft_msg, await action.restore(role)
+
+  draft_msg, res = asyncio.run(main())
+  assert [msg.id for msg in role.rc.memory.get()] == [draft_msg.id]
+  assert res.id == draft_msg.id
+  assert answers == [draft]
+
+def test_accepted_draft_is_not_wrapped_again(tmp_path, monkeypatch):
+  answers: list[str] = []
+  role, action = create_designer(tmp_path, monkeypatch, answers)
+  draft = f"{LIST_MODULE}\n\n{IMPORTS}"
+
+  async def main():
+    draft_msg = action.add_draft(role, draft, await action.save_ui(role, draft))
+
+    async def accept(role):
+      return draft_msg # NOTICE: 审核通过时UIAnalysis返回记忆中已有的设计稿消息
+
+    monkeypatch.setattr(action, "run", accept)
+    role._set_state(role.actions.index(action))
+    return draft_msg, await role._act()
+
+  draft_msg, res = asyncio.run(main())
+  assert res is draft_msg
+  assert [msg.id for msg in role.rc.memory.get()] == [draft_msg.id]
@@ -0,0 +1,204 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import struct
+import time
+import zlib
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Optional
+from metagpt.logs import logger
+
+ASSET_CONCURRENCY = 4
+"""同时生成的图片数量"""
+DEFAULT_SIZE = (400, 300)
+MAX_SIZE = 4096
+IMAGE_SIGNATURES: list[tuple[bytes, str, str]] = [
+  (b"\x89PNG", "png", "image/png"),
+  (b"\xff\xd8\xff", "jpg", "image/jpeg"),
+  (b"GIF8", "gif", "image/gif"),
+  (b"RIFF", "webp", "image/webp"),
+  (b"<svg", "svg", "image/svg+xml"),
+  (b"<?xml", "svg", "image/svg+xml"),
+]
+SIZE_PATTERN = re.compile(r"(\d{2,4})\s*(?:px)?\s*[xX×*]\s*(\d{2,4})")
+
+
+class ImageRequest:
+  """
+  generate-image代码块描述的一张图片：第一行是文件名，其余是图片的描述
+  """
+  def __init__(self, filename: str, description: str):
+    self.filename = filename
+    self.description = description
+    self.key = hashlib.sha256(" ".join(description.split()).encode("utf-8")).hexdigest()
+    """描述的hash，相同描述的图片只生成一次（包括不同版本的设计稿之间）"""
+    self.size = parse_size(description)
+
+  @classmethod
+  def parse(cls, block: str) -> Optional["ImageRequest"]:
+    lines = [line.strip() for line in block.strip().splitlines() if line.strip() != ""]
+    if len(lines) == 0:
+      return None
+    filename = re.split(r"[：:]", lines[0])[-1].strip() # NOTICE: 兼容“文件名：xxx.png”的写法
+    description = "\n".join(lines[1:]) or lines[0]
+    return cls(os.path.basename(filename), description)
+
+ImageGenerator = Callable[[ImageRequest], Awaitable[bytes]]
+"""图片生成的后端，参数为图片的描述，返回图片文件的内容"""
+
+_image_generator: ContextVar[Optional[ImageGenerator]] = ContextVar("image_generator", default=None)
+
+def set_image_generator(generator: Optional[ImageGenerator]):
+  """
+  设置当前协程（及其创建的子任务）使用的图片生成后端，没有设置时使用本地的占位图；返回用于恢复的token
+  """
+  return _image_generator.set(generator)
+
+def guess_image_type(data: bytes) -> tuple[str, str]:
+  """
+  根据文件头判断图片格式，返回（扩展名，MIME类型）
+  """
+  for signature, extension, mime in IMAGE_SIGNATURES:
+    if data.startswith(signature):
+      return extension, mime
+  return "bin", "application/octet-stream"
+
+def parse_size(description: str) -> tuple[int, int]:
+  """
+  从描述中解析图片尺寸（例如800x600、800×600），没有时使用默认尺寸
+  """
+  match = SIZE_PATTERN.search(description)
+  if match is None:
+    return DEFAULT_SIZE
+  return min(int(match.group(1)), MAX_SIZE), min(int(match.group(2)), MAX_SIZE)
+
+def encode_png(width: int, height: int, rows: list[bytes]) -> bytes:
+  """
+  用标准库编码RGB格式的png，rows为每一行的像素数据
+  """
+  def chunk(tag: bytes, data: bytes):
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+
+  raw = b"".join([b"\x00" + row for row in rows])
+  return b"".join([
+    b"\x89PNG\r\n\x1a\n",
+    chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)),
+    chunk(b"IDAT", zlib.compress(raw, 6)),
+    chunk(b"IEND", b""),
+  ])
+
+def render_placeholder(request: ImageRequest) -> bytes:
+  """
+  绘制占位图：由描述决定的浅色背景，加上边框和对角线，尺寸和描述中的一致
+  """
+  width, height = request.size
+  seed = bytes.fromhex(request.key[:6])
+  background = bytes([160 + value % 80 for value in seed])
+  line = bytes([value // 2 for value in background])
+  border_row = line * width
+  rows: list[bytes] = []
+  for y in range(height):
+    if y == 0 or y == height - 1:
+      rows.append(border_row)
+      continue
+    row = bytearray(background * width)
+    for x in [0, width - 1, y * (width - 1) // (height - 1), width - 1 - y * (width - 1) // (height - 1)]:
+      row[x * 3:x * 3 + 3] = line
+    rows.append(bytes(row))
+  return encode_png(width, height, rows)
+
+async def generate_placeholder(request: ImageRequest) -> bytes:
+  """
+  默认的离线图片生成后端
+  """
+  return await asyncio.to_thread(render_placeholder, request)
+
+
+class AssetPipeline:
+  """
+  设计稿的图片资源：解析generate-image代码块，按描述去重后并发生成，结果按描述的hash缓存在项目的ui/assets目录下；
+  截图时浏览器按文件名请求图片，还没生成完的图片会等待生成，截图不需要等所有图片都生成完才开始。
+  """
+  def __init__(self, project_path: str, generator: Optional[ImageGenerator] = None, concurrency: int = ASSET_CONCURRENCY):
+    self.root = os.path.join(project_path, "ui", "assets")
+    self.generator = generator or _image_generator.get() or generate_placeholder
+    self.semaphore = asyncio.Semaphore(concurrency)
+    self.requests: dict[str, ImageRequest] = {}
+    """文件名到图片描述的映射"""
+    self.tasks: dict[str, asyncio.Task] = {}
+    """描述的hash到生成任务的映射"""
+    self.generated: list[str] = []
+    self.files: dict[str, str] = {}
+    """描述的hash到缓存文件名的映射"""
+
+  def start(self, blocks: list[str]) -> "AssetPipeline":
+    """
+    开始生成代码块中描述的图片，已经缓存的图片不会重新生成
+    """
+    os.makedirs(self.root, exist_ok=True)
+    for filename in os.listdir(self.root):
+      key, extension = os.path.splitext(filename)
+      if extension not in [".json", ".tmp"]:
+        self.files[key] = filename
+    for block in blocks:
+      request = ImageRequest.parse(block)
+      if request is None:
+        continue
+      self.requests[request.filename] = request
+      if request.key not in self.tasks:
+        self.tasks[request.key] = asyncio.create_task(self._generate(request))
+    return self
+
+  async def _generate(self, request: ImageRequest) -> bytes:
+    if request.key in self.files:
+      with open(os.path.join(self.root, self.files[request.key]), "rb") as file:
+        return file.read()
+    async with self.semaphore:
+      data = await self.generator(request)
+    filename = f"{request.key}.{guess_image_type(data)[0]}"
+    path = os.path.join(self.root, filename)
+    with open(f"{path}.tmp", "wb") as file:
+      file.write(data)
+    os.replace(f"{path}.tmp", path)
+    self.files[request.key] = filename
+    self.generated.append(request.filename)
+    return data
+
+  def has(self, filename: str):
+    return filename in self.requests
+
+  async def get(self, filename: str) -> Optional[bytes]:
+    """
+    获取图片的内容，还没生成完时等待；生成失败时返回None
+    """
+    request = self.requests.get(filename)
+    if request is None:
+      return None
+    try:
+      return await self.tasks[request.key]
+    except Exception as error:
+      logger.warning(f"图片生成失败 {filename}: {error}")
+      return None
+
+  async def wait(self) -> dict[str, Any]:
+    """
+    等待所有图片生成完，并写入文件名到缓存文件的索引，返回生成情况
+    """
+    start = time.perf_counter()
+    results = await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+    failed = len([result for result in results if isinstance(result, Exception)])
+    index = {
+      filename: { "file": self.files.get(request.key, ""), "size": list(request.size), "description": request.description }
+      for filename, request in self.requests.items()
+    }
+    with open(os.path.join(self.root, "index.json"), "w", encoding="utf-8") as file:
+      json.dump(index, file, ensure_ascii=False, indent=2)
+    return {
+      "images": len(self.requests),
+      "unique": len(self.tasks),
+      "generated": len(self.generated),
+      "failed": failed,
+      "wait": time.perf_counter() - start,
+    }
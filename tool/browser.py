@@ -1,37 +1,414 @@
+import asyncio
+import base64
 import json
 import os
-from playwright.async_api import async_playwright
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Optional
+from urllib.parse import unquote, urlparse
+from pydantic import BaseModel, field_validator
+from metagpt.logs import logger
+from snowdream_company.tool.assets import guess_image_type
+from snowdream_company.tool.limits import limit
 
-def get_image_path(file_path: str):
+CDN_URL = "https://cdn.jsdelivr.net/npm"
+ASSET_ORIGIN = "http://assets.snowdream.local/"
+"""画廊页面的基础地址，模块中相对路径的图片都会请求到这里，由设计稿的图片资源响应"""
+GALLERY_TIMEOUT = 60000
+PREVIEW_ROOT = "#app > *"
+"""预览页面中组件根元素的选择器"""
+VIEWPORTS: dict[str, dict[str, int]] = {
+  "desktop": { "width": 1280, "height": 800 },
+  "tablet": { "width": 768, "height": 1024 },
+  "mobile": { "width": 375, "height": 812 },
+}
+IMAGE_EXTENSIONS: dict[str, str] = { "png": "png", "jpeg": "jpg", "webp": "webp" }
+NEXT_FRAME = "() => new Promise((resolve) => requestAnimationFrame(() => requestAnimationFrame(resolve)))"
+GALLERY_TEMPLATE = r"""<!DOCTYPE html>
+<html>
+<head>
+  <meta charset="utf-8">
+  <base href="{asset_origin}">
+  <link rel="stylesheet" href="{cdn}/element-plus/dist/index.css">
+  <script type="importmap">{import_map}</script>
+  <style>
+    body {{ margin: 0; background: #fff; }}
+    .gallery-item {{ width: 100%; min-height: 1px; display: flow-root; position: relative; overflow: hidden; }}
+  </style>
+</head>
+<body>
+  {containers}
+  <script type="application/json" id="gallery-modules">{modules}</script>
+  <script type="module">
+    let Vue, ElementPlus, loadModule;
+    try {{
+      [Vue, {{ default: ElementPlus }}, {{ loadModule }}] = await Promise.all([import("vue"), import("element-plus"), import("vue3-sfc-loader")]);
+    }} catch (error) {{
+      window.__galleryFailed = String(error); // NOTICE: 运行时从CDN加载失败时立即通知截图程序，不必等到超时
+      throw error;
+    }}
+
+    const {{ files, imports }} = JSON.parse(document.getElementById("gallery-modules").textContent);
+    const moduleCache = {{ vue: Vue, "element-plus": ElementPlus }};
+    await Promise.all(imports.map(async (name) => {{
+      try {{
+        moduleCache[name] = await import(name);
+      }} catch (error) {{
+        console.error(`load ${{name}} failed`, error);
+      }}
+    }}));
+    window.__galleryErrors = {{}};
+    // 非scoped的样式限定在模块自己的容器内，避免模块之间互相影响；@keyframes、@font-face和@import保持全局
+    const scopeStyle = (textContent, scope) => {{
+      const sheet = new CSSStyleSheet();
+      sheet.replaceSync(textContent);
+      const global = textContent.match(/@import[^;]+;/g) || [];
+      const scoped = [];
+      for (const rule of sheet.cssRules) {{
+        (rule instanceof CSSKeyframesRule || rule instanceof CSSFontFaceRule ? global : scoped).push(rule.cssText);
+      }}
+      return `${{global.join("\n")}}\n@scope (${{scope}}) {{\n${{scoped.join("\n")}}\n}}`;
+    }};
+    await Promise.all(files.map(async (source, index) => {{
+      const options = {{
+        moduleCache,
+        handleModule: async (type, getContentData, path) => /^\.(png|jpe?g|gif|webp|svg)$/i.test(type) ? new URL(path, document.baseURI).href : undefined,
+        getFile: (url) => url === `/module${{index}}.vue` ? source : fetch(url).then((res) => res.text()),
+        addStyle: (textContent) => document.head.append(Object.assign(document.createElement("style"), {{ textContent: scopeStyle(textContent, `#module-${{index}}`) }})),
+      }};
+      try {{
+        const component = await loadModule(`/module${{index}}.vue`, options);
+        const app = Vue.createApp(component);
+        app.use(ElementPlus);
+        app.config.errorHandler = (error) => {{ window.__galleryErrors[index] = String(error); }};
+        app.mount(`#module-${{index}}`);
+      }} catch (error) {{
+        window.__galleryErrors[index] = String(error);
+      }}
+    }}));
+    await document.fonts.ready;
+    await Promise.all([...document.images].filter((image) => !image.complete).map((image) => new Promise((resolve) => {{
+      image.addEventListener("load", resolve);
+      image.addEventListener("error", resolve);
+    }})));
+    await new Promise((resolve) => requestAnimationFrame(() => requestAnimationFrame(resolve)));
+    window.__galleryReady = true;
+  </script>
+</body>
+</html>
+"""
+"""画廊页面：所有模块共用一份Vue、element-plus以及import map，各自挂载到独立的容器中，样式也只作用于各自的容器"""
+
+def get_image_path(file_path: str, viewport: str = "", image_format: str = "png"):
   dirname = os.path.dirname(file_path)
   filename = os.path.basename(file_path)
   base, _ = os.path.splitext(filename)
+  suffix = f".{viewport}" if viewport else ""
 
-  return os.path.join(dirname, f"{base}.png")
+  return os.path.join(dirname, f"{base}{suffix}.{IMAGE_EXTENSIONS[image_format]}")
 
 def get_file_content(file_path: str):
   with open(file_path, "r", encoding="utf-8") as file:
     return file.read()
 
-async def generate_screenshots(files: list[str]):
-  async with async_playwright() as playwright:
-    browser = await playwright.chromium.launch(headless=True)
-    context = await browser.new_context()
-    page = await context.new_page()
 
+class RenderOptions(BaseModel):
+  """
+  截图参数：一次渲染可以截取多个视口，图片可以裁剪到组件根元素，并使用体积更小的jpeg、webp格式
+  """
+  viewports: list[str] = ["desktop"]
+  """要截图的视口预设（见VIEWPORTS）；第一个视口的截图文件名不带视口后缀，例如模块.png、模块.mobile.png"""
+  clip: bool = False
+  """为True时只截取组件的根元素；默认和之前一样截取整个页面（画廊模式下为模块所在的整个容器），保证截图对比的基线一致"""
+  image_format: str = "png"
+  """png、jpeg或webp（webp通过CDP截取，只支持Chromium）"""
+  quality: int = 80
+  """jpeg和webp的压缩质量（0-100）"""
+  device_scale_factor: float = 1.0
+
+  @field_validator("viewports")
+  @classmethod
+  def check_viewports(cls, value: list[str]):
+    unknown = [viewport for viewport in value if viewport not in VIEWPORTS]
+    if len(value) == 0 or len(unknown) > 0:
+      raise ValueError(f"未知的视口：{unknown}，可选的视口有{list(VIEWPORTS)}")
+    return value
+
+  @field_validator("image_format")
+  @classmethod
+  def check_image_format(cls, value: str):
+    if value not in IMAGE_EXTENSIONS:
+      raise ValueError(f"不支持的图片格式：{value}，可选的格式有{list(IMAGE_EXTENSIONS)}")
+    return value
+
+  def get_image_paths(self, file_path: str) -> dict[str, str]:
+    """
+    模块在各个视口下的截图路径
+    """
+    return {
+      viewport: get_image_path(file_path, "" if idx == 0 else viewport, self.image_format)
+      for idx, viewport in enumerate(self.viewports)
+    }
+
+
+class BrowserPool:
+  """
+  常驻的浏览器池：启动后一直保持playwright以及size个浏览器实例，每次截图只新建一个浏览器上下文；
+  用于守护进程等长期运行的场景，避免每次截图都重新启动Chromium。
+  """
+  def __init__(self, size: int = 1):
+    self.size = size
+    self._playwright: Any = None
+    self._browsers: Optional[asyncio.Queue] = None
+
+  @property
+  def started(self):
+    return self._browsers is not None
+
+  async def start(self):
+    if self.started:
+      return
+    from playwright.async_api import async_playwright # NOTICE: 延迟导入，只有真正截图时才加载playwright
+
+    self._playwright = await async_playwright().start()
+    self._browsers = asyncio.Queue()
+    for _ in range(self.size):
+      self._browsers.put_nowait(await self._playwright.chromium.launch(headless=True))
+
+  async def close(self):
+    if not self.started:
+      return
+    while not self._browsers.empty():
+      browser = self._browsers.get_nowait()
+      await browser.close()
+    await self._playwright.stop()
+    self._browsers = None
+    self._playwright = None
+
+  @asynccontextmanager
+  async def page(self, **context_options):
+    """
+    从池中取出一个浏览器并新建页面，用完后关闭页面所在的上下文并归还浏览器
+    """
+    browser = await self._browsers.get()
+    if not browser.is_connected():
+      browser = await self._playwright.chromium.launch(headless=True) # NOTICE: 浏览器崩溃后重新启动
+    context = await browser.new_context(**context_options)
+    try:
+      yield await context.new_page()
+    finally:
+      await context.close()
+      self._browsers.put_nowait(browser)
+
+browser_pool = BrowserPool()
+"""进程共享的浏览器池，默认不启动"""
+
+@asynccontextmanager
+async def open_page(**context_options):
+  """
+  获取一个用于截图的页面：浏览器池已经启动时从池中获取，否则临时启动一个浏览器；同时使用的页面数受全局的"browser"限制。
+  context_options会传给浏览器上下文，例如device_scale_factor
+  """
+  async with limit("browser"):
+    if browser_pool.started:
+      async with browser_pool.page(**context_options) as page:
+        yield page
+      return
+
+    from playwright.async_api import async_playwright # NOTICE: 延迟导入，只有真正截图时才加载playwright
+
+    async with async_playwright() as playwright:
+      browser = await playwright.chromium.launch(headless=True)
+      try:
+        context = await browser.new_context(**context_options)
+        yield await context.new_page()
+      finally:
+        await browser.close()
+
+async def find_element(page: Any, selectors: list[str]) -> Optional[Any]:
+  """
+  返回第一个存在且有尺寸的元素，都没有时返回None
+  """
+  for selector in selectors:
+    locator = page.locator(selector).first
+    if await locator.count() == 0:
+      continue
+    box = await locator.bounding_box()
+    if box is not None and box["width"] > 0 and box["height"] > 0:
+      return locator
+  return None
+
+async def capture_webp(page: Any, element: Optional[Any], quality: int) -> bytes:
+  """
+  playwright的截图不支持webp，通过CDP直接截取；element为None时截取整个页面
+  """
+  if element is not None:
+    clip = await element.evaluate("(el) => { const rect = el.getBoundingClientRect(); return { x: rect.left + window.scrollX, y: rect.top + window.scrollY, width: rect.width, height: rect.height }; }")
+  else:
+    clip = await page.evaluate("() => ({ x: 0, y: 0, width: document.documentElement.scrollWidth, height: document.documentElement.scrollHeight })")
+  session = await page.context.new_cdp_session(page)
+  try:
+    res = await session.send("Page.captureScreenshot", {
+      "format": "webp",
+      "quality": quality,
+      "clip": { **clip, "scale": 1 },
+      "captureBeyondViewport": True,
+    })
+  finally:
+    await session.detach()
+  return base64.b64decode(res["data"])
+
+async def capture(page: Any, path: str, options: RenderOptions, selectors: list[str]) -> int:
+  """
+  按照截图参数截取selectors中第一个可见的元素，都不可见时截取整个页面；返回图片的字节数
+  """
+  element = await find_element(page, selectors)
+  if options.image_format == "webp":
+    with open(path, "wb") as file:
+      file.write(await capture_webp(page, element, options.quality))
+    return os.path.getsize(path)
+
+  screenshot_options: dict[str, Any] = { "path": path, "type": options.image_format }
+  if options.image_format == "jpeg":
+    screenshot_options["quality"] = options.quality
+  if element is not None:
+    await element.screenshot(**screenshot_options)
+  else:
+    await page.screenshot(full_page=True, **screenshot_options)
+  return os.path.getsize(path)
+
+async def capture_module(page: Any, file: str, viewport: str, options: RenderOptions, selectors: list[str]) -> dict[str, Any]:
+  """
+  截取模块在当前视口下的图片，返回截图的耗时和字节数
+  """
+  image_path = options.get_image_paths(file)[viewport]
+  start = time.perf_counter()
+  size = await capture(page, image_path, options, selectors)
+  return {
+    "file": file,
+    "viewport": viewport,
+    "image": image_path,
+    "elapsed": time.perf_counter() - start,
+    "bytes": size,
+  }
+
+async def resize(page: Any, viewport: str):
+  await page.set_viewport_size(VIEWPORTS[viewport])
+  await page.evaluate(NEXT_FRAME) # NOTICE: 等待重新布局后再截图
+
+async def capture_viewports(page: Any, file: str, options: RenderOptions, selectors: list[str]) -> list[dict[str, Any]]:
+  """
+  在同一个已经渲染好的页面中依次切换视口并截图
+  """
+  report: list[dict[str, Any]] = []
+  for viewport in options.viewports:
+    await resize(page, viewport)
+    report.append(await capture_module(page, file, viewport, options, selectors))
+  return report
+
+def summarize_render_report(report: list[dict[str, Any]]) -> str:
+  total_bytes = sum([item["bytes"] for item in report])
+  total_time = sum([item["elapsed"] for item in report])
+  return f"截图{len(report)}张，共{total_bytes / 1024:.1f}KB，截图耗时{total_time * 1000:.0f}ms"
+
+async def generate_screenshots(files: list[str], options: Optional[RenderOptions] = None) -> list[dict[str, Any]]:
+  options = options or RenderOptions()
+  report: list[dict[str, Any]] = []
+  async with open_page(device_scale_factor=options.device_scale_factor) as page:
     for file in files:
       await page.goto(f"file://{file}")
       # page.wait_for_timeout(1000)
-      imgae_path = get_image_path(file)
-      await page.screenshot(path=imgae_path, full_page=True)
+      report += await capture_viewports(page, file, options, ["body"] if options.clip else [])
+  return report
+
+async def serve_assets(page: Any, assets: Any):
+  """
+  让页面按文件名从设计稿的图片资源中获取图片（不论请求的是哪个地址），还没生成完的图片会等待生成
+  """
+  def match(url: str):
+    return assets.has(unquote(os.path.basename(urlparse(url).path)))
 
-    await browser.close()
+  async def handle(route: Any):
+    data = await assets.get(unquote(os.path.basename(urlparse(route.request.url).path)))
+    if data is None:
+      await route.fulfill(status=404)
+      return
+    await route.fulfill(status=200, body=data, content_type=guess_image_type(data)[1])
 
-async def generate_vue_element_screenshots(files: list[str], imports: list[str]):
-  async with async_playwright() as playwright:
-    browser = await playwright.chromium.launch(headless=True)
-    context = await browser.new_context()
-    page = await context.new_page()
+  await page.route(match, handle)
+
+def get_import_map(imports: list[str]) -> dict[str, str]:
+  import_map = {
+    "vue": f"{CDN_URL}/vue@3/dist/vue.esm-browser.prod.js",
+    "element-plus": f"{CDN_URL}/element-plus/dist/index.full.min.mjs",
+    "vue3-sfc-loader": f"{CDN_URL}/vue3-sfc-loader/dist/vue3-sfc-loader.esm.js",
+  }
+  for pck in imports:
+    if pck not in import_map:
+      import_map[pck] = f"{CDN_URL}/{pck}/+esm"
+
+  return import_map
+
+def render_gallery(sources: list[str], imports: list[str]) -> str:
+  """
+  生成画廊页面的HTML，模块源码以JSON的形式内嵌在页面中
+  """
+  containers = "\n  ".join([f'<div class="gallery-item" id="module-{idx}"></div>' for idx in range(len(sources))])
+  modules = json.dumps({ "files": sources, "imports": [pck for pck in imports if pck not in ["vue", "element-plus"]] }, ensure_ascii=False)
+
+  return GALLERY_TEMPLATE.format(
+    cdn=CDN_URL,
+    asset_origin=ASSET_ORIGIN,
+    import_map=json.dumps({ "imports": get_import_map(imports) }),
+    containers=containers,
+    modules=modules.replace("</", "<\\/"), # NOTICE: 避免源码中的</script>提前结束脚本标签
+  )
+
+async def generate_vue_gallery_screenshots(files: list[str], imports: list[str], options: Optional[RenderOptions] = None, assets: Optional[Any] = None) -> list[dict[str, Any]]:
+  """
+  画廊模式：所有模块在同一个页面中只加载一次运行时，然后按元素分别截图，每个.vue文件依然生成同名的图片；
+  多个视口只需要调整页面尺寸，不需要重新加载；assets为设计稿的图片资源（AssetPipeline）。
+  画廊页面的运行时加载失败或者超时（例如CDN不可用）时退回到逐个模块截图（generate_vue_element_screenshots）
+  """
+  from playwright.async_api import TimeoutError as PlaywrightTimeoutError # NOTICE: 延迟导入，只有真正截图时才加载playwright
+
+  options = options or RenderOptions()
+  try:
+    return await capture_gallery(files, imports, options, assets)
+  except (PlaywrightTimeoutError, RuntimeError) as error:
+    # NOTICE: 画廊页面从CDN加载运行时，CDN不可用或者加载超时时改为逐个模块在本地的预览页面中截图
+    logger.warning(f"画廊页面不可用，改为逐个模块截图：{error}")
+    return await generate_vue_element_screenshots(files, imports, options, assets)
+
+async def capture_gallery(files: list[str], imports: list[str], options: RenderOptions, assets: Optional[Any] = None) -> list[dict[str, Any]]:
+  sources = [get_file_content(file) for file in files]
+  report: list[dict[str, Any]] = []
+  async with open_page(device_scale_factor=options.device_scale_factor) as page:
+    if assets is not None:
+      await serve_assets(page, assets)
+    await page.set_viewport_size(VIEWPORTS[options.viewports[0]])
+    await page.set_content(render_gallery(sources, imports), wait_until="load", timeout=GALLERY_TIMEOUT)
+    await page.wait_for_function("window.__galleryReady === true || window.__galleryFailed !== undefined", timeout=GALLERY_TIMEOUT)
+    failed: Optional[str] = await page.evaluate("window.__galleryFailed")
+    if failed is not None:
+      raise RuntimeError(f"画廊页面的运行时加载失败：{failed}")
+    errors: dict[str, str] = await page.evaluate("window.__galleryErrors")
+    for idx, file in enumerate(files):
+      if str(idx) in errors:
+        logger.warning(f"模块渲染失败 {file}: {errors[str(idx)]}")
+    for viewport in options.viewports:
+      await resize(page, viewport)
+      for idx, file in enumerate(files):
+        selectors = [f"#module-{idx} > *", f"#module-{idx}"] if options.clip else [f"#module-{idx}"]
+        report.append(await capture_module(page, file, viewport, options, selectors))
+  return report
+
+async def generate_vue_element_screenshots(files: list[str], imports: list[str], options: Optional[RenderOptions] = None, assets: Optional[Any] = None) -> list[dict[str, Any]]:
+  options = options or RenderOptions()
+  report: list[dict[str, Any]] = []
+  async with open_page(device_scale_factor=options.device_scale_factor) as page:
+    if assets is not None:
+      await serve_assets(page, assets)
     import_map: dict[str, str] = {}
 
     for pck in imports:
@@ -48,10 +425,9 @@ async def generate_vue_element_screenshots(files: list[str], imports: list[str])
       # FIXME: 截图有一定几率白屏，且看不到交互，应该直接在VSCode预览？
       file_content = get_file_content(file)
       code: str = await page.evaluate(f"window.encodeURIComponent(`{file_content}`)")
+      await page.set_viewport_size(VIEWPORTS[options.viewports[0]])
       await page.goto(f"https://localhost:5173/?code={code}&map={import_map_json}")
       await page.wait_for_load_state("domcontentloaded")
       await page.wait_for_timeout(5000)
-      imgae_path = get_image_path(file)
-      await page.screenshot(path=imgae_path, full_page=True)
-
-    await browser.close()
\ No newline at end of file
+      report += await capture_viewports(page, file, options, [PREVIEW_ROOT] if options.clip else [])
+  return report
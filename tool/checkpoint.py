@@ -0,0 +1,170 @@
+import hashlib
+import json
+import os
+import time
+from typing import Any, Optional
+from metagpt.logs import logger
+from snowdream_company.tool.compression import compress_bytes, decompress_bytes
+from snowdream_company.tool.prd import PRDStore
+
+CHECKPOINT_VERSION = 1
+
+def collect_artifacts(project_path: str) -> dict[str, Any]:
+  """
+  收集项目中已经产出（或部分产出）的产物清单：最新的需求文档版本、UI模块清单以及LLM输出的断点
+  """
+  artifacts: dict[str, Any] = {
+    "prd_version": PRDStore(project_path).latest_version(),
+    "ui_modules": {},
+    "partial": None,
+  }
+  manifest_path = os.path.join(project_path, "ui", "1.0.0", "modules.json")
+  if os.path.exists(manifest_path):
+    with open(manifest_path, "r", encoding="utf-8") as file:
+      artifacts["ui_modules"] = json.load(file)
+  partial_path = os.path.join(project_path, "partial.json")
+  if os.path.exists(partial_path):
+    with open(partial_path, "r", encoding="utf-8") as file:
+      partial: dict[str, Any] = json.load(file)
+    artifacts["partial"] = {
+      "action_name": partial["action_name"],
+      "key": partial["key"],
+      "complete_end": partial["complete_end"],
+    }
+
+  return artifacts
+
+
+class TeamCheckpoint:
+  """
+  整个团队的检查点文件（checkpoint.bin）：包含各个角色的记忆记录（消息内容只保存引用）、当前的行为状态以及产物清单；
+  内容经过压缩并带有校验和，写入时原子替换，恢复时只需要顺序读取一个文件。
+  检查点是唯一的写入目标；检查点可用时以它为准，旧版本写入的state.json和各个角色的记忆文件只在检查点缺失、损坏，
+  或者检查点中从来没有记录过该角色（从旧版本升级的项目）时读取。
+  """
+  MAGIC = b"SDCK1\n"
+  FILE_NAME = "checkpoint.bin"
+  _checkpoints: dict[str, "TeamCheckpoint"] = {}
+
+  @classmethod
+  def of(cls, project_path: str) -> "TeamCheckpoint":
+    """
+    获取项目共享的检查点
+    """
+    key = os.path.abspath(project_path)
+    if key not in cls._checkpoints:
+      cls._checkpoints[key] = cls(project_path)
+    return cls._checkpoints[key]
+
+  def __init__(self, project_path: str):
+    self.project_path = project_path
+    self.path = os.path.join(project_path, self.FILE_NAME)
+    self.roles: dict[str, list[dict[str, Any]]] = {}
+    """各个角色（key为`名字_职位`）的记忆记录"""
+    self.state: Optional[dict[str, Any]] = None
+    self.codec = "zlib"
+    """写入时使用的压缩格式，读取时自动识别"""
+    self._loaded = False
+    self._valid = False
+    self._dirty = True
+    """是否有还没写入检查点的修改"""
+
+  def load(self) -> bool:
+    """
+    读取并校验检查点，只会读取一次；返回检查点是否可用
+    """
+    if self._loaded:
+      return self._valid
+    self._loaded = True
+    if not os.path.exists(self.path):
+      return False
+    with open(self.path, "rb") as file:
+      data = file.read()
+    try:
+      data = self.decode(data)
+    except ValueError as error:
+      logger.warning(f"{self.path} 检查点不可用（{error}），改为从各个角色的记忆文件恢复")
+      return False
+
+    # NOTICE: 本进程中已经更新过的内容优先
+    self.roles = { **data["roles"], **self.roles }
+    if self.state is None:
+      self.state = data["state"]
+    self._valid = True
+    logger.info(f"读取检查点 {self.path}：{len(data['roles'])} 个角色，保存于 {time.ctime(data['time'])}")
+    return True
+
+  def decode(self, data: bytes) -> dict[str, Any]:
+    """
+    校验并解码检查点文件的内容，格式为：MAGIC + sha256校验和 + 换行 + 压缩后的JSON
+    """
+    if not data.startswith(self.MAGIC):
+      raise ValueError("文件格式不正确")
+    header_end = data.find(b"\n", len(self.MAGIC))
+    if header_end < 0:
+      raise ValueError("缺少校验和")
+    checksum = data[len(self.MAGIC):header_end].decode("ascii")
+    payload = data[header_end + 1:]
+    if hashlib.sha256(payload).hexdigest() != checksum:
+      raise ValueError("校验和不一致")
+    res: dict[str, Any] = json.loads(decompress_bytes(payload))
+    if res.get("version") != CHECKPOINT_VERSION:
+      raise ValueError(f"不支持的版本 {res.get('version')}")
+    return res
+
+  def encode(self, data: dict[str, Any]) -> bytes:
+    payload = compress_bytes(json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), self.codec)
+    checksum = hashlib.sha256(payload).hexdigest().encode("ascii")
+    return self.MAGIC + checksum + b"\n" + payload
+
+  def get_records(self, key: str) -> Optional[list[dict[str, Any]]]:
+    """
+    获取角色的记忆记录（选择了不恢复记忆的角色为空列表）；检查点不可用或者从来没有记录过该角色时返回None
+    """
+    if not self.load():
+      return None
+    return self.roles.get(key)
+
+  def get_state(self) -> Optional[dict[str, Any]]:
+    if not self.load():
+      return None
+    return self.state
+
+  def set_records(self, key: str, records: list[dict[str, Any]]):
+    self.roles[key] = records
+    self._dirty = True
+
+  def discard(self, key: str):
+    """
+    清空角色的记忆记录（例如选择了不恢复记忆）；记录保留为空列表，之后不会再从旧版本的记忆文件恢复
+    """
+    self.load()
+    self.roles[key] = []
+    self._dirty = True
+
+  def set_state(self, state: dict[str, Any]):
+    self.state = state
+    self._dirty = True
+
+  def save(self):
+    """
+    原子写入检查点；没有新的修改时跳过
+    """
+    if not self._dirty:
+      return
+    self.load() # NOTICE: 先合并已有检查点中的内容，避免丢失还没有恢复记忆的角色
+    data = {
+      "version": CHECKPOINT_VERSION,
+      "time": time.time(),
+      "state": self.state,
+      "roles": self.roles,
+      "artifacts": collect_artifacts(self.project_path),
+    }
+    tmp_path = f"{self.path}.tmp"
+    with open(tmp_path, "wb") as file:
+      file.write(self.encode(data))
+      file.flush()
+      os.fsync(file.fileno())
+    os.replace(tmp_path, self.path)
+    self._valid = True
+    self._dirty = False
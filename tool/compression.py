@@ -0,0 +1,140 @@
+import gzip
+import io
+import json
+import lzma
+import os
+import zlib
+from typing import IO, Any
+
+CODECS = ["none", "zlib", "gzip", "lzma"]
+LEVEL = 6
+CHUNK_SIZE = 64 * 1024
+
+def detect_codec(head: bytes) -> str:
+  """
+  根据文件开头的几个字节识别压缩格式；JSON文本不会以这些字节开头
+  """
+  if head.startswith(b"\x1f\x8b"):
+    return "gzip"
+  if head.startswith(b"\xfd7zXZ\x00"):
+    return "lzma"
+  if len(head) >= 2 and head[0] == 0x78 and (head[0] * 256 + head[1]) % 31 == 0:
+    return "zlib"
+  return "none"
+
+def detect_file_codec(path: str) -> str:
+  with open(path, "rb") as file:
+    return detect_codec(file.read(6))
+
+def check_codec(codec: str):
+  if codec not in CODECS:
+    raise ValueError(f"不支持的压缩格式：{codec}，可选的格式有：{', '.join(CODECS)}")
+
+
+class _ZlibReader(io.RawIOBase):
+  """
+  分块解压zlib数据流，支持多段拼接的数据（追加写入的文件）
+  """
+  def __init__(self, file: IO[bytes]):
+    self._file = file
+    self._decompressor = zlib.decompressobj()
+    self._buffer = b""
+
+  def readable(self):
+    return True
+
+  def readinto(self, buffer) -> int:
+    while len(self._buffer) == 0:
+      data = b""
+      if self._decompressor.eof:
+        data = self._decompressor.unused_data
+        self._decompressor = zlib.decompressobj()
+      if len(data) == 0:
+        data = self._file.read(CHUNK_SIZE)
+      if len(data) == 0:
+        return 0
+      self._buffer = self._decompressor.decompress(data)
+    size = min(len(buffer), len(self._buffer))
+    buffer[:size] = self._buffer[:size]
+    self._buffer = self._buffer[size:]
+    return size
+
+  def close(self):
+    if not self.closed:
+      self._file.close()
+    super().close()
+
+
+class _ZlibWriter(io.RawIOBase):
+  def __init__(self, file: IO[bytes]):
+    self._file = file
+    self._compressor = zlib.compressobj(LEVEL)
+
+  def writable(self):
+    return True
+
+  def write(self, data) -> int:
+    self._file.write(self._compressor.compress(data))
+    return len(data)
+
+  def close(self):
+    if not self.closed:
+      self._file.write(self._compressor.flush())
+      self._file.close()
+    super().close()
+
+
+def open_text(path: str, mode: str = "r", codec: str = "none") -> IO[str]:
+  """
+  打开（可能经过压缩的）文本文件：读取时自动识别压缩格式并边读边解压；
+  追加写入时沿用文件已有的压缩格式，避免同一个文件里混用不同的格式
+  """
+  if mode == "r":
+    codec = detect_file_codec(path)
+  else:
+    check_codec(codec)
+    if mode == "a" and os.path.exists(path) and os.path.getsize(path) > 0:
+      codec = detect_file_codec(path)
+
+  if codec == "gzip":
+    return gzip.open(path, f"{mode}t", compresslevel=LEVEL, encoding="utf-8")
+  if codec == "lzma":
+    return lzma.open(path, f"{mode}t", preset=None if mode == "r" else LEVEL, encoding="utf-8")
+  if codec == "zlib":
+    if mode == "r":
+      return io.TextIOWrapper(io.BufferedReader(_ZlibReader(open(path, "rb"))), encoding="utf-8")
+    return io.TextIOWrapper(io.BufferedWriter(_ZlibWriter(open(path, f"{mode}b"))), encoding="utf-8")
+  return open(path, mode, encoding="utf-8")
+
+def write_text(path: str, data: str, codec: str = "none"):
+  """
+  原子写入文本文件
+  """
+  tmp_path = f"{path}.tmp"
+  with open_text(tmp_path, "w", codec) as file:
+    file.write(data)
+  os.replace(tmp_path, path)
+
+def load_json(path: str) -> Any:
+  with open_text(path, "r") as file:
+    return json.load(file)
+
+def compress_bytes(data: bytes, codec: str) -> bytes:
+  check_codec(codec)
+  if codec == "gzip":
+    return gzip.compress(data, compresslevel=LEVEL)
+  if codec == "lzma":
+    return lzma.compress(data, preset=LEVEL)
+  if codec == "zlib":
+    return zlib.compress(data, LEVEL)
+  return data
+
+def decompress_bytes(data: bytes) -> bytes:
+  codec = detect_codec(data[:6])
+  if codec == "gzip":
+    return gzip.decompress(data)
+  if codec == "lzma":
+    return lzma.decompress(data)
+  if codec == "zlib":
+    return zlib.decompress(data)
+  return data
@@ -0,0 +1,183 @@
+import heapq
+from collections import defaultdict
+from typing import Any, Callable, Iterable, Iterator, Optional
+from pydantic import Field
+from metagpt.memory import Memory
+from metagpt.schema import Message
+from metagpt.utils.common import any_to_str
+from snowdream_company.tool.message_record import MessageRecord
+
+Mapper = Callable[[Message], Optional[Any]]
+
+
+class ConversationView:
+  """
+  物化的对话记录：mapper负责过滤消息并映射成{"role", "content"}形式的聊天记录（返回None表示忽略该消息），
+  记忆每增加或删除一条消息时增量更新，无需每次重新扫描全部记忆。
+  视图先由工作集中的消息构建，需要更早的历史时才合并归档中的消息（merge_archive）。
+  """
+  def __init__(self, mapper: Mapper):
+    self.mapper = mapper
+    self.records: list[Any] = []
+    self._sources: list[str] = []
+    """每条记录对应的消息id"""
+    self._seqs: list[int] = []
+    """每条记录对应的消息序号"""
+    self.merged = False
+    """是否已经合并了归档中的消息"""
+
+  def on_add(self, msg: Message, seq: int):
+    record = self.mapper(msg)
+    if record is None:
+      return
+    self.records.append(record)
+    self._sources.append(msg.id)
+    self._seqs.append(seq)
+
+  def on_delete_newest(self, msg: Message):
+    if len(self._sources) > 0 and self._sources[-1] == msg.id:
+      self.records.pop()
+      self._sources.pop()
+      self._seqs.pop()
+
+  def merge_archive(self, archived: Iterable[tuple[int, Any]]):
+    """
+    按序号合并归档中的消息；构建视图之后才归档的消息已经在视图中，不会重复加入
+    """
+    self.merged = True
+    sources = set(self._sources)
+    older: list[tuple[int, str, Any]] = []
+    for seq, message in archived:
+      if message.id in sources:
+        continue
+      record = self.mapper(message)
+      if record is not None:
+        older.append((seq, message.id, record))
+    if len(older) == 0:
+      return
+    current = zip(self._seqs, self._sources, self.records)
+    entries = list(heapq.merge(older, current, key=lambda entry: entry[0]))
+    self._seqs = [seq for seq, _, _ in entries]
+    self._sources = [source for _, source, _ in entries]
+    self.records[:] = [record for _, _, record in entries] # NOTICE: 原地更新，之前返回给调用方的列表同样有效
+
+
+class ConversationMemory(Memory):
+  """
+  在metagpt的Memory基础上增量维护已注册的对话视图；按消息id去重，添加消息是O(1)的。
+  每条消息都有一个递增的序号，视图需要更早的历史时，移入归档（archive）的消息按序号与工作集中的消息合并。
+  """
+  views: dict[Any, Any] = Field(default_factory=dict, exclude=True)
+  seqs: dict[str, int] = Field(default_factory=dict, exclude=True)
+  """工作集中消息id到序号的映射"""
+  next_seq: int = Field(default=0, exclude=True)
+  archive: Optional[Any] = Field(default=None, exclude=True)
+  """MemoryArchive，移出工作集的消息"""
+  archived: Optional[list[tuple[int, Any]]] = Field(default=None, exclude=True)
+  """已经读取的归档消息（按序号排列的紧凑记录）；归档文件只在第一次需要时读取一次，之后各个视图共用"""
+
+  def add(self, message: Message, seq: Optional[int] = None):
+    if message.id in self.seqs:
+      return
+    if seq is None:
+      seq = self.next_seq
+    self.seqs[message.id] = seq
+    self.next_seq = max(self.next_seq, seq + 1)
+    self.storage.append(message)
+    if message.cause_by:
+      self.index[message.cause_by].append(message)
+    for view in self.views.values():
+      view.on_add(message, seq)
+
+  def add_batch(self, messages: Iterable[Message]):
+    for message in messages:
+      self.add(message)
+
+  def delete_newest(self) -> Message:
+    newest_msg = super().delete_newest()
+    if newest_msg is not None:
+      self.seqs.pop(newest_msg.id, None)
+      for view in self.views.values():
+        view.on_delete_newest(newest_msg)
+    return newest_msg
+
+  def delete(self, message: Message):
+    super().delete(message)
+    self.seqs.pop(message.id, None)
+    self.views.clear() # NOTICE: 从中间删除消息时视图直接失效，下次使用时重新构建
+
+  def clear(self):
+    super().clear()
+    self.seqs = {}
+    self.views.clear()
+    self.archived = None
+
+  def archive_messages(self, messages: list[Message], to_record: Callable[[Message], dict[str, Any]]):
+    """
+    将消息移入归档：先追加写入归档文件，再从工作集中移除；已经构建的视图不受影响
+    """
+    if len(messages) == 0:
+      return
+    entries = [(self.seqs[message.id], to_record(message)) for message in messages]
+    self.archive.append(entries)
+    if self.archived is not None:
+      # NOTICE: 已经读取过归档时同步追加；较早的消息（例如刚结束的问答）可能比已归档的消息序号更小，需要重新排序
+      self.archived += [(seq, MessageRecord(record, self.archive.store)) for seq, record in entries]
+      self.archived.sort(key=lambda entry: entry[0])
+    archived = set([message.id for message in messages])
+    self.storage = [message for message in self.storage if message.id not in archived]
+    self.index = defaultdict(list)
+    for message in self.storage:
+      if message.cause_by:
+        self.index[message.cause_by].append(message)
+    for message_id in archived:
+      self.seqs.pop(message_id, None)
+
+  def get_archived(self) -> list[tuple[int, MessageRecord]]:
+    """
+    归档中的消息，第一次调用时读取归档文件
+    """
+    if self.archived is None:
+      self.archived = self.archive.load() if self.archive is not None else []
+    return self.archived
+
+  def iter_history(self) -> Iterator[Message]:
+    """
+    按时间顺序遍历完整的历史消息（包括归档）
+    """
+    archived_entries = self.get_archived()
+    if len(archived_entries) == 0:
+      yield from self.storage
+      return
+    archived = ((seq, message) for seq, message in archived_entries if message.id not in self.seqs)
+    current = ((self.seqs[message.id], message) for message in self.storage)
+    for _, message in heapq.merge(archived, current, key=lambda entry: entry[0]):
+      yield message
+
+  def get_by_action(self, action: Any, include_archive: bool = False) -> list[Message]:
+    """
+    获取由action产生的消息；默认只查找工作集（角色的PINNED_ACTIONS保证每种类型最新的一条一定在工作集中），
+    include_archive为True时按时间顺序合并归档中的消息
+    """
+    messages = super().get_by_action(action)
+    if not include_archive:
+      return messages
+    cause_by = any_to_str(action)
+    archived = ((seq, message) for seq, message in self.get_archived() if message.cause_by == cause_by and message.id not in self.seqs)
+    current = ((self.seqs[message.id], message) for message in messages)
+    return [message for _, message in heapq.merge(archived, current, key=lambda entry: entry[0])]
+
+  def get_view(self, key: Any, mapper: Mapper, include_archive: bool = False) -> list[Any]:
+    """
+    获取已注册的对话视图，第一次使用时扫描一遍工作集进行构建；
+    include_archive为True时（需要工作集之前的历史）再按序号合并归档中的消息，归档只在这时读取
+    """
+    if key not in self.views:
+      view = ConversationView(mapper)
+      for message in self.storage:
+        view.on_add(message, self.seqs[message.id])
+      self.views[key] = view
+    view = self.views[key]
+    if include_archive and not view.merged:
+      view.merge_archive(self.get_archived())
+    return view.records
@@ -0,0 +1,70 @@
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from typing import Any
+
+_limits: dict[str, Any] = {}
+POLL_INTERVAL = 0.1
+"""等待信号量时每次阻塞的最长时间（秒），超时后检查等待是否已经取消"""
+
+def set_limit(name: str, semaphore: Any):
+  """
+  设置全局的并发限制，例如"llm"、"browser"；semaphore可以是multiprocessing的信号量，从而在多个进程之间共享限制
+  """
+  _limits[name] = semaphore
+
+async def acquire(semaphore: Any):
+  """
+  获取信号量；进程间的信号量是阻塞的，放到线程里分段等待，避免阻塞事件循环。
+  等待被取消（例如超时）时线程会在POLL_INTERVAL内退出，并且保证不会留下没有释放的许可
+  """
+  lock = threading.Lock()
+  state = { "cancelled": False, "acquired": False }
+
+  def wait():
+    while True:
+      acquired = semaphore.acquire(True, POLL_INTERVAL)
+      with lock:
+        if state["cancelled"]:
+          if acquired:
+            semaphore.release()
+          return
+        if acquired:
+          state["acquired"] = True
+          return
+
+  try:
+    await asyncio.to_thread(wait)
+  except asyncio.CancelledError:
+    with lock:
+      state["cancelled"] = True
+      if state["acquired"]: # NOTICE: 线程已经拿到许可，但结果还没有交给协程
+        semaphore.release()
+    raise
+
+@asynccontextmanager
+async def limit(name: str):
+  """
+  在限制内执行；没有设置对应的限制时直接执行
+  """
+  semaphore = _limits.get(name)
+  if semaphore is None:
+    yield
+    return
+  await acquire(semaphore)
+  try:
+    yield
+  finally:
+    semaphore.release()
+
+def limit_llm(llm: Any, name: str = "llm"):
+  """
+  让LLM实例的每次请求都受到全局并发数的限制（角色的各个行为共用角色的LLM实例）
+  """
+  aask = llm.aask
+
+  async def limited_aask(*args, **kwargs):
+    async with limit(name):
+      return await aask(*args, **kwargs)
+
+  llm.aask = limited_aask
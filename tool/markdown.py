@@ -1,5 +1,6 @@
+import io
 import re
-from typing import Any
+from typing import Any, TextIO
 
 def get_lang_content(source: str, lang = "json", is_all = False):
   pattern = r"```" + lang + "\n(.*?)\n\s*```"
@@ -12,6 +13,42 @@ def get_lang_content(source: str, lang = "json", is_all = False):
 def get_html_comment(source: str):
   return re.findall(r"<!--\s*([^<>]*?)\s*-->", source, re.DOTALL)[0]
 
+def get_module_demands(source: str) -> list[str]:
+  """
+  获取vue模块中`<!-- demands: id1, id2 -->`注释标注的需求id列表
+  """
+  res = re.findall(r"<!--\s*demands:\s*([^<>]*?)\s*-->", source)
+  if len(res) == 0:
+    return []
+  return [item.strip() for item in re.split(r"[,，\s]+", res[0]) if item.strip()]
+
+def write_demands_markdown(demands: list[dict[str, Any]], file: TextIO, parent_level: int = 0) -> int:
+  """
+  将需求树以markdown格式流式写入file，输出和demands_to_markdown一致；使用显式的栈遍历，子需求嵌套再深也不会超过递归深度限制。
+
+  Parameters:
+    demands (list[dict[str, Any]]): 需求列表，每个需求包含“标题”、“优先级”、“需求描述”以及可选的“子需求”。
+    file (TextIO): 写入的目标，例如打开的文件或者io.StringIO。
+    parent_level (int, optional): 父级需求的标题级别，默认为0。
+
+  Returns:
+    int: 写入的字符数。
+  """
+  size = 0
+  # NOTICE: 栈中的元素为（需求，标题级别，章节前的分隔符），子需求按倒序入栈，出栈时即为文档顺序
+  stack: list[tuple[dict[str, Any], int, str]] = [(demand, parent_level + 1, "\n\n" if idx > 0 else "") for idx, demand in reversed(list(enumerate(demands)))]
+  while stack:
+    demand, level, separator = stack.pop()
+    section = f"{separator}{'#' * level} {demand['标题']}（优先级：{demand['优先级']}）\n\n{demand['需求描述']}"
+    children = demand.get("子需求") or []
+    if "子需求" in demand and len(children) == 0:
+      section += "\n\n" # NOTICE: 和原来的递归实现保持一致
+    stack += [(child, level + 1, "\n\n") for child in reversed(children)]
+    file.write(section)
+    size += len(section)
+
+  return size
+
 def demands_to_markdown(demands: list[dict[str, Any]], parent_level: int = 0) -> str:
   """
   Generate a Markdown representation of demands and their details.
@@ -23,17 +60,6 @@ def demands_to_markdown(demands: list[dict[str, Any]], parent_level: int = 0) ->
   Returns:
     str: A Markdown representation of the demands and their details.
   """
-  cur_level = parent_level + 1
-  res: list[str] = []
-  for demand in demands:
-    title = f"{'#' * cur_level} {demand['标题']}（优先级：{demand['优先级']}）"
-    desc = f"{demand['需求描述']}"
-    content = f"{title}\n\n{desc}"
-
-    if "子需求" in demand:
-      content += "\n\n" + demands_to_markdown(demand["子需求"], cur_level)
-
-    res.append(content)
-
-  return "\n\n".join(res)
-
+  buffer = io.StringIO()
+  write_demands_markdown(demands, buffer, parent_level)
+  return buffer.getvalue()
@@ -0,0 +1,53 @@
+import json
+import os
+from typing import Any
+from snowdream_company.tool.compression import open_text
+from snowdream_company.tool.message_record import MessageRecord
+from snowdream_company.tool.message_store import MessageStore
+
+
+class MemoryArchive:
+  """
+  角色记忆的冷存储：移出工作集的消息以追加的方式写入`<记忆文件>.archive.jsonl`，
+  每行是{"seq": 消息序号, "record": 记忆记录}；只有在构建需要回溯完整历史的对话视图时才会读取。
+  """
+  def __init__(self, path: str, store: MessageStore, fresh: bool = False, codec: str = "none"):
+    self.path = path
+    self.store = store
+    self.codec = codec
+    """新建归档时使用的压缩格式；追加时沿用已有归档的格式"""
+    self.fresh = fresh
+    """为True时忽略已有的归档（不恢复记忆），并在第一次归档时覆盖掉它"""
+
+  def has_entries(self) -> bool:
+    return not self.fresh and os.path.exists(self.path) and os.path.getsize(self.path) > 0
+
+  def append(self, entries: list[tuple[int, dict[str, Any]]]):
+    """
+    追加归档记录；写入完成后才会从记忆文件中移除这些消息，崩溃时最多只会产生重复记录
+    """
+    mode = "w" if self.fresh else "a"
+    with open_text(self.path, mode, self.codec) as file:
+      for seq, record in entries:
+        file.write(json.dumps({ "seq": seq, "record": record }, ensure_ascii=False))
+        file.write("\n")
+    with open(self.path, "rb") as file:
+      os.fsync(file.fileno())
+    self.fresh = False
+
+  def load(self) -> list[tuple[int, MessageRecord]]:
+    """
+    逐行读取（边读边解压）全部归档消息，按序号排序；记录只引用消息仓库中的正文，由ConversationMemory缓存一份供各个视图共用
+    """
+    if not self.has_entries():
+      return []
+    entries: list[tuple[int, MessageRecord]] = []
+    with open_text(self.path, "r") as file:
+      for line in file:
+        if line.strip() == "":
+          continue
+        item: dict[str, Any] = json.loads(line)
+        entries.append((item["seq"], MessageRecord(item["record"], self.store)))
+    entries.sort(key=lambda entry: entry[0])
+
+    return entries
@@ -0,0 +1,82 @@
+import sys
+from typing import Any, Optional
+from metagpt.schema import Message
+from snowdream_company.tool.message_store import MessageStore
+
+_EMPTY = object()
+
+
+class MessageRecord:
+  """
+  归档消息的紧凑表示；只保存历史记录常用的字段（字符串都经过intern），
+  content按需从MessageStore读取，访问其他字段时才还原成完整的Message。
+  """
+  __slots__ = ("id", "role", "cause_by", "sent_from", "send_to", "_ref", "_store", "_content", "_message")
+
+  def __init__(self, record: dict[str, Any], store: MessageStore):
+    self.id: str = record["id"]
+    self.role: str = sys.intern(record.get("role", "user"))
+    self.cause_by: str = sys.intern(record.get("cause_by", ""))
+    self.sent_from: str = sys.intern(record.get("sent_from", ""))
+    self.send_to: frozenset[str] = frozenset([sys.intern(name) for name in record.get("send_to", [])])
+    self._ref: Optional[str] = record.get("content_ref")
+    self._store = store
+    self._content = record.get("content", _EMPTY)
+    """旧格式的记录直接带有content"""
+    self._message: Optional[Message] = None
+
+  @property
+  def content(self) -> str:
+    if self._content is _EMPTY:
+      return self._store.get(self._ref)["content"]
+    return self._content
+
+  def hydrate(self) -> Message:
+    """
+    还原成完整的Message
+    """
+    if self._message is None:
+      data = {
+        "id": self.id,
+        "role": self.role,
+        "cause_by": self.cause_by,
+        "sent_from": self.sent_from,
+        "send_to": set(self.send_to),
+        "content": self.content,
+      }
+      if self._ref is not None:
+        data.update(self._store.get(self._ref))
+      self._message = Message.model_validate(data)
+    return self._message
+
+  def to_record(self) -> dict[str, Any]:
+    """
+    转换回记忆文件中的记录，无需还原消息
+    """
+    record: dict[str, Any] = {
+      "id": self.id,
+      "role": self.role,
+      "cause_by": self.cause_by,
+      "sent_from": self.sent_from,
+      "send_to": list(self.send_to),
+    }
+    if self._ref is not None:
+      record["content_ref"] = self._ref
+    else:
+      record["content"] = self._content
+    return record
+
+  def __getattr__(self, name: str):
+    # NOTICE: 只有在常用字段之外的属性（instruct_content、model_dump等）才会走到这里
+    if name.startswith("__"):
+      raise AttributeError(name)
+    return getattr(self.hydrate(), name)
+
+  def __eq__(self, other: object) -> bool:
+    return getattr(other, "id", None) == self.id
+
+  def __hash__(self) -> int:
+    return hash(self.id)
+
+  def __repr__(self) -> str:
+    return f"MessageRecord(id={self.id!r}, role={self.role!r}, cause_by={self.cause_by!r})"
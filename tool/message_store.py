@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Any
+from metagpt.schema import Message
+from snowdream_company.tool.compression import load_json, write_text
+
+BODY_FIELDS = ["content", "instruct_content"]
+
+
+class MessageStore:
+  """
+  项目级别的消息内容存储；消息内容按照内容hash只保存一份（memory/objects下），
+  各个角色的记忆文件中只保存引用以及sent_from、send_to等角色相关的元信息。
+  """
+  _stores: dict[str, "MessageStore"] = {}
+  CACHE_SIZE = 512
+  """最多缓存的消息内容数量，超过时淘汰最久没有读取的（完整的Message已经持有内容，这里只缓存按需读取的）"""
+
+  @classmethod
+  def of(cls, project_path: str) -> "MessageStore":
+    """
+    获取项目共享的消息存储
+    """
+    key = os.path.abspath(project_path)
+    if key not in cls._stores:
+      cls._stores[key] = cls(project_path)
+    return cls._stores[key]
+
+  def __init__(self, project_path: str):
+    self.root = os.path.join(project_path, "memory", "objects")
+    self.codec = "none"
+    """写入消息内容时使用的压缩格式，读取时自动识别"""
+    self._bodies: OrderedDict[str, dict[str, Any]] = OrderedDict()
+    self._written: set[str] = set()
+    """已经写入磁盘的内容引用，避免重复检查文件是否存在"""
+    self._refs: dict[str, str] = {}
+    """消息id到内容引用的缓存，避免每次同步记忆都重新计算hash"""
+
+  def _get_path(self, ref: str):
+    return os.path.join(self.root, ref[:2], f"{ref}.json")
+
+  def put(self, body: dict[str, Any]) -> str:
+    """
+    保存消息内容，返回内容引用；相同的内容只会写入一次
+    """
+    data = json.dumps(body, ensure_ascii=False, sort_keys=True)
+    ref = hashlib.sha256(data.encode("utf-8")).hexdigest()
+    if ref in self._written:
+      return ref
+    path = self._get_path(ref)
+    if not os.path.exists(path):
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+      write_text(path, data, self.codec)
+    self._written.add(ref) # NOTICE: 写入时不缓存内容，调用方的Message已经持有同样的内容
+    return ref
+
+  def get(self, ref: str) -> dict[str, Any]:
+    if ref in self._bodies:
+      self._bodies.move_to_end(ref)
+      return self._bodies[ref]
+    body = load_json(self._get_path(ref))
+    self._bodies[ref] = body
+    if len(self._bodies) > self.CACHE_SIZE:
+      self._bodies.popitem(last=False)
+    return body
+
+  def to_record(self, msg: Message) -> dict[str, Any]:
+    """
+    将消息转换成记忆文件中的记录：内容写入共享存储，记录中只保留引用
+    """
+    record = msg.model_dump(exclude=set(BODY_FIELDS))
+    if msg.id not in self._refs:
+      body = msg.model_dump(include=set(BODY_FIELDS))
+      self._refs[msg.id] = self.put(body)
+    record["content_ref"] = self._refs[msg.id]
+    return record
+
+  def from_record(self, record: dict[str, Any]) -> dict[str, Any]:
+    """
+    将记忆文件中的记录还原成完整的消息数据；兼容直接保存了消息内容的旧记录
+    """
+    if "content_ref" not in record:
+      return record
+    data = {key: value for key, value in record.items() if key != "content_ref"}
+    data.update(self.get(record["content_ref"]))
+    return data
@@ -0,0 +1,31 @@
+import json
+import re
+from typing import Any
+from metagpt.logs import logger
+
+FAST_TIER = "fast"
+"""响应快、成本低的模型，用于简短的提问、判断类请求"""
+STRONG_TIER = "strong"
+"""能力强的模型，用于需求文档、UI设计稿等生成类请求"""
+PROBE_PROMPT = "在正式回复之前请先判断：根据以上的对话和要求，你现在是否还有需要向对方询问的问题？只回答yes或者no这一个词。"
+
+def load_model_routing(path: str) -> dict[str, Any]:
+  """
+  读取模型路由的配置文件，返回可以直接传给角色的参数；配置文件为JSON对象，例如：
+  {"llm_tiers": {"fast": {"model": "gpt-4o-mini"}}, "action_tiers": {"DemandConfirmationAnswer": "fast"}, "probe_actions": ["DemandConfirmationAsk"]}
+  """
+  if not path:
+    return {}
+  with open(path, "r", encoding="utf-8") as file:
+    config: dict[str, Any] = json.load(file)
+  return { key: config[key] for key in ["llm_tiers", "action_tiers", "probe_actions"] if key in config }
+
+async def probe_question(llm: Any, msg: list[dict[str, str]], system_msgs: list[str]) -> bool:
+  """
+  用低成本的模型预判是否还需要提问；只有明确回答no时才返回False，其他情况都交给正式的请求处理
+  """
+  answer: str = await llm.aask(msg=msg + [{ "role": "user", "content": PROBE_PROMPT }], system_msgs=system_msgs)
+  words = re.findall(r"\w+", answer.lower())
+  need_question = len(words) == 0 or words[0] != "no" # NOTICE: 只比较第一个词，not sure、none之类的回答不算no
+  logger.info(f"预判是否需要提问：{answer.strip()[:20]}")
+  return need_question
@@ -0,0 +1,104 @@
+import json
+import os
+from contextvars import ContextVar
+from typing import Any, Optional
+import metagpt.logs as metagpt_logs
+
+CONTINUE_PROMPT = "你上一次的回答在中途中断了，以上是已经完成的部分。请从中断的地方继续输出剩余的内容，不要重复已经输出过的内容，并保持与之前相同的格式。"
+
+_stream_sink: ContextVar[Optional["PartialOutput"]] = ContextVar("partial_stream_sink", default=None)
+_origin_stream_log = None
+
+def _dispatch_stream(msg: str):
+  sink = _stream_sink.get()
+  if sink is not None:
+    sink.feed(msg)
+  _origin_stream_log(msg)
+
+def install_stream_hook():
+  """
+  接管metagpt的流式输出日志函数，便于将当前协程中LLM流式返回的内容转发给对应的断点记录；
+  原有的日志输出行为保持不变。
+  """
+  global _origin_stream_log
+  if _origin_stream_log is not None:
+    return
+  _origin_stream_log = metagpt_logs._llm_stream_log
+  metagpt_logs.set_llm_stream_logfunc(_dispatch_stream)
+
+
+class PartialOutput:
+  """
+  LLM流式输出的断点记录；保存在state.json旁边的partial.json中，每当有代码块完整输出时就落盘一次。
+  """
+  FLUSH_SIZE = 1024
+  """没有新的完整代码块时，至少每累计这么多字符落盘一次"""
+
+  def __init__(self, project_path: str, action_name: str, key: str):
+    self.path = os.path.join(project_path, "partial.json")
+    self.action_name = action_name
+    self.key = key
+    self.content = ""
+    self.complete_end = 0
+    """最后一个完整代码块结束的位置"""
+    self._line_start = 0
+    self._in_block = False
+    self._flushed_size = 0
+
+  def feed(self, chunk: str):
+    """
+    追加一段流式输出，并检查是否有代码块已经完整输出
+    """
+    self.content += chunk
+    block_closed = False
+    while True:
+      line_end = self.content.find("\n", self._line_start)
+      if line_end < 0:
+        break
+      line = self.content[self._line_start:line_end]
+      if line.strip().startswith("```"):
+        self._in_block = not self._in_block
+        if not self._in_block:
+          self.complete_end = line_end + 1
+          block_closed = True
+      self._line_start = line_end + 1
+
+    if block_closed or len(self.content) - self._flushed_size >= self.FLUSH_SIZE:
+      self.flush()
+
+  def flush(self):
+    data = {
+      "action_name": self.action_name,
+      "key": self.key,
+      "content": self.content,
+      "complete_end": self.complete_end,
+    }
+    tmp_path = f"{self.path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+      json.dump(data, file)
+    os.replace(tmp_path, self.path) # NOTICE: 原子替换，避免崩溃时写坏断点文件
+    self._flushed_size = len(self.content)
+
+  def load(self) -> str:
+    """
+    读取之前的断点，返回截止到最后一个完整代码块的内容；断点不属于当前请求时返回空字符串
+    """
+    if not os.path.exists(self.path):
+      return ""
+    with open(self.path, "r", encoding="utf-8") as file:
+      data: dict[str, Any] = json.load(file)
+    if data["action_name"] != self.action_name or data["key"] != self.key:
+      return ""
+
+    return data["content"][:data["complete_end"]]
+
+  def clear(self):
+    if os.path.exists(self.path):
+      os.remove(self.path)
+
+  def __enter__(self):
+    self._token = _stream_sink.set(self)
+    return self
+
+  def __exit__(self, *args):
+    _stream_sink.reset(self._token)
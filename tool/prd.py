@@ -0,0 +1,230 @@
+import hashlib
+import json
+import os
+from typing import Any, Optional
+from snowdream_company.tool.markdown import write_demands_markdown
+
+FIRST_VERSION = "1.0.0"
+NODE_FIELDS = ["标题", "优先级", "需求描述"]
+
+def _hash(value: Any):
+  return hashlib.sha1(json.dumps(value, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+def canonicalize_demands(demands: list[dict[str, Any]], previous: Optional[list[dict[str, Any]]] = None) -> list[dict[str, Any]]:
+  """
+  将需求列表整理成规范的需求树：只保留“标题”、“优先级”、“需求描述”、“子需求”字段，并为每个节点加上id和内容hash。
+  id由标题路径决定；传入上一版本的需求树时，同一父需求下只改了标题（需求描述不变）的需求沿用之前的id，
+  这样改名会被识别成变更而不是删除加新增，依赖这个需求的UI模块也能被找到。
+  """
+  previous_children: dict[str, list[dict[str, Any]]] = {}
+  """上一版本中父需求id到子需求列表的映射（一级需求的父需求id为空字符串）"""
+  for node, parent_id in iter_nodes(previous or []):
+    previous_children.setdefault(parent_id, []).append(node)
+
+  res: list[dict[str, Any]] = []
+  used: set[str] = set()
+  stack: list[tuple[list[dict[str, Any]], list[dict[str, Any]], str]] = [(demands, res, "")]
+  while stack:
+    items, target, parent_id = stack.pop()
+    seen: dict[str, int] = {}
+    title_ids: list[str] = []
+    for item in items:
+      title = str(item.get("标题", ""))
+      # NOTICE: 同一层级下标题重复时用序号区分，保证id唯一
+      count = seen.get(title, 0)
+      seen[title] = count + 1
+      title_ids.append(_hash([parent_id, title, count])[:12])
+    # NOTICE: 依次按标题和需求描述都相同、只有需求描述相同（改名）、只有标题相同（内容变更）对应上一版本同一父需求下的需求
+    ids: list[Optional[str]] = [None] * len(items)
+    candidates = { node["id"]: node for node in previous_children.get(parent_id, []) }
+    by_description: dict[str, list[str]] = {}
+    for node in candidates.values():
+      by_description.setdefault(node["需求描述"], []).append(node["id"])
+    for same_title, same_description in [(True, True), (False, True), (True, False)]:
+      for idx, item in enumerate(items):
+        if ids[idx] is not None:
+          continue
+        description = item.get("需求描述", "")
+        matches = [title_ids[idx]] if same_title else by_description.get(description, [])
+        for node_id in matches:
+          if node_id in candidates and node_id not in used and (not same_description or candidates[node_id]["需求描述"] == description):
+            ids[idx] = node_id
+            used.add(node_id)
+            break
+
+    for idx, item in enumerate(items):
+      node_id = ids[idx]
+      if node_id is None:
+        node_id = title_ids[idx]
+        salt = 0
+        while node_id in used: # NOTICE: 新需求的id和改名的需求沿用的id冲突时换一个
+          salt += 1
+          node_id = _hash([title_ids[idx], salt])[:12]
+        used.add(node_id)
+      node: dict[str, Any] = {
+        "id": node_id,
+      }
+      for field in NODE_FIELDS:
+        node[field] = item.get(field, "")
+      node["hash"] = _hash([node[field] for field in NODE_FIELDS])
+      target.append(node)
+      children = item.get("子需求") or []
+      if len(children) > 0:
+        node["子需求"] = []
+        stack.append((children, node["子需求"], node["id"]))
+
+  return res
+
+def strip_internal(demands: list[dict[str, Any]]) -> list[dict[str, Any]]:
+  """
+  去掉只在内部使用的字段（内容hash），保留设计稿标注需求时引用的id
+  """
+  res: list[dict[str, Any]] = []
+  stack: list[tuple[list[dict[str, Any]], list[dict[str, Any]]]] = [(demands, res)]
+  while stack:
+    items, target = stack.pop()
+    for item in items:
+      node = {field: item[field] for field in ["id"] + NODE_FIELDS}
+      target.append(node)
+      if "子需求" in item:
+        node["子需求"] = []
+        stack.append((item["子需求"], node["子需求"]))
+
+  return res
+
+def iter_nodes(demands: list[dict[str, Any]]):
+  """
+  按文档顺序迭代遍历需求树，返回(节点, 父节点id)
+  """
+  stack: list[tuple[dict[str, Any], str]] = [(demand, "") for demand in reversed(demands)]
+  while stack:
+    node, parent_id = stack.pop()
+    yield node, parent_id
+    for child in reversed(node.get("子需求", [])):
+      stack.append((child, node["id"]))
+
+def node_summary(node: dict[str, Any], parent_id: str = ""):
+  """
+  需求节点本身的信息（不含子需求）
+  """
+  summary = {field: node[field] for field in ["id"] + NODE_FIELDS}
+  summary["parent"] = parent_id
+  return summary
+
+def diff_demands(old: list[dict[str, Any]], new: list[dict[str, Any]]) -> dict[str, list[dict[str, Any]]]:
+  """
+  比较两个版本的规范需求树，返回新增、删除和变更的节点；按节点id建立索引，时间复杂度为O(n)。
+  """
+  old_nodes = {node["id"]: (node, parent_id) for node, parent_id in iter_nodes(old)}
+  added: list[dict[str, Any]] = []
+  changed: list[dict[str, Any]] = []
+  matched: set[str] = set()
+  for node, parent_id in iter_nodes(new):
+    if node["id"] not in old_nodes:
+      added.append(node_summary(node, parent_id))
+      continue
+    matched.add(node["id"])
+    old_node, _ = old_nodes[node["id"]]
+    if old_node["hash"] != node["hash"]:
+      summary = node_summary(node, parent_id)
+      summary["before"] = {field: old_node[field] for field in NODE_FIELDS if old_node[field] != node[field]}
+      changed.append(summary)
+  removed = [node_summary(node, parent_id) for node_id, (node, parent_id) in old_nodes.items() if node_id not in matched]
+
+  return {
+    "added": added,
+    "removed": removed,
+    "changed": changed,
+  }
+
+def is_empty_diff(diff: dict[str, list[dict[str, Any]]]):
+  return not diff["added"] and not diff["removed"] and not diff["changed"]
+
+def next_version(version: str):
+  major, minor, _ = version.split(".")
+  return f"{major}.{int(minor) + 1}.0"
+
+
+class PRDStore:
+  """
+  按版本保存的需求文档库；每个版本在prd/versions下保存一份规范化的需求树JSON，并在prd下生成对应版本的markdown文档。
+  """
+  def __init__(self, project_path: str):
+    self.root = os.path.join(project_path, "prd")
+    self.version_dir = os.path.join(self.root, "versions")
+    self.index_path = os.path.join(self.root, "index.json")
+    self._cache: dict[str, list[dict[str, Any]]] = {}
+
+  def get_versions(self) -> list[str]:
+    if not os.path.exists(self.index_path):
+      return []
+    with open(self.index_path, "r", encoding="utf-8") as file:
+      return json.load(file)["versions"]
+
+  def latest_version(self) -> Optional[str]:
+    versions = self.get_versions()
+    return versions[-1] if len(versions) > 0 else None
+
+  def get_previous_version(self, version: str) -> Optional[str]:
+    versions = self.get_versions()
+    idx = versions.index(version)
+    return versions[idx - 1] if idx > 0 else None
+
+  def load(self, version: Optional[str] = None) -> list[dict[str, Any]]:
+    """
+    读取指定版本（默认最新版本）的规范需求树
+    """
+    version = version or self.latest_version()
+    if version is None:
+      return []
+    if version not in self._cache:
+      with open(os.path.join(self.version_dir, f"{version}.json"), "r", encoding="utf-8") as file:
+        self._cache[version] = json.load(file)["demands"]
+    return self._cache[version]
+
+  def commit(self, demands: list[dict[str, Any]], header: str = "") -> dict[str, Any]:
+    """
+    保存一个新版本的需求列表，返回版本号以及和上一版本的差异
+    """
+    os.makedirs(self.version_dir, exist_ok=True)
+    previous = self.latest_version()
+    version = next_version(previous) if previous else FIRST_VERSION
+    previous_tree = self.load(previous) if previous else []
+    tree = canonicalize_demands(demands, previous_tree)
+    diff = diff_demands(previous_tree, tree)
+    if previous and is_empty_diff(diff):
+      # NOTICE: 需求树完全一致（比如恢复行为时重复提交，或者只修改了变更记录和流程图）就不再生成新版本，但文档要更新成最新的内容
+      self.write_markdown(previous, previous_tree, header)
+      return {
+        "version": previous,
+        "previous_version": self.get_previous_version(previous),
+        "diff": diff,
+      }
+
+    versions = self.get_versions() + [version]
+    with open(os.path.join(self.version_dir, f"{version}.json"), "w", encoding="utf-8") as file:
+      json.dump({ "version": version, "previous_version": previous, "demands": tree }, file, ensure_ascii=False)
+    self.write_markdown(version, tree, header)
+    with open(self.index_path, "w", encoding="utf-8") as file:
+      json.dump({ "versions": versions }, file)
+    self._cache[version] = tree
+
+    return {
+      "version": version,
+      "previous_version": previous,
+      "diff": diff,
+    }
+
+  def write_markdown(self, version: str, tree: list[dict[str, Any]], header: str):
+    """
+    生成指定版本的markdown文档
+    """
+    with open(os.path.join(self.root, f"{version}.md"), "w", encoding="utf-8") as file:
+      file.write(header)
+      write_demands_markdown(tree, file) # NOTICE: 按章节直接写入文件，不在内存中拼接整个文档
+
+  def dump(self, version: Optional[str] = None):
+    """
+    规范需求树的JSON文本，用于放入提示词（不含内部使用的hash）
+    """
+    return json.dumps(strip_internal(self.load(version)), ensure_ascii=False)
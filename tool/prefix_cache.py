@@ -0,0 +1,103 @@
+import hashlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+PREFIX_BLOCK = 128
+"""缓存的粒度（字符数），和服务端按固定长度的token块缓存前缀类似"""
+MIN_PREFIX = 1024
+"""命中的前缀短于这个长度时不算命中"""
+CACHE_CAPACITY = 65536
+"""最多缓存的前缀块数量，超过时淘汰最久没有用到的"""
+
+def serialize_request(msg: str | list[dict[str, str]], system_msgs: Optional[list[str]] = None) -> list[str]:
+  """
+  按照发送给服务端的顺序将请求序列化成消息列表（和BaseLLM.aask的组织方式一致）
+  """
+  messages = [{ "role": "system", "content": content } for content in system_msgs or []]
+  messages += [{ "role": "user", "content": msg }] if isinstance(msg, str) else msg
+  return [f"<|{message['role']}|>\n{message['content']}\n" for message in messages]
+
+
+class PrefixCache:
+  """
+  本地模拟的服务端前缀缓存：请求按PREFIX_BLOCK切块，以前缀的hash缓存，
+  新请求从头开始连续命中的块即为可以复用的前缀；用于在本地衡量提示词的组织方式对缓存命中的影响。
+  """
+  def __init__(self, block_size: int = PREFIX_BLOCK, min_prefix: int = MIN_PREFIX, capacity: int = CACHE_CAPACITY):
+    self.block_size = block_size
+    self.min_prefix = min_prefix
+    self.capacity = capacity
+    self.blocks: OrderedDict[str, None] = OrderedDict()
+    self.records: list[dict[str, Any]] = []
+
+  def lookup(self, messages: list[str]) -> dict[str, Any]:
+    """
+    查询并缓存一次请求，返回这次请求的长度、可缓存的长度（最后一条消息之前的部分）、命中的前缀长度以及完整命中的消息数量
+    """
+    text = "".join(messages)
+    digest = hashlib.sha1()
+    keys: list[str] = []
+    for start in range(0, len(text) - self.block_size + 1, self.block_size):
+      digest.update(text[start:start + self.block_size].encode("utf-8"))
+      keys.append(digest.copy().hexdigest()) # NOTICE: 每一块的hash都包含之前所有的内容，命中即代表整个前缀相同
+    hit_blocks = 0
+    while hit_blocks < len(keys) and keys[hit_blocks] in self.blocks:
+      hit_blocks += 1
+    for key in keys:
+      self.blocks[key] = None
+      self.blocks.move_to_end(key)
+    while len(self.blocks) > self.capacity:
+      self.blocks.popitem(last=False)
+
+    cached = hit_blocks * self.block_size
+    if cached < self.min_prefix:
+      cached = 0
+    cached_messages = 0
+    offset = 0
+    for message in messages:
+      offset += len(message)
+      if offset > cached:
+        break
+      cached_messages += 1
+    record = {
+      "chars": len(text),
+      "cacheable": len(text) - len(messages[-1]) if len(messages) > 0 else 0,
+      "cached": cached,
+      "messages": len(messages),
+      "cached_messages": cached_messages,
+    }
+    self.records.append(record)
+    return record
+
+  def stats(self) -> dict[str, Any]:
+    chars = sum([record["chars"] for record in self.records])
+    cacheable = sum([record["cacheable"] for record in self.records])
+    cached = sum([record["cached"] for record in self.records])
+    return {
+      "requests": len(self.records),
+      "chars": chars,
+      "cacheable": cacheable,
+      "cached": cached,
+      "hit_rate": cached / chars if chars > 0 else 0.0,
+      "prefix_hit_rate": cached / cacheable if cacheable > 0 else 0.0,
+      "hit_requests": len([record for record in self.records if record["cached"] > 0]),
+    }
+
+class StandInLLM:
+  """
+  本地替身：不请求任何服务，按respond生成回复，同时记录前缀缓存的命中情况
+  """
+  def __init__(self, respond: Callable[[list[str]], Awaitable[str] | str], cache: Optional[PrefixCache] = None):
+    self.respond = respond
+    self.cache = cache or PrefixCache()
+    self.model = "stand-in"
+    self.cost_manager = None
+    self.system_prompt = ""
+
+  async def aask(self, msg: str | list[dict[str, str]], system_msgs: Optional[list[str]] = None, *args, **kwargs) -> str:
+    messages = serialize_request(msg, system_msgs)
+    self.cache.lookup(messages)
+    answer = self.respond(messages)
+    if not isinstance(answer, str):
+      answer = await answer
+    return answer
@@ -0,0 +1,50 @@
+STATIC_SEGMENT = "static"
+"""静态的指令，包括角色的描述和关注的方面，同一个行为的每次请求都相同"""
+DOC_SEGMENT = "doc"
+"""需求文档，同一个版本的需求文档不变"""
+
+
+class PromptLayout:
+  """
+  按稳定程度从高到低组织的提示词：静态指令、按版本的需求文档、对话记录、本轮的新内容。
+  静态指令和需求文档分别作为单独的system消息（消息的边界即为可缓存段的边界），对话记录只在末尾追加，
+  它们组成的前缀在多轮问答之间保持不变，可以被服务端的前缀缓存复用；每轮变化的内容（例如按问题检索出的需求详情）只追加在最后一条消息的末尾。
+  """
+  def __init__(self):
+    self.segments: list[tuple[str, str]] = []
+    """（名称，内容）形式的system消息，按加入的顺序排列"""
+    self.history: list[dict[str, str]] = []
+    self.turn: list[str] = []
+
+  def add_segment(self, name: str, content: str) -> "PromptLayout":
+    if content:
+      self.segments.append((name, content))
+    return self
+
+  def add_history(self, history: list[dict[str, str]]) -> "PromptLayout":
+    self.history += history
+    return self
+
+  def add_turn(self, content: str) -> "PromptLayout":
+    """
+    本轮新增的内容，追加在最后一条用户消息的末尾（最后一条不是用户消息时单独作为一条用户消息）
+    """
+    if content:
+      self.turn.append(content)
+    return self
+
+  @property
+  def system_msgs(self) -> list[str]:
+    return [content for _, content in self.segments]
+
+  @property
+  def msg(self) -> list[dict[str, str]]:
+    messages = list(self.history) # NOTICE: history可能是对话记录的视图，不能直接修改
+    if len(self.turn) == 0:
+      return messages
+    turn = "\n\n".join(self.turn)
+    if len(messages) > 0 and messages[-1]["role"] == "user":
+      messages[-1] = { **messages[-1], "content": f"{messages[-1]['content']}\n\n{turn}" }
+    else:
+      messages.append({ "role": "user", "content": turn })
+    return messages
@@ -0,0 +1,161 @@
+import json
+import math
+import re
+from collections import Counter, OrderedDict
+from typing import Any, Optional
+from snowdream_company.tool.prd import PRDStore, iter_nodes
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+|[一-鿿]+")
+
+def tokenize(text: str) -> list[str]:
+  """
+  简单的本地分词：英文和数字按单词切分，中文按相邻两个字切分（单字的片段保留单字）
+  """
+  tokens: list[str] = []
+  for piece in TOKEN_PATTERN.findall(text.lower()):
+    if piece.isascii():
+      tokens.append(piece)
+    elif len(piece) == 1:
+      tokens.append(piece)
+    else:
+      tokens += [piece[i:i + 2] for i in range(len(piece) - 1)]
+  return tokens
+
+
+class BM25Index:
+  """
+  BM25词法索引，支持增量追加文档
+  """
+  def __init__(self, k1: float = 1.5, b: float = 0.75):
+    self.k1 = k1
+    self.b = b
+    self.ids: list[str] = []
+    self.term_freqs: list[Counter] = []
+    self.doc_lens: list[int] = []
+    self.doc_freqs: Counter = Counter()
+    self.total_len = 0
+
+  def add(self, doc_id: str, text: str):
+    tokens = tokenize(text)
+    freqs = Counter(tokens)
+    self.ids.append(doc_id)
+    self.term_freqs.append(freqs)
+    self.doc_lens.append(len(tokens))
+    self.doc_freqs.update(freqs.keys())
+    self.total_len += len(tokens)
+
+  def search(self, query: str, k: int) -> list[tuple[str, float]]:
+    """
+    返回和query最相关的前k个文档id及得分
+    """
+    count = len(self.ids)
+    if count == 0 or k <= 0:
+      return []
+    avg_len = self.total_len / count or 1
+    terms = [term for term in set(tokenize(query)) if term in self.doc_freqs]
+    idf = {term: math.log(1 + (count - self.doc_freqs[term] + 0.5) / (self.doc_freqs[term] + 0.5)) for term in terms}
+    scores: list[tuple[str, float]] = []
+    for doc_id, freqs, doc_len in zip(self.ids, self.term_freqs, self.doc_lens):
+      score = 0.0
+      norm = self.k1 * (1 - self.b + self.b * doc_len / avg_len)
+      for term in terms:
+        tf = freqs.get(term, 0)
+        if tf > 0:
+          score += idf[term] * tf * (self.k1 + 1) / (tf + norm)
+      if score > 0:
+        scores.append((doc_id, score))
+    scores.sort(key=lambda item: item[1], reverse=True)
+    return scores[:k]
+
+
+class DemandRetriever:
+  """
+  基于某个版本需求文档的检索器：需求节点和历史问答分别建立索引，
+  历史问答用于扩展查询（伪相关反馈），最终返回前k个相关需求以及其余需求的简要大纲。
+  """
+  FEEDBACK_TURNS = 2
+  """用于扩展查询的相关问答数量"""
+
+  def __init__(self, demands: list[dict[str, Any]]):
+    self.demands = demands
+    self.nodes: dict[str, tuple[dict[str, Any], int]] = {}
+    self.demand_index = BM25Index()
+    self.turn_index = BM25Index()
+    self.turns: dict[str, str] = {}
+    self.outline: Optional[str] = None
+    depths: dict[str, int] = {"": -1}
+    for node, parent_id in iter_nodes(demands):
+      depths[node["id"]] = depths[parent_id] + 1
+      self.nodes[node["id"]] = (node, depths[node["id"]])
+      self.demand_index.add(node["id"], f"{node['标题']} {node['标题']} {node['需求描述']}")
+
+  def add_turn(self, turn_id: str, content: str):
+    """
+    追加一条问答记录，同一条记录只会加入一次
+    """
+    if turn_id in self.turns:
+      return
+    self.turns[turn_id] = content
+    self.turn_index.add(turn_id, content)
+
+  def get_outline(self) -> str:
+    """
+    完整的需求大纲，只和需求文档的版本有关
+    """
+    if self.outline is None:
+      self.outline = "\n".join([f"{'  ' * depth}- {node['标题']}（id：{node_id}）" for node_id, (node, depth) in self.nodes.items()])
+    return self.outline
+
+  def select_details(self, query: str, k: int) -> Optional[str]:
+    """
+    返回前k个相关需求的详情，没有相关需求时为空字符串；无需裁剪时返回None
+    """
+    if k <= 0 or len(self.nodes) <= k:
+      return None
+    feedback = [self.turns[turn_id] for turn_id, _ in self.turn_index.search(query, self.FEEDBACK_TURNS)]
+    hits = self.demand_index.search("\n".join([query] + feedback), k)
+    selected = set([node_id for node_id, _ in hits])
+    if len(selected) == 0:
+      return "" # NOTICE: 依然只给出大纲，文档部分不能因为某一轮没有命中就变回完整文档，否则提示词的缓存前缀会失效
+
+    relevant = [{field: node[field] for field in ["id", "标题", "优先级", "需求描述"]} for node_id, (node, _) in self.nodes.items() if node_id in selected]
+    return f"相关需求详情：\n{json.dumps(relevant, ensure_ascii=False)}"
+
+
+RETRIEVER_CACHE_SIZE = 16
+"""最多缓存的项目检索器数量，超过时淘汰最久没有使用的项目"""
+_retrievers: OrderedDict[str, tuple[str, DemandRetriever]] = OrderedDict()
+"""项目路径到（需求文档版本，检索器）的缓存，每个项目只保留最新版本的索引"""
+
+def get_retriever(project_path: str) -> Optional[DemandRetriever]:
+  """
+  获取最新版本需求文档的检索器，每个版本只建立一次索引；有新版本时替换掉旧版本的索引
+  """
+  store = PRDStore(project_path)
+  version = store.latest_version()
+  if version is None:
+    return None
+  cached = _retrievers.get(project_path)
+  if cached is None or cached[0] != version:
+    cached = (version, DemandRetriever(store.load(version)))
+    _retrievers[project_path] = cached
+  _retrievers.move_to_end(project_path)
+  if len(_retrievers) > RETRIEVER_CACHE_SIZE:
+    _retrievers.popitem(last=False)
+  return cached[1]
+
+def get_demand_segments(project_path: str, query: str, k: int, fallback: str, turns: Optional[list[tuple[str, str]]] = None) -> tuple[str, str]:
+  """
+  根据query选取需求文档的上下文，拆成（按版本不变的部分，和query相关的部分）两段，便于组织成可以缓存的提示词前缀：
+  需求数量超过k时分别是完整的需求大纲和相关需求的详情（没有相关需求时为空字符串），
+  否则（包括没有版本化的需求文档时）是完整文档fallback和空字符串
+  """
+  retriever = get_retriever(project_path)
+  if retriever is None:
+    return fallback, ""
+  for turn_id, content in turns or []:
+    retriever.add_turn(turn_id, content)
+  details = retriever.select_details(query, k)
+  if details is None:
+    return fallback, ""
+  return f"完整需求大纲：\n{retriever.get_outline()}", details
@@ -0,0 +1,71 @@
+import re
+import sys
+import time
+from collections import deque
+from typing import Any, Callable, Optional
+from metagpt.logs import logger
+
+CLASS_PATTERN = re.compile(r"<class '([^']+)'>")
+_action_ids: dict[Any, str] = {}
+
+def action_id(action: Any) -> str:
+  """
+  规范化的action id：action类、`str(action类)`以及消息里的cause_by都会转换成intern后的`模块.类名`形式，
+  例如`<class 'a.UIAnalysis'>_ui_draft`会转换成`a.UIAnalysis_ui_draft`；结果会被缓存。
+  """
+  if action in _action_ids:
+    return _action_ids[action]
+  if isinstance(action, type):
+    res = f"{action.__module__}.{action.__name__}"
+  else:
+    res = CLASS_PATTERN.sub(r"\1", str(action))
+  res = sys.intern(res)
+  _action_ids[action] = res
+  return res
+
+
+class Transition:
+  """
+  状态转移：由cause_by为from_action的消息触发，满足条件when时转移到next_action（为None时表示结束）
+  """
+  def __init__(self, from_action: Any, next_action: Optional[type], when: Optional[Callable[[Any, Any], bool]] = None, name: str = ""):
+    self.cause_id = action_id(from_action)
+    self.next_action = next_action
+    self.when = when
+    self.name = name or f"{self.cause_id.split('.')[-1]} -> {next_action.__name__ if next_action else 'None'}"
+
+
+class StateMachine:
+  """
+  基于转移表的行为状态机；按cause_by的规范id直接查表，再按声明顺序检查转移条件，每次转移都会被记录下来便于追踪。
+  """
+  TRACE_SIZE = 200
+
+  def __init__(self, transitions: list[Transition]):
+    self.table: dict[str, list[Transition]] = {}
+    for transition in transitions:
+      self.table.setdefault(transition.cause_id, []).append(transition)
+    self.trace: deque[dict[str, Any]] = deque(maxlen=self.TRACE_SIZE)
+
+  def dispatch(self, role: Any, msg: Any) -> Optional[type]:
+    """
+    根据最新的消息返回下一个行为的类型，没有匹配的转移时返回None
+    """
+    cause_id = action_id(msg.cause_by)
+    matched: Optional[Transition] = None
+    for transition in self.table.get(cause_id, []):
+      if transition.when is None or transition.when(role, msg):
+        matched = transition
+        break
+
+    record = {
+      "time": time.time(),
+      "role": role.name,
+      "cause_by": cause_id,
+      "sent_from": msg.sent_from,
+      "transition": matched.name if matched else None,
+    }
+    self.trace.append(record)
+    logger.debug(f"{role.name}: 状态转移 {record}")
+
+    return matched.next_action if matched else None
@@ -0,0 +1,63 @@
+import copy
+import os
+from typing import Any, Callable, Optional
+from pydantic import Field
+from metagpt.environment import Environment
+from metagpt.provider.base_llm import BaseLLM
+from metagpt.schema import Message
+from metagpt.team import Team
+
+PROJECT_DIRS = ["memory", "prd", os.path.join("ui", "1.0.0")]
+
+def init_project(project_path: str):
+  """
+  创建项目需要的目录
+  """
+  for directory in PROJECT_DIRS:
+    os.makedirs(os.path.join(project_path, directory), exist_ok=True)
+
+
+class ObservableEnvironment(Environment):
+  """
+  可以监听消息的环境：每条发布到环境中的消息都会通知listeners，便于对外推送进度
+  """
+  listeners: list[Callable[[Message], Any]] = Field(default_factory=list, exclude=True)
+
+  def publish_message(self, message: Message, peekable: bool = True) -> bool:
+    res = super().publish_message(message, peekable)
+    for listener in self.listeners:
+      listener(message)
+    return res
+
+
+def create_team(project_path: str, investment: float = 10.0, llm: Optional[BaseLLM] = None, **role_kwargs) -> Team:
+  """
+  创建由需求分析师和UI设计师组成的团队；role_kwargs会传给每个角色（例如restore_policy、compression）。
+  传入llm时每个角色使用它的浅拷贝：共用已经创建好的客户端（及其连接池），system_prompt等角色相关的属性互不影响。
+  """
+  from snowdream_company.roles.demand_analyst import DemandAnalyst
+  from snowdream_company.roles.ui_designer import UIDesigner
+
+  init_project(project_path)
+  roles: list[Any] = []
+  for role_class in [DemandAnalyst, UIDesigner]:
+    kwargs = dict(role_kwargs)
+    if llm is not None:
+      kwargs["llm"] = copy.copy(llm)
+    roles.append(role_class(project_path=project_path, **kwargs))
+  team = Team(env=ObservableEnvironment())
+  team.hire(roles)
+  team.invest(investment)
+
+  return team
+
+async def run_team(team: Team, idea: str, n_round: int = 5):
+  """
+  发布用户需求并运行团队，直到所有角色都空闲或者达到最大轮数
+  """
+  team.run_project(idea)
+  for _ in range(n_round):
+    team._check_balance()
+    await team.env.run()
+    if team.env.is_idle:
+      break
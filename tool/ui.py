@@ -1,9 +1,33 @@
-import tkinter as tk
-from tkinter import simpledialog
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Optional
+
+InputProvider = Callable[[str, str, str], Awaitable[str]]
+"""用户输入的提供者，参数为（标题，提示，相关内容），返回用户的输入"""
+
+_input_provider: ContextVar[Optional[InputProvider]] = ContextVar("input_provider", default=None)
+
+def set_input_provider(provider: Optional[InputProvider]):
+  """
+  设置当前协程（及其创建的子任务）使用的用户输入提供者，例如守护进程中由客户端回答；返回用于恢复的token
+  """
+  return _input_provider.set(provider)
 
 def get_user_input(title: str, tip: str):
+  # NOTICE: 延迟导入，只有真正需要用户输入时才加载tkinter
+  import tkinter as tk
+  from tkinter import simpledialog
+
   root = tk.Tk()
   root.withdraw()  # 隐藏主窗口
   input_value = simpledialog.askstring(title, tip + "\t" * 20)
   root.destroy()  # 销毁主窗口
   return input_value or ""
+
+async def ask_user_input(title: str, tip: str, detail: str = ""):
+  """
+  获取用户输入：设置了输入提供者时交给提供者，否则弹出输入框；detail为需要用户回应的内容（例如问题或设计稿）
+  """
+  provider = _input_provider.get()
+  if provider is None:
+    return get_user_input(title, tip)
+  return await provider(title, tip, detail) or ""
@@ -0,0 +1,95 @@
+import io
+import os
+from typing import Any
+
+DIFF_TOLERANCE = 16
+"""单个颜色通道的差值不超过这个值时认为像素没有变化，用于忽略抗锯齿和有损压缩带来的噪声"""
+DIFF_THRESHOLD = 0.001
+"""变化像素占比低于这个值的模块视为没有变化"""
+
+def get_diff_path(file_path: str):
+  dirname = os.path.dirname(file_path)
+  base, _ = os.path.splitext(os.path.basename(file_path))
+
+  return os.path.join(dirname, f"{base}.diff.png")
+
+def decode_image(data: bytes) -> Any:
+  """
+  将图片解码成(高, 宽, 3)的uint8数组
+  """
+  import numpy as np # NOTICE: 延迟导入，只有对比截图时才加载numpy和Pillow
+  from PIL import Image
+
+  with Image.open(io.BytesIO(data)) as image:
+    return np.asarray(image.convert("RGB"))
+
+def diff_images(old: Any, new: Any, tolerance: int = DIFF_TOLERANCE) -> tuple[float, Any]:
+  """
+  返回（变化像素的占比，变化像素的掩码）；两张图尺寸不同时按较大的尺寸对齐，多出来的区域都算作变化
+  """
+  import numpy as np
+
+  height, width = max(old.shape[0], new.shape[0]), max(old.shape[1], new.shape[1])
+  common_height, common_width = min(old.shape[0], new.shape[0]), min(old.shape[1], new.shape[1])
+  mask = np.ones((height, width), dtype=bool)
+  old_part = old[:common_height, :common_width]
+  new_part = new[:common_height, :common_width]
+  # NOTICE: 先用逐字节比较找出有差异的像素（截图大部分区域通常完全相同），只对这些像素计算差值，避免对整张图做类型转换
+  different = old_part != new_part
+  changed = different[..., 0] | different[..., 1] | different[..., 2]
+  flat = changed.reshape(-1)
+  candidates = np.flatnonzero(flat)
+  if candidates.size > 0:
+    old_pixels = old_part.reshape(-1, 3)[candidates].astype(np.int16)
+    new_pixels = new_part.reshape(-1, 3)[candidates].astype(np.int16)
+    delta = np.abs(old_pixels - new_pixels).max(axis=1)
+    flat[candidates[delta <= tolerance]] = False
+  mask[:common_height, :common_width] = changed
+
+  return float(mask.mean()), mask
+
+def save_diff_mask(mask: Any, new: Any, path: str):
+  """
+  保存差异图：新截图整体淡化，变化的像素标成红色
+  """
+  import numpy as np
+  from PIL import Image
+
+  canvas = np.full((*mask.shape, 3), 255, dtype=np.uint8)
+  canvas[:new.shape[0], :new.shape[1]] = new
+  canvas = canvas // 4 + 191
+  canvas[mask] = [255, 0, 0]
+  Image.fromarray(canvas).save(path)
+
+def compare_image(old_data: bytes, new_path: str, threshold: float = DIFF_THRESHOLD) -> dict[str, Any]:
+  """
+  对比模块上一版和新一版的截图，变化超过阈值时在截图旁边生成差异图
+  """
+  with open(new_path, "rb") as file:
+    new = decode_image(file.read())
+  ratio, mask = diff_images(decode_image(old_data), new)
+  diff_path = get_diff_path(new_path)
+  if os.path.exists(diff_path):
+    os.remove(diff_path)
+  if ratio < threshold:
+    return { "status": "unchanged", "ratio": ratio }
+  save_diff_mask(mask, new, diff_path)
+  return { "status": "changed", "ratio": ratio, "mask": os.path.basename(diff_path) }
+
+def format_diff_summary(summary: dict[str, Any]) -> str:
+  """
+  将对比结果整理成审核时阅读的文字
+  """
+  lines = [f"UI设计稿截图对比（变化阈值{summary['threshold'] * 100:.2f}%）："]
+  for name, item in summary["modules"].items():
+    if item["status"] == "changed" and "mask" in item:
+      lines.append(f"- {name}：有变化（{item['ratio'] * 100:.2f}%），差异图 {item['mask']}")
+    elif item["status"] == "changed":
+      lines.append(f"- {name}：有变化")
+    elif item["status"] == "unchanged":
+      lines.append(f"- {name}：没有变化")
+    elif item["status"] == "added":
+      lines.append(f"- {name}：新增")
+    elif item["status"] == "removed":
+      lines.append(f"- {name}：已删除")
+  return "\n".join(lines)
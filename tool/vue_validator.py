@@ -0,0 +1,196 @@
+import json
+import re
+from html.parser import HTMLParser
+from typing import Optional
+from snowdream_company.tool.markdown import get_lang_content
+
+BUILTIN_PACKAGES = ["vue", "element-plus"]
+"""预览页面始终提供的npm包，不需要列在json代码块中"""
+VOID_ELEMENTS = set(["area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"])
+SFC_BLOCKS = ["template", "script", "style"]
+HEADER_PATTERN = re.compile(r"^<!--\s*(.+?)\s*-->$")
+IMPORT_PATTERN = re.compile(r"""(?:\bimport\s*(?:[^'";]*?\s*from\s*)?|\bimport\s*\(\s*)['"]([^'"]+)['"]""")
+MUSTACHE_PATTERN = re.compile(r"\{\{.*?\}\}", re.DOTALL)
+
+def get_module_name(source: str) -> Optional[str]:
+  """
+  模块第一行注释中的模块名称，没有时返回None
+  """
+  lines = [line.strip() for line in source.strip().splitlines() if line.strip() != ""]
+  if len(lines) == 0:
+    return None
+  match = HEADER_PATTERN.match(lines[0])
+  if match is None or match.group(1).startswith("demands:"):
+    return None
+  return match.group(1)
+
+def get_package_name(specifier: str) -> Optional[str]:
+  """
+  import语句中的npm包名（例如@element-plus/icons-vue、dayjs/plugin/utc中的dayjs），相对路径和URL返回None
+  """
+  if specifier.startswith((".", "/")) or re.match(r"^[a-z]+:", specifier):
+    return None
+  parts = specifier.split("/")
+  return "/".join(parts[:2]) if specifier.startswith("@") else parts[0]
+
+def get_script_imports(source: str) -> list[str]:
+  """
+  模块script部分引用的npm包
+  """
+  scripts = re.findall(r"<script\b[^>]*>(.*?)</script>", source, re.DOTALL)
+  packages = [get_package_name(specifier) for script in scripts for specifier in IMPORT_PATTERN.findall(script)]
+  return list(dict.fromkeys([package for package in packages if package is not None]))
+
+
+class TagChecker(HTMLParser):
+  """
+  检查标签是否配对，同时统计顶层的template、script、style
+  """
+  def __init__(self):
+    super().__init__(convert_charrefs=True)
+    self.stack: list[tuple[str, int]] = []
+    self.errors: list[str] = []
+    self.blocks: dict[str, int] = { name: 0 for name in SFC_BLOCKS }
+
+  def handle_starttag(self, tag: str, attrs):
+    if len(self.stack) == 0 and tag in self.blocks:
+      self.blocks[tag] += 1
+    if tag not in VOID_ELEMENTS:
+      self.stack.append((tag, self.getpos()[0]))
+
+  def handle_endtag(self, tag: str):
+    if tag in VOID_ELEMENTS:
+      return
+    if tag not in [name for name, _ in self.stack]:
+      self.errors.append(f"第{self.getpos()[0]}行的</{tag}>没有对应的开始标签")
+      return
+    while len(self.stack) > 0:
+      name, line = self.stack.pop()
+      if name == tag:
+        break
+      self.errors.append(f"第{line}行的<{name}>没有闭合")
+
+  def finish(self):
+    self.close()
+    for name, line in self.stack:
+      self.errors.append(f"第{line}行的<{name}>没有闭合")
+    self.stack = []
+
+def validate_module(source: str, imports: list[str]) -> list[str]:
+  """
+  静态检查单个vue模块，返回错误信息（没有错误时为空列表）：模块名称注释、template/script/style以及其中的标签是否完整配对、引用的npm包是否已经列出
+  """
+  errors: list[str] = []
+  if get_module_name(source) is None:
+    errors.append("第一行缺少“<!-- 模块名称和描述 -->”格式的模块名称注释")
+  checker = TagChecker()
+  # NOTICE: 插值表达式中可能有“<”等字符，检查标签前先替换掉（保留换行，行号不变）
+  checker.feed(MUSTACHE_PATTERN.sub(lambda match: re.sub(r"[^\n]", " ", match.group(0)), source))
+  checker.finish()
+  errors += checker.errors
+  if checker.blocks["template"] != 1:
+    errors.append(f"需要有且只有一个顶层的<template>，实际有{checker.blocks['template']}个")
+  if checker.blocks["script"] > 2:
+    errors.append(f"顶层的<script>最多两个，实际有{checker.blocks['script']}个")
+  available = set(BUILTIN_PACKAGES + imports)
+  for package in get_script_imports(source):
+    if package not in available:
+      errors.append(f"script中引用了npm包{package}，但是没有列在json代码块的npm包列表中")
+  return errors
+
+
+class DraftValidation:
+  """
+  设计稿的检查结果：modules为所有vue模块，errors为有问题的模块（按模块的序号索引）及其错误信息
+  """
+  def __init__(self, modules: list[str], imports: list[str], errors: dict[int, list[str]], draft_errors: list[str]):
+    self.modules = modules
+    self.imports = imports
+    self.errors = errors
+    self.draft_errors = draft_errors
+    """和具体模块无关的错误，例如缺少npm包列表"""
+
+  @property
+  def is_valid(self):
+    return len(self.errors) == 0 and len(self.draft_errors) == 0
+
+  @property
+  def valid_modules(self) -> list[str]:
+    return [module for idx, module in enumerate(self.modules) if idx not in self.errors]
+
+  def format_errors(self) -> str:
+    lines = [f"- {error}" for error in self.draft_errors]
+    for idx, errors in self.errors.items():
+      name = get_module_name(self.modules[idx]) or "缺少名称"
+      lines.append(f"- 第{idx + 1}个vue代码块（{name}）：")
+      lines += [f"  - {error}" for error in errors]
+    return "\n".join(lines)
+
+def validate_draft(answer: str, imports: Optional[list[str]] = None) -> DraftValidation:
+  """
+  检查设计稿中的所有vue模块；imports为已知的npm包列表（例如增量更新时上一版设计稿的），为None时设计稿中必须有json代码块
+  """
+  from pathvalidate import sanitize_filename # NOTICE: 延迟导入，和save_ui保持一致
+
+  modules: list[str] = get_lang_content(answer, is_all=True, lang="vue")
+  draft_errors: list[str] = []
+  packages = list(imports or [])
+  import_blocks = get_lang_content(answer, is_all=True, lang="json")
+  if len(import_blocks) > 0:
+    try:
+      packages += json.loads(import_blocks[-1])
+    except ValueError:
+      draft_errors.append("json代码块中的npm包列表不是合法的JSON数组")
+  elif imports is None:
+    draft_errors.append("缺少列出npm包的json代码块")
+
+  errors: dict[int, list[str]] = {}
+  filenames: dict[str, int] = {}
+  for idx, module in enumerate(modules):
+    module_errors = validate_module(module, packages)
+    name = get_module_name(module)
+    if name is not None:
+      filename = sanitize_filename(name, replacement_text="_")
+      if filename in filenames:
+        module_errors.append(f"模块名称转换成文件名（{filename}.vue）后和第{filenames[filename] + 1}个vue代码块重复")
+      else:
+        filenames[filename] = idx
+    if len(module_errors) > 0:
+      errors[idx] = module_errors
+  return DraftValidation(modules, packages, errors, draft_errors)
+
+def apply_repair(answer: str, validation: DraftValidation, repair: str) -> str:
+  """
+  将模型修正后的模块替换回设计稿：名称相同的模块直接替换，缺少名称的模块按顺序使用修正结果中新出现的模块；
+  修正结果中新列出的npm包合并到设计稿的json代码块
+  """
+  fixed: list[str] = get_lang_content(repair, is_all=True, lang="vue")
+  names = set([get_module_name(module) for module in validation.modules])
+  by_name = { get_module_name(module): module for module in fixed if get_module_name(module) in names }
+  others = [module for module in fixed if get_module_name(module) not in names]
+  for idx in validation.errors:
+    module = validation.modules[idx]
+    name = get_module_name(module)
+    replacement = by_name.get(name) if name is not None else None
+    if replacement is None and len(others) > 0:
+      replacement = others.pop(0)
+    if replacement is not None:
+      answer = answer.replace(module, replacement, 1)
+
+  new_imports = get_lang_content(repair, is_all=True, lang="json")
+  if len(new_imports) == 0:
+    return answer
+  try:
+    added: list[str] = json.loads(new_imports[-1])
+  except ValueError:
+    return answer
+  import_blocks = get_lang_content(answer, is_all=True, lang="json")
+  if len(import_blocks) == 0:
+    return f"{answer}\n\n```json\n{json.dumps(added, ensure_ascii=False)}\n```"
+  try:
+    current: list[str] = json.loads(import_blocks[-1])
+  except ValueError:
+    current = []
+  merged = json.dumps(list(dict.fromkeys(current + added)), ensure_ascii=False)
+  start = answer.rindex(import_blocks[-1])
+  return answer[:start] + merged + answer[start + len(import_blocks[-1]):]